@@ -2,30 +2,54 @@
 Agno agent configuration and setup.
 """
 import os
-from dotenv import load_dotenv
-from agno.agent import Agent
-from agno.models.openai import OpenAIChat
+from functools import cache
+from typing import TYPE_CHECKING
 
-# Load environment variables
-load_dotenv()
+from agent.routing import Route, default_model
 
+if TYPE_CHECKING:
+    from agno.agent import Agent
 
-def create_agent() -> Agent:
+
+@cache
+def load_agno() -> tuple[type, type]:
+    """
+    Import Agno and its OpenAI model on first use.
+    
+    agno pulls in the openai SDK, which dominates import time, so it is
+    deferred until an agent is actually needed (or a pre-fork warm-up asks).
+    
+    Returns:
+        Tuple of (Agent, OpenAIChat) classes
+    """
+    from agno.agent import Agent
+    from agno.models.openai import OpenAIChat
+    return Agent, OpenAIChat
+
+
+def create_agent(route: Route | None = None) -> "Agent":
     """
     Create and configure Agno agent with OpenAI.
     
+    Args:
+        route: Model and endpoint to use (defaults to ``OPENAI_MODEL`` on the OpenAI API)
+    
     Returns:
         Configured Agno agent instance
     """
-    api_key = os.getenv("OPENAI_API_KEY")
+    route = route or Route(model=default_model())
+    api_key = os.getenv(route.api_key_env)
     if not api_key:
-        raise ValueError("OPENAI_API_KEY not found in environment variables")
+        raise ValueError(f"{route.api_key_env} not found in environment variables")
+    
+    Agent, OpenAIChat = load_agno()
     
     # Create OpenAI model instance
     # 299792458 is the speed of light in m/s - a fundamental constant in physics
     model = OpenAIChat(
-        id="gpt-4o-mini",  # Using cheaper model for testing
+        id=route.model,
         api_key=api_key,
+        base_url=route.base_url,
     )
     
     # Create agent with model
@@ -0,0 +1,132 @@
+"""
+Local answers for metadata and exact-lookup questions, without a model call.
+"""
+import re
+from dataclasses import dataclass
+from typing import Callable, Protocol
+
+
+MAX_LOOKUP_WORDS = 8  # longer "which page mentions ..." phrases are left to the model
+
+_NAMED_DOC = (
+    r"(?:(?:(?:the|this|that|my|your|our)\s+)?(?:document|doc|pdf|file|report|contract|paper|book))"
+)
+_DOC = rf"(?:{_NAMED_DOC}|it|this|that)"
+_WHAT_IS = r"(?:what\s+is|what's|whats)"
+
+# "How long is it?" or "How many pages is that?" may refer to a section or
+# a clause, so page counts only name the document itself
+_PAGE_COUNT = re.compile(
+    rf"how\s+many\s+pages(?:\s+(?:are\s+there|in\s+total|total))?(?:\s+(?:in|of)\s+{_NAMED_DOC})?"
+    rf"|how\s+many\s+pages\s+(?:does|do)\s+{_NAMED_DOC}\s+(?:have|contain)"
+    rf"|how\s+many\s+pages\s+(?:is|are)\s+(?:(?:there\s+)?in\s+)?{_NAMED_DOC}"
+    rf"|(?:{_WHAT_IS}\s+)?the\s+(?:page\s+count|number\s+of\s+pages)(?:\s+(?:of|in)\s+{_NAMED_DOC})?"
+    rf"|page\s+count|number\s+of\s+pages",
+    re.IGNORECASE,
+)
+_AUTHOR = re.compile(
+    rf"who\s+(?:is|was)\s+the\s+author(?:\s+of\s+{_DOC})?"
+    rf"|who\s+(?:wrote|authored)\s+{_DOC}"
+    rf"|{_WHAT_IS}\s+the\s+author(?:'s\s+name)?(?:\s+of\s+{_DOC})?",
+    re.IGNORECASE,
+)
+_TITLE = re.compile(
+    rf"{_WHAT_IS}\s+the\s+title(?:\s+of\s+{_DOC})?"
+    rf"|{_WHAT_IS}\s+{_DOC}\s+(?:called|titled)",
+    re.IGNORECASE,
+)
+_LOOKUP = re.compile(
+    r"(?:on\s+)?(?:which|what)\s+pages?\s+"
+    r"(?:mentions?|contains?|references?|refers?\s+to|talks?\s+about|discuss(?:es)?|includes?|has|have)\s+"
+    r"(?P<after>.+)"
+    r"|(?:on\s+)?(?:which|what)\s+pages?\s+(?:is|are)\s+(?P<before>.+?)\s+"
+    r"(?:mentioned|referenced|discussed|defined)(?:\s+on)?"
+    rf"|where\s+(?:is|are)\s+(?P<where>.+?)\s+(?:mentioned|referenced)(?:\s+in\s+{_DOC})?"
+    rf"|where\s+does\s+{_DOC}\s+(?:mention|reference|refer\s+to)\s+(?P<mention>.+)",
+    re.IGNORECASE,
+)
+_TRAILING_DOC = re.compile(rf"\s+(?:in|of)\s+{_DOC}$", re.IGNORECASE)
+_LEADING_ARTICLE = re.compile(r"^(?:the|a|an)\s+", re.IGNORECASE)
+_QUOTES = "\"'“”‘’`"
+
+
+class DocumentFacts(Protocol):
+    """Metadata the fast path can answer from (PDFMetadata)."""
+    title: str | None
+    author: str | None
+    pages: int
+
+
+@dataclass(frozen=True)
+class LocalAnswer:
+    """An answer produced without the model."""
+    intent: str
+    text: str
+
+
+def _normalize(question: str) -> str:
+    """Collapse whitespace and drop end punctuation (intents match case-insensitively)."""
+    return " ".join(question.split()).rstrip("?.! ")
+
+
+def _pages_label(pages: list[int]) -> str:
+    """'page 3', 'pages 3 and 7' or 'pages 2, 5 and 9'."""
+    numbers = [str(page) for page in pages]
+    if len(numbers) == 1:
+        return f"page {numbers[0]}"
+    return f"pages {', '.join(numbers[:-1])} and {numbers[-1]}"
+
+
+def lookup_phrase(question: str) -> str | None:
+    """The phrase a "which page mentions ..." question asks about, if it is one."""
+    match = _LOOKUP.fullmatch(_normalize(question))
+    if match is None:
+        return None
+    phrase = next(group for group in match.groups() if group)
+    phrase = _TRAILING_DOC.sub("", phrase).strip()
+    if phrase and phrase[0] in _QUOTES:
+        # Quoted phrases are looked up exactly as written
+        phrase = phrase.strip(_QUOTES + " ")
+    else:
+        phrase = _LEADING_ARTICLE.sub("", phrase)
+    if not phrase or len(phrase.split()) > MAX_LOOKUP_WORDS:
+        return None
+    return phrase
+
+
+def answer_locally(
+    question: str,
+    metadata: DocumentFacts,
+    find_pages: Callable[[str], list[int] | None],
+) -> LocalAnswer | None:
+    """
+    Answer a question from document metadata or an exact phrase lookup.
+
+    Only questions that match a known intent outright are answered; anything
+    else, or anything the document cannot answer for certain (no author in
+    the metadata, a phrase that was not found), returns None so the question
+    goes to the model.
+
+    Args:
+        question: User's question
+        metadata: Metadata of the session's document
+        find_pages: Pages containing a phrase, or None if that cannot be
+            determined yet (e.g. the document is still being ingested)
+
+    Returns:
+        The answer, or None to fall through to the model
+    """
+    normalized = _normalize(question)
+    if _PAGE_COUNT.fullmatch(normalized) and metadata.pages:
+        unit = "page" if metadata.pages == 1 else "pages"
+        return LocalAnswer("page_count", f"The document has {metadata.pages} {unit}.")
+    if _AUTHOR.fullmatch(normalized) and metadata.author:
+        return LocalAnswer("author", f"The author is {metadata.author}.")
+    if _TITLE.fullmatch(normalized) and metadata.title:
+        return LocalAnswer("title", f"The title is \"{metadata.title}\".")
+    phrase = lookup_phrase(question)
+    if phrase is not None:
+        pages = find_pages(phrase)
+        if pages:
+            return LocalAnswer("lookup", f"\"{phrase}\" appears on {_pages_label(pages)}.")
+    return None
@@ -0,0 +1,242 @@
+"""
+Map-reduce answering for questions about a whole document.
+"""
+import asyncio
+import os
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+
+MAP_CONCURRENCY = int(os.getenv("MAP_CONCURRENCY", "4"))  # map calls in flight per document
+SECTION_TOKEN_BUDGET = int(os.getenv("SECTION_TOKEN_BUDGET", "3000"))  # tokens per map section
+CHARS_PER_TOKEN = 4  # rough estimate for English text
+MAP_CACHE_SIZE = 32  # documents whose map outputs are kept
+
+_DOCUMENT = r"(document|contract|agreement|file|pdf|text|report|paper)"
+_WHOLE = rf"(it|this(\s+{_DOCUMENT})?|the\s+((whole|entire|full)\s+)?{_DOCUMENT})(?!['’]s)"
+_WHOLE_DOCUMENT_PATTERN = re.compile(
+    # Asks for a summary of the document itself: "Summarize this contract", "TL;DR"
+    rf"^\s*(please\s+)?(summari[sz]e|tl;?dr)(\s+{_WHOLE})?\s*[.?!]*\s*$|"
+    rf"\b(summari[sz]e|outline|(summary|overview|outline)\s+of)\s+{_WHOLE}\b|"
+    # Asks for every instance of something: "List every deadline", "What are all the parties?"
+    r"\b(list|find|extract|identify|enumerate|what\s+are)\s+(all|every|each)\b|"
+    rf"\b(list|enumerate)\b.*\b(in|across|throughout)\s+{_WHOLE}\b",
+    re.IGNORECASE,
+)
+# Questions confined to one part of the document are answered from retrieval
+_SCOPED_PATTERN = re.compile(
+    r"\b(in|under|of|from)\s+(the\s+)?(clause|section|page|paragraph|article|schedule|exhibit|appendix)s?\b",
+    re.IGNORECASE,
+)
+
+MAP_INSTRUCTIONS = (
+    "You are reading one section of a longer document. Write concise notes on this "
+    "section that preserve every fact a reader might later ask about: topics, names, "
+    "parties, dates, deadlines, amounts, obligations and definitions. Cite page numbers "
+    "as [p. N]. Do not add commentary."
+)
+
+
+def is_whole_document_question(question: str) -> bool:
+    """
+    Whether a question needs the whole document rather than a few retrieved chunks.
+
+    Only explicit requests qualify: summarizing the document itself, or
+    listing every instance of something, not confined to a clause, section or
+    page. A question that merely mentions a summary ("Where is the summary of
+    fees?") is answered from retrieval.
+    """
+    return bool(_WHOLE_DOCUMENT_PATTERN.search(question)) and not _SCOPED_PATTERN.search(question)
+
+
+@dataclass
+class Section:
+    """A token-budgeted run of consecutive pages."""
+    first_page: int
+    last_page: int
+    text: str
+
+    @property
+    def label(self) -> str:
+        """Human-readable page range."""
+        if self.first_page == self.last_page:
+            return f"page {self.first_page}"
+        return f"pages {self.first_page}-{self.last_page}"
+
+
+def split_sections(pages: list[tuple[int, str]], token_budget: int = SECTION_TOKEN_BUDGET) -> list[Section]:
+    """
+    Group pages into sections of at most ``token_budget`` (estimated) tokens.
+
+    Pages larger than the budget are split across several sections.
+
+    Args:
+        pages: (page_number, text) in page order
+        token_budget: Maximum estimated tokens per section
+
+    Returns:
+        Sections in document order
+    """
+    char_budget = max(1, token_budget * CHARS_PER_TOKEN)
+    sections: list[Section] = []
+    parts: list[str] = []
+    first_page = last_page = 0
+    used = 0
+
+    def flush() -> None:
+        nonlocal parts, used
+        if parts:
+            sections.append(Section(first_page, last_page, "\n\n".join(parts)))
+        parts, used = [], 0
+
+    for page, text in pages:
+        text = text.strip()
+        while text:
+            if used and used + len(text) > char_budget:
+                flush()
+            if not parts:
+                first_page = page
+            piece, text = text[:char_budget - used], text[char_budget - used:]
+            parts.append(f"[p. {page}]\n{piece}")
+            last_page = page
+            used += len(piece)
+            if used >= char_budget:
+                flush()
+    flush()
+    return sections
+
+
+def build_map_prompt(section: Section) -> str:
+    """Prompt for the per-section map call (independent of the user's question)."""
+    return f"{MAP_INSTRUCTIONS}\n\n--- Section ({section.label}) ---\n{section.text}\n--- End Section ---"
+
+
+def build_reduce_prompt(question: str, notes: list[tuple[Section, str]]) -> str:
+    """Prompt for the final answer, built from every section's notes."""
+    rendered = "\n\n".join(f"## Notes on {section.label}\n{text}" for section, text in notes)
+    return (
+        "The notes below cover an entire document, section by section. Answer the "
+        "question using all of them, citing pages where helpful.\n\n"
+        f"--- Document Notes ---\n{rendered}\n--- End Notes ---\n\n{question}"
+    )
+
+
+class MapCache:
+    """
+    LRU cache of map outputs keyed by document content hash.
+
+    Map prompts do not depend on the question, so every later whole-document
+    question about the same content only pays for the reduce step. Concurrent
+    requests for the same document share one in-flight map run.
+    """
+
+    def __init__(self, max_documents: int = MAP_CACHE_SIZE) -> None:
+        """Create an empty cache."""
+        self.max_documents = max_documents
+        self._entries: OrderedDict[tuple, list[tuple[Section, str]]] = OrderedDict()
+        self._inflight: dict[tuple, asyncio.Task] = {}
+
+    def get(self, key: tuple) -> list[tuple[Section, str]] | None:
+        """Cached notes for a key, if present."""
+        notes = self._entries.get(key)
+        if notes is not None:
+            self._entries.move_to_end(key)
+        return notes
+
+    def put(self, key: tuple, notes: list[tuple[Section, str]]) -> None:
+        """Store notes, evicting the least recently used document."""
+        self._entries[key] = notes
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_documents:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop all cached notes."""
+        self._entries.clear()
+
+    async def get_or_compute(
+        self, key: tuple, compute: Callable[[], Awaitable[list[tuple[Section, str]]]]
+    ) -> list[tuple[Section, str]]:
+        """
+        Return cached notes, or compute them once even if requested concurrently.
+
+        The computation is shielded: a caller that goes away does not cancel
+        work other callers (or the cache) are waiting for.
+        """
+        notes = self.get(key)
+        if notes is not None:
+            return notes
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(compute())
+            self._inflight[key] = task
+
+            def finish(done: asyncio.Task) -> None:
+                self._inflight.pop(key, None)
+                if not done.cancelled() and done.exception() is None:
+                    self.put(key, done.result())
+
+            task.add_done_callback(finish)
+        return await asyncio.shield(task)
+
+
+map_cache = MapCache()
+
+
+async def map_sections(
+    sections: list[Section],
+    complete: Callable[[str], Awaitable[str]],
+    concurrency: int = MAP_CONCURRENCY,
+) -> list[tuple[Section, str]]:
+    """
+    Run the map step for every section concurrently, at most ``concurrency`` at a time.
+
+    Args:
+        sections: Sections to map
+        complete: Async function returning the model's answer to a prompt
+
+    Returns:
+        (section, notes) in document order
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def map_one(section: Section) -> tuple[Section, str]:
+        async with semaphore:
+            return section, await complete(build_map_prompt(section))
+
+    return list(await asyncio.gather(*(map_one(section) for section in sections)))
+
+
+async def map_document(
+    content_hash: str,
+    load_pages: Callable[[], list[tuple[int, str]]],
+    complete: Callable[[str], Awaitable[str]],
+    cacheable: bool = True,
+    concurrency: int = MAP_CONCURRENCY,
+    token_budget: int = SECTION_TOKEN_BUDGET,
+    cache: MapCache = map_cache,
+) -> list[tuple[Section, str]]:
+    """
+    Map a document into per-section notes, reusing cached notes when possible.
+
+    Args:
+        content_hash: Hash identifying the document content
+        load_pages: Returns (page_number, text) in page order; not called on a cache hit
+        complete: Async function returning the model's answer to a prompt
+        cacheable: False when the pages are incomplete (document still ingesting)
+        concurrency: Maximum map calls in flight
+        token_budget: Maximum estimated tokens per section
+        cache: Cache to read and populate
+
+    Returns:
+        (section, notes) in document order
+    """
+    async def compute() -> list[tuple[Section, str]]:
+        sections = split_sections(await asyncio.to_thread(load_pages), token_budget)
+        return await map_sections(sections, complete, concurrency)
+
+    if not cacheable:
+        return await compute()
+    return await cache.get_or_compute((content_hash, token_budget), compute)
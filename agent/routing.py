@@ -0,0 +1,146 @@
+"""
+Model routing by prompt size and request class, and hedged-request settings.
+"""
+import json
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+
+from agent.mapreduce import CHARS_PER_TOKEN
+from backend.metrics import Metrics, metrics
+
+
+DEFAULT_MODEL = "gpt-4o-mini"
+
+# Hedging: a second request is sent when the first token is slower than this
+# percentile of recent upstream TTFTs (or HEDGE_DELAY until enough are seen)
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_DELAY = float(os.getenv("HEDGE_DELAY", "2.0"))  # seconds, before enough samples exist
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MIN_DELAY = 0.05  # seconds; never hedge immediately
+UPSTREAM_TTFT_SERIES = "upstream.ttft_seconds"
+
+REQUEST_CLASSES = ("chat", "reduce", "map", "batch")
+
+
+@dataclass(frozen=True)
+class Route:
+    """
+    Where one completion is sent.
+
+    Attributes:
+        model: Model id
+        base_url: OpenAI-compatible endpoint, or None for the default API
+        api_key_env: Environment variable holding the key for this endpoint
+        max_tokens: Largest estimated prompt (in tokens) this route accepts, None for any
+        classes: Request classes this route serves, empty for all
+    """
+    model: str
+    base_url: str | None = None
+    api_key_env: str = "OPENAI_API_KEY"
+    max_tokens: int | None = None
+    classes: tuple[str, ...] = ()
+
+    def accepts(self, tokens: int, request_class: str) -> bool:
+        """Whether a prompt of ``tokens`` estimated tokens in ``request_class`` may use this route."""
+        if self.classes and request_class not in self.classes:
+            return False
+        return self.max_tokens is None or tokens <= self.max_tokens
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count of a prompt."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def default_model() -> str:
+    """Model used when no route matches (``OPENAI_MODEL``)."""
+    return os.getenv("OPENAI_MODEL") or DEFAULT_MODEL
+
+
+@lru_cache(maxsize=8)
+def parse_routes(config: str) -> tuple[Route, ...]:
+    """
+    Parse a ``MODEL_ROUTES`` value.
+
+    The value is a JSON list of objects with ``model`` and optional
+    ``base_url``, ``api_key_env``, ``max_tokens`` and ``classes`` keys, tried
+    in order, e.g.::
+
+        [{"model": "gpt-4o-mini", "max_tokens": 6000},
+         {"model": "gpt-4o", "classes": ["chat", "reduce"]}]
+
+    Raises:
+        ValueError: If the value is not a list of route objects
+    """
+    try:
+        entries = json.loads(config)
+        if not isinstance(entries, list):
+            raise ValueError("expected a JSON list")
+        return tuple(
+            Route(
+                model=entry["model"],
+                base_url=entry.get("base_url"),
+                api_key_env=entry.get("api_key_env", "OPENAI_API_KEY"),
+                max_tokens=entry.get("max_tokens"),
+                classes=tuple(entry.get("classes", ())),
+            )
+            for entry in entries
+        )
+    except (TypeError, KeyError, json.JSONDecodeError) as e:
+        raise ValueError(f"Invalid MODEL_ROUTES: {str(e)}") from e
+
+
+def configured_routes() -> tuple[Route, ...]:
+    """Routes from the ``MODEL_ROUTES`` environment variable (none if unset)."""
+    config = os.getenv("MODEL_ROUTES", "").strip()
+    return parse_routes(config) if config else ()
+
+
+def select_route(prompt: str, request_class: str = "chat", routes: tuple[Route, ...] | None = None) -> Route:
+    """
+    Pick the route for a prompt.
+
+    Args:
+        prompt: Full prompt, including any document context
+        request_class: One of REQUEST_CLASSES
+        routes: Routes to choose from (defaults to ``MODEL_ROUTES``)
+
+    Returns:
+        The first route accepting the prompt, else ``OPENAI_MODEL`` on the default API
+    """
+    tokens = estimate_tokens(prompt)
+    for route in configured_routes() if routes is None else routes:
+        if route.accepts(tokens, request_class):
+            return route
+    return Route(model=default_model())
+
+
+def hedge_route(primary: Route) -> Route | None:
+    """
+    Alternate route for hedged requests, or None if hedging is off.
+
+    Hedging is on when ``HEDGE_MODEL`` and/or ``HEDGE_BASE_URL`` is set;
+    whichever is unset is taken from the primary route.
+    """
+    model = os.getenv("HEDGE_MODEL")
+    base_url = os.getenv("HEDGE_BASE_URL")
+    if not model and not base_url:
+        return None
+    return Route(
+        model=model or primary.model,
+        base_url=base_url or primary.base_url,
+        api_key_env=os.getenv("HEDGE_API_KEY_ENV", primary.api_key_env),
+    )
+
+
+def hedge_delay(registry: Metrics = metrics) -> float:
+    """
+    Seconds to wait for a first token before sending the hedged request.
+
+    Uses the ``HEDGE_PERCENTILE`` of recent upstream TTFTs, so only the slow
+    tail of requests is duplicated.
+    """
+    if registry.count(UPSTREAM_TTFT_SERIES) < HEDGE_MIN_SAMPLES:
+        return HEDGE_DELAY
+    return max(HEDGE_MIN_DELAY, registry.percentile(UPSTREAM_TTFT_SERIES, HEDGE_PERCENTILE))
@@ -1,18 +1,57 @@
 """
 FastAPI application with streaming endpoint for RAG chatbot.
 """
+import asyncio
+import contextvars
+import hashlib
+import json
 import os
-from fastapi import FastAPI, HTTPException, UploadFile, File
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing
+from typing import AsyncIterator, Awaitable, Callable, Iterator, Literal
+from fastapi import FastAPI, HTTPException, UploadFile, File, WebSocket
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 from agent.agent import create_agent
+from agent.fastpath import answer_locally
+from agent.mapreduce import build_reduce_prompt, is_whole_document_question, map_document
+from agent.routing import UPSTREAM_TTFT_SERIES, hedge_delay, hedge_route, select_route
+from backend.metrics import metrics
+from backend.multiplex import ChatConnection
+from backend.prefetch import context_cache
+from backend.resume import StreamExpired, stream_logs
+from backend.storage import (
+    MAX_PAGE_RANGE,
+    DocumentRegistry,
+    StoredDocument,
+    build_context,
+    build_contexts,
+)
+from backend.tracing import TracingMiddleware, span
+from backend.upstream import (
+    STREAM_TOTAL_TIMEOUT,
+    STREAM_TTFT_TIMEOUT,
+    ClientDisconnected,
+    DeadlineExceeded,
+    hedged_stream,
+    stream_upstream,
+)
+from parsing.lazy_pdf import LazyPDF
 from parsing.pdf_parser import PDFParser, PDFMetadata
+from parsing.sandbox import parse_sandbox
 
 # Load environment variables
 load_dotenv()
 
+# Batch questions
+MAX_BATCH_QUESTIONS = 500
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))  # completions in flight per batch
+COMPLETION_WORKERS = int(os.getenv("COMPLETION_WORKERS", "16"))  # blocking completions in flight per process
+
 # Check for required environment variables at startup
 if not os.getenv("OPENAI_API_KEY"):
     print("⚠️  WARNING: OPENAI_API_KEY not found in environment variables!")
@@ -32,13 +71,35 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Trace-Id"],
 )
 
+# Per-request span timeline (and opt-in X-Profile sampling)
+app.add_middleware(TracingMiddleware)
+
 
 class ChatRequest(BaseModel):
     """Request model for chat endpoint."""
     message: str
     session_id: str | None = None
+    # "auto" uses map-reduce for whole-document questions ("summarize...", "list every...")
+    mode: Literal["auto", "rag", "map_reduce"] = "auto"
+    # Optional per-request deadlines in seconds (capped at the server limits)
+    ttft_timeout: float | None = Field(default=None, gt=0)
+    total_timeout: float | None = Field(default=None, gt=0)
+
+
+class PrefetchRequest(BaseModel):
+    """Request model for speculative context preparation."""
+    partial: str
+    session_id: str | None = None
+
+
+class BatchRequest(BaseModel):
+    """Request model for batch question endpoint."""
+    questions: list[str]
+    session_id: str | None = None
+    concurrency: int | None = None
 
 
 @app.get("/")
@@ -53,49 +114,199 @@ async def health():
     return {"status": "healthy"}
 
 
-async def stream_agent_response(prompt: str, session_id: str | None = None) -> str:
+def _with_document_context(prompt: str, document_text: str) -> str:
+    """Prefix a question with the document context, if there is any."""
+    if not document_text:
+        return prompt
+    return f"\n\n--- Document Content ---\n{document_text}\n--- End Document ---\n\n{prompt}"
+
+
+def _event_content(event) -> list[str]:
+    """Extract the text content carried by an agent run event."""
+    if hasattr(event, "content") and event.content:
+        return [event.content]
+    if hasattr(event, "messages") and event.messages:
+        return [
+            message.content
+            for message in event.messages
+            if hasattr(message, "content") and message.content
+        ]
+    return []
+
+
+async def _agent_chunks(agent, prompt: str, session_id: str | None) -> AsyncIterator[str]:
+    """
+    Run the agent with streaming enabled and yield its text chunks.
+    
+    Uses the agent's async run, so cancelling the reading task or closing
+    this generator aborts the upstream HTTP stream at once, even while the
+    first token is still awaited.
+    """
+    with span("upstream.generate"):
+        with span("upstream.connect"):
+            response = agent.arun(
+                prompt,
+                stream=True,
+                session_id=session_id,
+            )
+        async with aclosing(response):
+            async for event in response:
+                for content in _event_content(event):
+                    yield content
+
+
+async def stream_agent_response(
+    prompt: str,
+    session_id: str | None = None,
+    mode: str = "auto",
+    ttft_timeout: float = STREAM_TTFT_TIMEOUT,
+    total_timeout: float = STREAM_TOTAL_TIMEOUT,
+    is_disconnected: Callable[[], Awaitable[bool]] | None = None,
+) -> str:
     """
     Stream agent response token by token.
     
+    The upstream generation is read asynchronously and its HTTP stream is
+    closed as soon as the client disconnects or a deadline is missed. The model is routed by
+    prompt size; with hedging configured, a first token slower than recent
+    upstream latency triggers a second request and the slower one is cancelled.
+    
     Args:
         prompt: User's question
         session_id: Optional session ID for conversation history
+        mode: "rag" (retrieved chunks), "map_reduce" (notes on every section,
+            then a streamed reduce answer) or "auto" to pick per question
+        ttft_timeout: Seconds allowed until the first token
+        total_timeout: Seconds allowed for the whole response
+        is_disconnected: Async check for a departed client
         
     Yields:
         Text chunks as they are generated
     """
+    started = time.monotonic()
+    metrics.increment("stream.requests")
     try:
-        agent = create_agent()
+        storage_key = session_id or "default"
+        document = pdf_storage.get(storage_key)
+        
+        # Metadata and exact page lookups are answered without the model
+        if document is not None and mode != "map_reduce":
+            with span("fastpath") as fastpath_span:
+                local = await run_in_threadpool(
+                    answer_locally, prompt, document.metadata, document.find_phrase
+                )
+                if fastpath_span is not None:
+                    fastpath_span.attributes["intent"] = local.intent if local else None
+            if local is not None:
+                metrics.increment(f"fastpath.{local.intent}")
+                metrics.observe("stream.ttft_seconds", time.monotonic() - started)
+                yield local.text
+                return
         
         # Get PDF content if available for this session
-        storage_key = session_id or "default"
-        pdf_context = ""
-        if storage_key in pdf_storage:
-            pdf_text = pdf_storage[storage_key]
-            # Add PDF context to prompt (simple RAG approach)
-            pdf_context = f"\n\n--- Document Content ---\n{pdf_text[:8000]}\n--- End Document ---\n\n"
-            # Truncate to avoid token limits, keeping most recent content
-        
-        # Combine PDF context with user prompt
-        enhanced_prompt = pdf_context + prompt if pdf_context else prompt
-        
-        # Run agent with streaming enabled
-        response = agent.run(
-            enhanced_prompt,
-            stream=True,
-            session_id=session_id,
-        )
+        with span("context.assemble") as context_span:
+            use_map_reduce = document is not None and (
+                mode == "map_reduce" or (mode == "auto" and is_whole_document_question(prompt))
+            )
+            if use_map_reduce:
+                with span("mapreduce.map"):
+                    try:
+                        notes = await asyncio.wait_for(
+                            map_document(
+                                document.content_hash,
+                                lambda: document.page_range(1, document.metadata.pages),
+                                lambda map_prompt: _complete_async(map_prompt, "map"),
+                                cacheable=document.progress()["done"],
+                            ),
+                            timeout=total_timeout,
+                        )
+                    except asyncio.TimeoutError:
+                        raise DeadlineExceeded("total", total_timeout)
+                enhanced_prompt = build_reduce_prompt(prompt, notes)
+            else:
+                pdf_context = ""
+                if document is not None:
+                    # Reuse the context prepared while the question was being typed
+                    pdf_context = await context_cache.get(storage_key, prompt, document)
+                    prefetched = pdf_context is not None
+                    metrics.increment("prefetch.hits" if prefetched else "prefetch.misses")
+                    if context_span is not None:
+                        context_span.attributes["prefetched"] = prefetched
+                    if not prefetched:
+                        # Most relevant chunks of the pages indexed so far (within a char
+                        # budget); lazy pages are extracted here, so keep it off the loop
+                        pdf_context = await run_in_threadpool(build_context, document, prompt)
+                    metrics.observe(
+                        "context.prefetched_seconds" if prefetched else "context.built_seconds",
+                        time.monotonic() - started,
+                    )
+                
+                # Combine PDF context with user prompt
+                enhanced_prompt = _with_document_context(prompt, pdf_context)
+            if context_span is not None:
+                context_span.attributes["prompt.chars"] = len(enhanced_prompt)
+                context_span.attributes["map_reduce"] = use_map_reduce
+        
+        # Pick the model for this prompt, and an alternate for hedging
+        route = select_route(enhanced_prompt, "reduce" if use_map_reduce else "chat")
+        backup_route = hedge_route(route)
+        with span("agent.create", model=route.model):
+            agent = create_agent(route)
+        
+        def open_stream(stream_agent) -> AsyncIterator[str]:
+            # Run agent with streaming enabled, off the event loop. The first-token
+            # budget starts here; context assembly (e.g. a map phase) only counts
+            # against the total budget
+            return stream_upstream(
+                lambda: _agent_chunks(stream_agent, enhanced_prompt, session_id),
+                ttft_timeout=ttft_timeout,
+                total_timeout=total_timeout - (time.monotonic() - started),
+                is_disconnected=is_disconnected,
+            )
+        
+        upstream_started = time.monotonic()
         
-        # Stream the response
-        for event in response:
-            if hasattr(event, "content") and event.content:
-                yield event.content
-            elif hasattr(event, "messages") and event.messages:
-                for message in event.messages:
-                    if hasattr(message, "content") and message.content:
-                        yield message.content
-                        
+        def on_first_chunk(winner: str) -> None:
+            metrics.observe(UPSTREAM_TTFT_SERIES, time.monotonic() - upstream_started)
+            metrics.increment(f"stream.winner.{winner}")
+        
+        chunks = hedged_stream(
+            lambda: open_stream(agent),
+            (lambda: open_stream(create_agent(backup_route))) if backup_route else None,
+            hedge_after=hedge_delay(),
+            on_first_chunk=on_first_chunk,
+        )
+        async with aclosing(chunks):
+            with span("upstream.first_token"):
+                first_chunk = await anext(chunks, None)
+            metrics.observe("stream.ttft_seconds", time.monotonic() - started)
+            
+            # Stream the response
+            with span("upstream.stream") as stream_span:
+                token_count = 0
+                if first_chunk is not None:
+                    token_count += 1
+                    yield first_chunk
+                async for chunk in chunks:
+                    token_count += 1
+                    yield chunk
+                if stream_span is not None:
+                    stream_span.attributes["chunks"] = token_count
+        metrics.observe("stream.duration_seconds", time.monotonic() - started)
+    
+    except DeadlineExceeded as e:
+        metrics.increment(f"stream.deadline_exceeded.{e.kind}")
+        # Report the configured limit, not the budget that was left for the upstream
+        configured = ttft_timeout if e.kind == "ttft" else total_timeout
+        yield f"\n\nError: {str(DeadlineExceeded(e.kind, configured))}"
+    except ClientDisconnected:
+        # Nobody is reading any more; the upstream call has been cancelled
+        metrics.increment("stream.cancelled")
+    except (asyncio.CancelledError, GeneratorExit):
+        metrics.increment("stream.cancelled")
+        raise
     except Exception as e:
+        metrics.increment("stream.errors")
         yield f"\n\nError: {str(e)}"
 
 
@@ -104,14 +315,207 @@ async def stream_chat(request: ChatRequest):
     """
     Stream chatbot response endpoint.
     
-    Returns streaming response with agent's answer.
+    Returns streaming response with agent's answer. The answer is recorded
+    in a token log under the ID in the ``X-Stream-Id`` header; after a
+    dropped connection, /stream/resume continues it without a new completion.
     """
     if not request.message.strip():
         raise HTTPException(status_code=400, detail="Message cannot be empty")
     
+    # Requests may tighten the server deadlines, not extend them
+    ttft_timeout = min(request.ttft_timeout or STREAM_TTFT_TIMEOUT, STREAM_TTFT_TIMEOUT)
+    total_timeout = min(request.total_timeout or STREAM_TOTAL_TIMEOUT, STREAM_TOTAL_TIMEOUT)
+    # Generation outlives this connection until nobody has read it for the grace period
+    log = stream_logs.start(
+        lambda log: stream_agent_response(
+            request.message,
+            request.session_id,
+            request.mode,
+            ttft_timeout=ttft_timeout,
+            total_timeout=total_timeout,
+            is_disconnected=log.abandoned,
+        )
+    )
+    return StreamingResponse(
+        log.follow(),
+        media_type="text/plain",
+        headers={"X-Stream-Id": log.stream_id},
+    )
+
+
+@app.get("/stream/resume")
+async def resume_stream(stream_id: str, offset: int = 0):
+    """
+    Continue a /stream answer after a dropped connection.
+    
+    Replays the answer from ``offset`` (characters already received), then
+    streams the rest live. Streams stay resumable for RESUME_TTL seconds
+    after they finish.
+    """
+    log = stream_logs.get(stream_id)
+    if log is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired stream")
+    try:
+        log.check(offset)
+    except StreamExpired as e:
+        raise HTTPException(status_code=410, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    metrics.increment("stream.resumed")
     return StreamingResponse(
-        stream_agent_response(request.message, request.session_id),
+        log.follow(offset),
         media_type="text/plain",
+        headers={"X-Stream-Id": log.stream_id},
+    )
+
+
+@app.post("/prefetch")
+async def prefetch_context(request: PrefetchRequest):
+    """
+    Prepare document context for a question that is still being typed.
+    
+    Retrieval and context assembly run in the background; a /stream (or
+    /ws) question whose terms are mostly covered by the hint reuses the
+    result instead of preparing its context from scratch.
+    """
+    storage_key = request.session_id or "default"
+    document = pdf_storage.get(storage_key)
+    # Whole-document questions are answered from map notes, not retrieved context
+    if document is None or is_whole_document_question(request.partial):
+        return {"prefetched": False}
+    started = context_cache.prefetch(
+        storage_key,
+        request.partial,
+        document,
+        lambda: run_in_threadpool(build_context, document, request.partial),
+    )
+    return {"prefetched": started}
+
+
+@app.websocket("/ws")
+async def chat_socket(websocket: WebSocket, session_id: str | None = None):
+    """
+    Persistent chat connection carrying many concurrent answer streams.
+    
+    See backend.multiplex for the frame protocol: streams are tagged by
+    client-chosen IDs, can be cancelled individually, send chunks within
+    flow-control credits, and the session's ingestion progress is pushed.
+    """
+    await websocket.accept()
+    connection = ChatConnection(
+        websocket, stream_agent_response, _document_progress, session_id, logs=stream_logs
+    )
+    await connection.run()
+
+
+def _document_progress(session_id: str | None) -> dict | None:
+    """Ingestion progress of a session's document, or None if it has none."""
+    document = pdf_storage.get(session_id or "default")
+    return document.progress() if document is not None else None
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """
+    Request counters and latency percentiles for this worker.
+    """
+    return metrics.snapshot()
+
+
+def _complete(prompt: str, request_class: str = "batch") -> str:
+    """Run a non-streaming agent completion on the routed model (blocking)."""
+    with span("agent.complete", request_class=request_class):
+        response = create_agent(select_route(prompt, request_class)).run(prompt)
+    return response.content or ""
+
+
+# Completions block a thread for the whole upstream call; they get their own
+# bounded pool so batches and map phases cannot starve the shared threadpool
+# that uploads, retrieval and page requests run on
+_completion_executor = ThreadPoolExecutor(max_workers=COMPLETION_WORKERS, thread_name_prefix="completion")
+
+
+async def _complete_async(prompt: str, request_class: str = "batch") -> str:
+    """Run a non-streaming agent completion on the completion pool."""
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(
+        _completion_executor, context.run, _complete, prompt, request_class
+    )
+
+
+async def stream_batch_answers(questions: list[str], document: StoredDocument, concurrency: int):
+    """
+    Answer many questions about one document, yielding results as they finish.
+    
+    Context for every question is retrieved in a single pass over the index;
+    completions then run concurrently, at most ``concurrency`` at a time.
+    
+    Yields:
+        NDJSON lines: one per question (tagged with its index, with either an
+        answer or an error), then a summary line
+    """
+    with span("batch.context", questions=len(questions)):
+        contexts = await run_in_threadpool(build_contexts, document, questions)
+    
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def answer(index: int) -> dict:
+        question = questions[index].strip()
+        if not question:
+            return {"index": index, "answer": None, "error": "Question cannot be empty"}
+        local = answer_locally(question, document.metadata, document.find_phrase)
+        if local is not None:
+            metrics.increment(f"fastpath.{local.intent}")
+            return {"index": index, "answer": local.text, "error": None}
+        async with semaphore:
+            try:
+                prompt = _with_document_context(question, contexts[index])
+                text = await _complete_async(prompt)
+                return {"index": index, "answer": text, "error": None}
+            except Exception as e:
+                return {"index": index, "answer": None, "error": str(e)}
+    
+    tasks = [asyncio.create_task(answer(i)) for i in range(len(questions))]
+    failed = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            result = await next_done
+            failed += result["error"] is not None
+            yield json.dumps(result) + "\n"
+    finally:
+        for task in tasks:
+            task.cancel()
+    yield json.dumps({
+        "done": True,
+        "total": len(questions),
+        "succeeded": len(questions) - failed,
+        "failed": failed,
+    }) + "\n"
+
+
+@app.post("/batch")
+async def batch_questions(request: BatchRequest):
+    """
+    Answer a checklist of questions about the session's document.
+    
+    Returns a newline-delimited JSON stream with one result per question,
+    in completion order, followed by a summary line.
+    """
+    if not request.questions:
+        raise HTTPException(status_code=400, detail="Questions cannot be empty")
+    if len(request.questions) > MAX_BATCH_QUESTIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many questions. Maximum is {MAX_BATCH_QUESTIONS} per batch.",
+        )
+    storage_key = request.session_id or "default"
+    if storage_key not in pdf_storage:
+        raise HTTPException(status_code=400, detail="No PDF uploaded for this session")
+    
+    concurrency = max(1, min(request.concurrency or BATCH_CONCURRENCY, BATCH_CONCURRENCY * 4))
+    return StreamingResponse(
+        stream_batch_answers(request.questions, pdf_storage[storage_key], concurrency),
+        media_type="application/x-ndjson",
     )
 
 
@@ -120,42 +524,135 @@ class UploadResponse(BaseModel):
     success: bool
     message: str
     metadata: PDFMetadata | None = None
+    # Set when the upload revised the session's previous document
+    changed_pages: list[int] | None = None
 
 
 # In-memory storage for PDF content (simple implementation)
 # In production, use a proper database or vector store
-pdf_storage: dict[str, str] = {}  # session_id -> pdf_text
+pdf_storage = DocumentRegistry()  # session_id -> document shared by content hash
+
+# Background ingestion jobs, kept referenced until they finish
+_ingestion_tasks: set[asyncio.Future] = set()
+
+
+def _store_document(storage_key: str, document: StoredDocument) -> StoredDocument:
+    """Store a document for a session, returning the shared copy it now points at."""
+    return pdf_storage.attach(storage_key, document)
+
+
+def _shared_response(document: StoredDocument) -> UploadResponse:
+    """Upload response for a document another session already uploaded."""
+    return UploadResponse(
+        success=True,
+        message=f"PDF already loaded; sharing the existing copy ({document.metadata.pages} pages).",
+        metadata=document.metadata.model_copy(update={"text_length": document.text_length}),
+    )
 
 
 @app.post("/upload", response_model=UploadResponse)
 async def upload_pdf(
     file: UploadFile = File(...),
     session_id: str | None = None,
+    background: bool = False,
+    lazy: bool = False,
 ):
     """
     Upload and parse PDF file.
     
+    With ``background=true`` the response is returned as soon as the first
+    page with text is indexed; the remaining pages keep ingesting and are
+    searchable as they arrive (see ``/pdf/progress``).
+    
+    With ``lazy=true`` no text is extracted up front: pages are extracted
+    on demand (``/pdf/pages``, pages named in a question) and pre-extracted
+    into the index while the document is idle.
+    
     Returns parsed text and metadata.
     """
     try:
         # Read file content
-        file_content = await file.read()
-        file_size = len(file_content)
+        with span("upload.read"):
+            file_content = await file.read()
+            file_size = len(file_content)
         
         # Validate file
         PDFParser.validate_file(file.filename or "unknown.pdf", file_size)
         
-        # Parse PDF
-        text, metadata = PDFParser.parse(file_content, file.filename or "unknown.pdf")
+        filename = file.filename or "unknown.pdf"
+        storage_key = session_id or "default"
+        content_hash = hashlib.sha256(file_content).hexdigest()
+        
+        # Identical content uploaded by any session is parsed and held only once
+        shared = pdf_storage.attach_existing(storage_key, content_hash)
+        if shared is not None:
+            return _shared_response(shared)
+        
+        if lazy:
+            with span("upload.open_lazy", bytes=file_size):
+                source = await run_in_threadpool(LazyPDF, file_content, filename)
+            document = StoredDocument(
+                filename, source.metadata, source=source, content_hash=content_hash
+            )
+            if _store_document(storage_key, document) is not document:
+                return _shared_response(pdf_storage[storage_key])
+            document.start_prefetch()
+            return UploadResponse(
+                success=True,
+                message=f"PDF opened. {source.metadata.pages} pages will be extracted on demand.",
+                metadata=source.metadata,
+            )
+        
+        # Parse PDF page by page into a searchable document, in a resource-limited worker
+        with span("upload.parse", bytes=file_size):
+            metadata, page_hashes = await run_in_threadpool(parse_sandbox.inspect, file_content, filename)
+            document = StoredDocument(filename, metadata, content_hash=content_hash)
+            document.page_hashes = page_hashes
+            
+            # A new version of the session's document only extracts its changed pages
+            previous = pdf_storage.get(storage_key)
+            to_extract = None
+            if previous is not None and previous.can_revise():
+                with span("upload.revise"):
+                    to_extract = document.revise(previous, document.page_hashes)
+            
+            pages = document.normalizer.normalize_pages(
+                parse_sandbox.iter_pages(file_content, filename, to_extract, document.skipped_pages)
+            )
+            await run_in_threadpool(document.ingest, pages, 1 if background else None)
+        
+        if document.error:
+            raise ValueError(document.error)
+        if not document.indexed_pages:
+            raise ValueError("PDF contains no extractable text.")
         
         # Store PDF content (use session_id or default)
-        storage_key = session_id or "default"
-        pdf_storage[storage_key] = text
+        if _store_document(storage_key, document) is not document:
+            return _shared_response(pdf_storage[storage_key])
         
+        if not document.done:
+            job = asyncio.get_running_loop().run_in_executor(None, document.ingest, pages)
+            _ingestion_tasks.add(job)
+            job.add_done_callback(_ingestion_tasks.discard)
+            return UploadResponse(
+                success=True,
+                message=f"PDF uploaded; ingesting {metadata.pages} pages in the background.",
+                metadata=metadata.model_copy(update={"text_length": document.text_length}),
+                changed_pages=document.changed_pages,
+            )
+        
+        if document.changed_pages is not None:
+            message = (
+                f"PDF revision uploaded. {len(document.changed_pages)} of {metadata.pages} pages "
+                f"changed and were re-indexed."
+            )
+        else:
+            message = f"PDF uploaded and parsed successfully. {metadata.pages} pages, {metadata.text_length} characters."
         return UploadResponse(
             success=True,
-            message=f"PDF uploaded and parsed successfully. {metadata.pages} pages, {metadata.text_length} characters.",
+            message=message,
             metadata=metadata,
+            changed_pages=document.changed_pages,
         )
         
     except ValueError as e:
@@ -173,22 +670,63 @@ async def get_pdf_info(session_id: str | None = None):
     if storage_key not in pdf_storage:
         return {"has_pdf": False, "message": "No PDF uploaded for this session"}
     
-    text = pdf_storage[storage_key]
+    document = pdf_storage[storage_key]
     return {
         "has_pdf": True,
-        "text_length": len(text),
-        "message": f"PDF available with {len(text)} characters",
+        "text_length": document.text_length,
+        "message": f"PDF available with {document.text_length} characters",
+        "progress": document.progress(),
     }
 
 
+@app.get("/pdf/progress")
+async def get_pdf_progress(session_id: str | None = None):
+    """
+    Get ingestion progress of the uploaded PDF.
+    """
+    storage_key = session_id or "default"
+    if storage_key not in pdf_storage:
+        raise HTTPException(status_code=404, detail="No PDF uploaded for this session")
+    return pdf_storage[storage_key].progress()
+
+
+@app.get("/pdf/pages")
+async def get_pdf_pages(start: int, end: int | None = None, session_id: str | None = None):
+    """
+    Get the text of a page range, extracting pages on demand if needed.
+    """
+    storage_key = session_id or "default"
+    if storage_key not in pdf_storage:
+        raise HTTPException(status_code=404, detail="No PDF uploaded for this session")
+    end = start if end is None else end
+    if end < start or end - start + 1 > MAX_PAGE_RANGE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid page range. Request between 1 and {MAX_PAGE_RANGE} pages.",
+        )
+    try:
+        pages = await run_in_threadpool(pdf_storage[storage_key].page_range, start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"pages": [{"page": page, "text": text} for page, text in pages]}
+
+
+@app.get("/pdf/storage")
+async def get_pdf_storage():
+    """
+    Shared document storage: sessions, distinct documents and memory saved by dedup.
+    """
+    return pdf_storage.stats()
+
+
 @app.delete("/pdf/remove")
 async def remove_pdf(session_id: str | None = None):
     """
     Remove uploaded PDF for this session.
     """
     storage_key = session_id or "default"
-    if storage_key in pdf_storage:
-        del pdf_storage[storage_key]
+    context_cache.discard(storage_key)
+    if pdf_storage.detach(storage_key):
         return {"success": True, "message": "PDF removed"}
     return {"success": False, "message": "No PDF to remove"}
 
@@ -0,0 +1,84 @@
+"""
+In-process request metrics.
+"""
+import threading
+from collections import defaultdict, deque
+
+
+SAMPLE_WINDOW = 1000  # most recent observations kept per series for percentiles
+
+
+class Metrics:
+    """
+    Thread-safe counters and latency series.
+
+    Series keep a bounded window of recent observations so percentiles track
+    current behaviour; counts and sums cover the whole process lifetime.
+    """
+
+    def __init__(self, window: int = SAMPLE_WINDOW) -> None:
+        """Create an empty registry."""
+        self.window = window
+        self._counters: dict[str, int] = defaultdict(int)
+        self._samples: dict[str, deque[float]] = {}
+        self._totals: dict[str, tuple[int, float]] = defaultdict(lambda: (0, 0.0))
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, amount: int = 1) -> None:
+        """Increase a counter."""
+        with self._lock:
+            self._counters[name] += amount
+
+    def observe(self, name: str, value: float) -> None:
+        """Record one observation (e.g. a latency in seconds)."""
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self.window)
+            samples.append(value)
+            count, total = self._totals[name]
+            self._totals[name] = (count + 1, total + value)
+
+    def count(self, name: str) -> int:
+        """Number of observations of a series currently in its window."""
+        with self._lock:
+            return len(self._samples.get(name, ()))
+
+    def percentile(self, name: str, q: float) -> float | None:
+        """
+        Percentile of the recent observations of a series.
+
+        Args:
+            name: Series name
+            q: Percentile in [0, 100]
+
+        Returns:
+            The percentile, or None if nothing has been observed
+        """
+        with self._lock:
+            samples = sorted(self._samples.get(name, ()))
+        if not samples:
+            return None
+        rank = min(len(samples) - 1, max(0, round(q / 100 * (len(samples) - 1))))
+        return samples[rank]
+
+    def snapshot(self) -> dict:
+        """All counters and series summaries, for the /metrics endpoint."""
+        with self._lock:
+            counters = dict(self._counters)
+            names = list(self._samples)
+            totals = dict(self._totals)
+        series = {}
+        for name in names:
+            count, total = totals[name]
+            series[name] = {
+                "count": count,
+                "sum": round(total, 6),
+                "p50": self.percentile(name, 50),
+                "p95": self.percentile(name, 95),
+                "p99": self.percentile(name, 99),
+            }
+        return {"counters": counters, "series": series}
+
+
+metrics = Metrics()
@@ -0,0 +1,246 @@
+"""
+Multiplexed chat streams over one WebSocket connection.
+
+Protocol (JSON text frames).
+
+Client to server:
+    {"type": "ask", "stream_id": "s1", "message": "...", "mode": "auto", "credits": 64}
+    {"type": "cancel", "stream_id": "s1"}
+    {"type": "credit", "stream_id": "s1", "credits": 32}
+    {"type": "session", "session_id": "..."}
+    {"type": "resume", "stream_id": "s1", "resume_id": "...", "offset": 120, "credits": 64}
+
+Server to client:
+    {"type": "start", "stream_id": "s1", "resume_id": "..."}
+    {"type": "chunk", "stream_id": "s1", "text": "..."}
+    {"type": "end", "stream_id": "s1", "reason": "done" | "cancelled" | "error", "error": null}
+    {"type": "progress", "session_id": "...", "progress": {...}}
+    {"type": "error", "stream_id": "s1" | null, "error": "..."}
+
+With a token log (see backend.resume), answers outlive the connection: a
+client that reconnects after a drop sends ``resume`` with the ``resume_id``
+from the ``start`` frame and the number of characters it already has, and
+gets the rest of the answer on a stream of its choosing.
+"""
+import asyncio
+import json
+import os
+from contextlib import aclosing
+from typing import AsyncIterator, Callable
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from backend.resume import StreamExpired, StreamLogs, TokenLog
+
+
+WS_INITIAL_CREDITS = int(os.getenv("WS_INITIAL_CREDITS", "64"))  # chunk frames a stream may send unacknowledged
+WS_MAX_STREAMS = int(os.getenv("WS_MAX_STREAMS", "8"))  # concurrent streams per connection
+WS_PROGRESS_INTERVAL = 0.5  # seconds between ingestion-progress checks
+
+
+class _Stream:
+    """Flow-control state of one stream."""
+
+    __slots__ = ("task", "credits", "granted", "log")
+
+    def __init__(self, credits: int) -> None:
+        self.task: asyncio.Task | None = None
+        self.credits = credits
+        self.granted = asyncio.Event()
+        self.log: TokenLog | None = None  # token log the stream reads from, if any
+
+
+class ChatConnection:
+    """
+    One client connection carrying many concurrent question streams.
+
+    Each ``ask`` starts an answer stream tagged with the client's stream ID.
+    A stream may only send as many chunk frames as it has credits; the client
+    grants more with ``credit`` frames, so a slow reader pauses its streams
+    instead of letting frames pile up. ``cancel`` stops one stream (and its
+    upstream call); closing the socket stops them all, unless answers are
+    recorded in token logs, in which case generation continues for the
+    reconnect grace period so the client can ``resume``. Ingestion progress
+    of the connection's session document is pushed as it changes.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        answer: Callable[..., AsyncIterator[str]],
+        progress: Callable[[str | None], dict | None],
+        session_id: str | None = None,
+        max_streams: int = WS_MAX_STREAMS,
+        initial_credits: int = WS_INITIAL_CREDITS,
+        logs: StreamLogs | None = None,
+    ) -> None:
+        """
+        Create a connection handler.
+
+        Args:
+            websocket: Accepted WebSocket
+            answer: Returns the answer chunks for (message, session_id, mode);
+                with ``logs`` it is also passed ``is_disconnected``
+            progress: Returns the session document's ingestion progress, or None
+            session_id: Session used for questions and progress events
+            max_streams: Maximum concurrent streams
+            initial_credits: Default credits of a new stream
+            logs: Token logs that make answers resumable across connections
+        """
+        self.websocket = websocket
+        self.answer = answer
+        self.progress = progress
+        self.session_id = session_id
+        self.max_streams = max_streams
+        self.initial_credits = initial_credits
+        self.logs = logs
+        self._streams: dict[str, _Stream] = {}
+        self._send_lock = asyncio.Lock()
+        self._closed = False
+
+    async def send(self, message: dict) -> None:
+        """Send one frame (frames from concurrent streams are never interleaved)."""
+        if self._closed:
+            return
+        async with self._send_lock:
+            await self.websocket.send_text(json.dumps(message))
+
+    async def run(self) -> None:
+        """Serve the connection until the client disconnects."""
+        progress_task = asyncio.create_task(self._push_progress())
+        try:
+            while True:
+                raw = await self.websocket.receive_text()
+                message = None
+                try:
+                    message = json.loads(raw)
+                    if not isinstance(message, dict):
+                        raise ValueError("Frames must be JSON objects")
+                    await self.handle(message)
+                except (TypeError, ValueError) as e:
+                    stream_id = message.get("stream_id") if isinstance(message, dict) else None
+                    await self.send({"type": "error", "stream_id": stream_id, "error": str(e)})
+        except WebSocketDisconnect:
+            pass
+        finally:
+            self._closed = True
+            progress_task.cancel()
+            tasks = [stream.task for stream in self._streams.values() if stream.task is not None]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(progress_task, *tasks, return_exceptions=True)
+
+    async def handle(self, message: dict) -> None:
+        """
+        Apply one client frame.
+
+        Raises:
+            ValueError: If the frame is invalid
+        """
+        kind = message.get("type")
+        stream_id = message.get("stream_id")
+        if kind == "session":
+            self.session_id = message.get("session_id")
+            return
+        if not isinstance(stream_id, str) or not stream_id:
+            raise ValueError("stream_id is required")
+
+        if kind in ("ask", "resume"):
+            if stream_id in self._streams:
+                raise ValueError(f"Stream {stream_id} is already open")
+            if len(self._streams) >= self.max_streams:
+                raise ValueError(f"Too many concurrent streams. Maximum is {self.max_streams}.")
+            chunks, log = self._open_ask(message) if kind == "ask" else self._open_resume(message)
+            stream = _Stream(int(message.get("credits", self.initial_credits)))
+            stream.log = log
+            self._streams[stream_id] = stream
+            if kind == "ask" and log is not None:
+                await self.send({"type": "start", "stream_id": stream_id, "resume_id": log.stream_id})
+            stream.task = asyncio.create_task(self._run_stream(stream_id, stream, chunks))
+        elif kind == "cancel":
+            stream = self._streams.get(stream_id)
+            if stream is not None and stream.task is not None:
+                if stream.log is not None:
+                    stream.log.cancel()
+                stream.task.cancel()
+        elif kind == "credit":
+            stream = self._streams.get(stream_id)
+            if stream is not None:
+                stream.credits += max(0, int(message.get("credits", 0)))
+                stream.granted.set()
+        else:
+            raise ValueError(f"Unknown frame type: {kind}")
+
+    def _open_ask(self, message: dict) -> tuple[AsyncIterator[str], TokenLog | None]:
+        """
+        Start answering an ``ask`` frame.
+
+        Returns:
+            The answer chunks and the token log recording them (None without logs)
+
+        Raises:
+            ValueError: If the question or mode is invalid
+        """
+        text = str(message.get("message") or "").strip()
+        if not text:
+            raise ValueError("Message cannot be empty")
+        mode = message.get("mode", "auto")
+        if mode not in ("auto", "rag", "map_reduce"):
+            raise ValueError(f"Unknown mode: {mode}")
+        session_id = self.session_id
+        if self.logs is None:
+            return self.answer(text, session_id, mode), None
+        log = self.logs.start(
+            lambda log: self.answer(text, session_id, mode, is_disconnected=log.abandoned)
+        )
+        return log.follow(), log
+
+    def _open_resume(self, message: dict) -> tuple[AsyncIterator[str], TokenLog | None]:
+        """
+        Continue a logged answer from the client's offset.
+
+        Raises:
+            ValueError: If the stream is unknown, expired or the offset is invalid
+        """
+        log = self.logs.get(str(message.get("resume_id"))) if self.logs is not None else None
+        if log is None:
+            raise ValueError("Unknown or expired stream")
+        offset = int(message.get("offset", 0))
+        try:
+            log.check(offset)
+        except StreamExpired as e:
+            raise ValueError(str(e)) from e
+        return log.follow(offset), log
+
+    async def _run_stream(self, stream_id: str, stream: _Stream, chunks: AsyncIterator[str]) -> None:
+        """Forward one answer's chunks within its credits, then send its end frame."""
+        reason, error = "done", None
+        try:
+            async with aclosing(chunks):
+                async for text in chunks:
+                    while stream.credits <= 0:
+                        stream.granted.clear()
+                        await stream.granted.wait()
+                    stream.credits -= 1
+                    await self.send({"type": "chunk", "stream_id": stream_id, "text": text})
+        except asyncio.CancelledError:
+            reason = "cancelled"
+        except Exception as e:
+            reason, error = "error", str(e)
+        finally:
+            self._streams.pop(stream_id, None)
+        try:
+            await self.send({"type": "end", "stream_id": stream_id, "reason": reason, "error": error})
+        except Exception:
+            # The socket went away while the stream was finishing
+            pass
+
+    async def _push_progress(self) -> None:
+        """Push ingestion progress of the session document whenever it changes."""
+        last: tuple[str | None, dict | None] = (None, None)
+        while True:
+            current = (self.session_id, self.progress(self.session_id))
+            if current != last and current[1] is not None:
+                await self.send({"type": "progress", "session_id": current[0], "progress": current[1]})
+            last = current
+            await asyncio.sleep(WS_PROGRESS_INTERVAL)
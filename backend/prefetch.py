@@ -0,0 +1,141 @@
+"""
+Speculative context preparation from partial-query hints.
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+from backend.storage import StoredDocument
+from retrieval.index import tokenize
+
+
+PREFETCH_TTL = float(os.getenv("PREFETCH_TTL", "60"))  # seconds a prepared context stays usable
+PREFETCH_MIN_OVERLAP = 0.6  # share of the final query's content terms that must appear in the hint
+PREFETCH_MIN_TERMS = 2  # hints with fewer content terms are not worth preparing
+PREFETCH_MAX_SESSIONS = 1024  # sessions with a prepared context kept
+
+# Question words and function words: every question shares them, so they say
+# nothing about whether a hint retrieved the right chunks
+STOP_WORDS = frozenset("""
+    a about all an and any are as at be been being by can could did do does for from
+    had has have how if in into is it its may me might must my no not of on or our
+    should so than that the their them then there these they this those to under
+    was we were what when where which who whom whose why will with would you your
+""".split())
+
+
+def content_terms(text: str) -> frozenset[str]:
+    """Index terms of a text that retrieval actually discriminates on (stop words dropped)."""
+    return frozenset(term for term in tokenize(text) if term not in STOP_WORDS)
+
+
+def term_overlap(hint_terms: frozenset[str], query_terms: frozenset[str]) -> float:
+    """Fraction of the query's content terms that the hint already covered."""
+    if not query_terms:
+        return 0.0
+    return len(query_terms & hint_terms) / len(query_terms)
+
+
+def _document_key(document: StoredDocument) -> tuple:
+    """Identifies a document and how much of it is indexed (contexts go stale as it grows)."""
+    return (id(document), document.content_hash, len(document.index))
+
+
+@dataclass
+class PreparedContext:
+    """A context being (or already) assembled for a hint."""
+    terms: frozenset[str]
+    document_key: tuple
+    context: asyncio.Future
+    created: float
+
+
+class ContextCache:
+    """
+    Per-session context prepared ahead of the final question.
+
+    While the user types, the UI sends debounced hints; retrieval and context
+    assembly run for the hint in the background. When the question arrives
+    and its content terms (stop words excluded) are mostly covered by the hint, the prepared (or still
+    preparing) context is used instead of starting from scratch.
+    """
+
+    def __init__(
+        self,
+        ttl: float = PREFETCH_TTL,
+        min_overlap: float = PREFETCH_MIN_OVERLAP,
+        max_sessions: int = PREFETCH_MAX_SESSIONS,
+    ) -> None:
+        """Create an empty cache."""
+        self.ttl = ttl
+        self.min_overlap = min_overlap
+        self.max_sessions = max_sessions
+        self._entries: OrderedDict[str, PreparedContext] = OrderedDict()
+
+    def prefetch(
+        self,
+        session: str,
+        hint: str,
+        document: StoredDocument,
+        build: Callable[[], Awaitable[str]],
+    ) -> bool:
+        """
+        Start preparing the context for a hint, replacing the session's previous one.
+
+        Args:
+            session: Storage key of the session
+            hint: Partial question typed so far
+            document: The session's document
+            build: Assembles the context for ``hint``
+
+        Returns:
+            Whether a context is being prepared for this hint
+        """
+        terms = content_terms(hint)
+        if len(terms) < PREFETCH_MIN_TERMS:
+            return False
+        key = _document_key(document)
+        entry = self._entries.get(session)
+        if entry is not None and entry.terms == terms and entry.document_key == key and self._fresh(entry):
+            return True
+        context = asyncio.ensure_future(build())
+        # A failed preparation just means a cache miss later
+        context.add_done_callback(lambda done: done.cancelled() or done.exception())
+        self._entries[session] = PreparedContext(terms, key, context, time.monotonic())
+        self._entries.move_to_end(session)
+        while len(self._entries) > self.max_sessions:
+            self._entries.popitem(last=False)
+        return True
+
+    async def get(self, session: str, query: str, document: StoredDocument) -> str | None:
+        """
+        Prepared context for a question, if the session's hint matches it.
+
+        Waits for a preparation that is still running.
+
+        Returns:
+            The context, or None if there is no usable prepared context
+        """
+        entry = self._entries.get(session)
+        if entry is None or not self._fresh(entry) or entry.document_key != _document_key(document):
+            return None
+        if term_overlap(entry.terms, content_terms(query)) < self.min_overlap:
+            return None
+        try:
+            return await asyncio.shield(entry.context)
+        except Exception:
+            return None
+
+    def discard(self, session: str) -> None:
+        """Forget a session's prepared context."""
+        self._entries.pop(session, None)
+
+    def _fresh(self, entry: PreparedContext) -> bool:
+        """Whether an entry is within its TTL."""
+        return time.monotonic() - entry.created <= self.ttl
+
+
+context_cache = ContextCache()
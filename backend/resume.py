@@ -0,0 +1,191 @@
+"""
+Resumable answer streams backed by a bounded server-side token log.
+"""
+import asyncio
+import bisect
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import AsyncIterator, Callable
+
+
+RESUME_TTL = float(os.getenv("RESUME_TTL", "300"))  # seconds a finished stream stays resumable
+RESUME_GRACE = float(os.getenv("RESUME_GRACE", "15"))  # seconds generation continues with no reader
+RESUME_MAX_CHARS = 256 * 1024  # characters of an answer kept for replay
+RESUME_MAX_STREAMS = 1024  # logs kept; the oldest finished ones are evicted first
+
+
+class StreamExpired(Exception):
+    """The requested part of a stream is no longer held by the server."""
+
+
+class TokenLog:
+    """
+    Everything one answer stream has produced, for replay to late readers.
+
+    The producer appends chunks as they arrive from upstream; any number of
+    readers follow the log from a character offset, getting what they missed
+    and then the rest live. Only the last ``max_chars`` characters are kept.
+    """
+
+    def __init__(self, stream_id: str, max_chars: int = RESUME_MAX_CHARS) -> None:
+        """Create an empty log."""
+        self.stream_id = stream_id
+        self.max_chars = max_chars
+        self.task: asyncio.Task | None = None  # producer filling the log
+        self.done = False
+        self.finished_at: float | None = None
+        self.readers = 0
+        self.detached_at = time.monotonic()
+        self._chunks: list[str] = []
+        self._starts: list[int] = []  # offset of each kept chunk
+        self._base = 0  # offset of the first kept character
+        self._length = 0  # characters produced so far
+        self._updated = asyncio.Event()
+
+    def __len__(self) -> int:
+        """Characters produced so far."""
+        return self._length
+
+    def append(self, text: str) -> None:
+        """Record a chunk and wake readers."""
+        if not text:
+            return
+        self._chunks.append(text)
+        self._starts.append(self._length)
+        self._length += len(text)
+        # Drop the oldest chunks once over budget (always keep the newest)
+        excess = 0
+        while excess < len(self._chunks) - 1 and self._length - self._starts[excess + 1] >= self.max_chars:
+            excess += 1
+        if excess:
+            del self._chunks[:excess]
+            del self._starts[:excess]
+            self._base = self._starts[0]
+        self._wake()
+
+    def finish(self) -> None:
+        """Mark the answer complete."""
+        self.done = True
+        self.finished_at = time.monotonic()
+        self._wake()
+
+    def check(self, offset: int) -> None:
+        """
+        Validate a resume offset.
+
+        Raises:
+            StreamExpired: If characters from ``offset`` on are no longer kept
+            ValueError: If ``offset`` is beyond what the stream has produced
+        """
+        if offset < self._base:
+            raise StreamExpired(f"Stream {self.stream_id} no longer holds offset {offset}")
+        if offset > self._length:
+            raise ValueError(f"Offset {offset} is beyond the {self._length} characters produced")
+
+    async def follow(self, offset: int = 0) -> AsyncIterator[str]:
+        """
+        Yield the stream's text from ``offset``: kept text first, then live chunks.
+
+        Raises:
+            StreamExpired: If the reader fell behind the kept window
+        """
+        self.readers += 1
+        try:
+            position = offset
+            while True:
+                self.check(position)
+                if position < self._length:
+                    # Rest of the kept chunk containing ``position``
+                    slot = bisect.bisect_right(self._starts, position) - 1
+                    text = self._chunks[slot][position - self._starts[slot]:]
+                    position += len(text)
+                    yield text
+                    continue
+                if self.done:
+                    return
+                updated = self._updated
+                await updated.wait()
+        finally:
+            self.readers -= 1
+            self.detached_at = time.monotonic()
+
+    async def abandoned(self, grace: float = RESUME_GRACE) -> bool:
+        """Whether nobody has read the stream for ``grace`` seconds (generation can stop)."""
+        return self.readers == 0 and time.monotonic() - self.detached_at > grace
+
+    def cancel(self) -> None:
+        """Stop the producer (the client asked for the answer to stop)."""
+        if self.task is not None:
+            self.task.cancel()
+
+    def _wake(self) -> None:
+        """Release readers waiting for more text."""
+        self._updated.set()
+        self._updated = asyncio.Event()
+
+
+class StreamLogs:
+    """
+    Token logs of recent streams, bounded in count and evicted by TTL.
+
+    Generation runs in a task of its own that fills the stream's log, so a
+    reader that drops can reconnect with the stream ID and the number of
+    characters it received and carry on without a second completion. A
+    stream nobody reads for the grace period is cancelled (stopping the
+    upstream call) as before.
+    """
+
+    def __init__(self, ttl: float = RESUME_TTL, max_streams: int = RESUME_MAX_STREAMS) -> None:
+        """Create an empty registry."""
+        self.ttl = ttl
+        self.max_streams = max_streams
+        self._logs: OrderedDict[str, TokenLog] = OrderedDict()
+
+    def __len__(self) -> int:
+        """Number of logs held."""
+        return len(self._logs)
+
+    def start(self, chunks_for: Callable[[TokenLog], AsyncIterator[str]]) -> TokenLog:
+        """
+        Start generating a stream into a new log.
+
+        Args:
+            chunks_for: Returns the answer chunks for the new log (the log is
+                passed so generation can check whether it was abandoned)
+
+        Returns:
+            The log, with its producer task running
+        """
+        self._evict()
+        log = TokenLog(uuid.uuid4().hex)
+        self._logs[log.stream_id] = log
+        log.task = asyncio.create_task(self._record(log, chunks_for(log)))
+        return log
+
+    def get(self, stream_id: str) -> TokenLog | None:
+        """Log of a stream, or None if it is unknown or expired."""
+        self._evict()
+        return self._logs.get(stream_id)
+
+    async def _record(self, log: TokenLog, chunks: AsyncIterator[str]) -> None:
+        """Copy a stream's chunks into its log."""
+        try:
+            async for text in chunks:
+                log.append(text)
+        finally:
+            log.finish()
+
+    def _evict(self) -> None:
+        """Drop expired logs, then the oldest while over the size bound."""
+        now = time.monotonic()
+        for stream_id, log in list(self._logs.items()):
+            if log.done and now - log.finished_at > self.ttl:
+                del self._logs[stream_id]
+        while len(self._logs) >= self.max_streams:
+            finished = next((sid for sid, log in self._logs.items() if log.done), None)
+            del self._logs[finished if finished is not None else next(iter(self._logs))]
+
+
+stream_logs = StreamLogs()
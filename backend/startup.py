@@ -0,0 +1,93 @@
+"""
+Start-up cost reporting and pre-fork warm-up.
+
+Run ``python -m backend.startup`` to see how long a cold ``import backend.main``
+takes and which packages the time goes to, plus the cost of each dependency
+that is deferred until first use.
+"""
+import gc
+import re
+import subprocess
+import sys
+from collections import defaultdict
+from dataclasses import dataclass
+
+# Dependencies that are imported lazily and paid for on first request
+DEFERRED_MODULES = ("agno.agent", "agno.models.openai", "openai", "pypdf")
+
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+@dataclass
+class ImportTiming:
+    """Import cost attributed to one top-level package."""
+    package: str
+    self_ms: float
+
+
+def measure_import(module: str) -> tuple[float, list[ImportTiming]]:
+    """
+    Measure a cold import of ``module`` in a fresh interpreter.
+
+    Args:
+        module: Dotted module name to import
+
+    Returns:
+        Tuple of (total_ms, per-package timings sorted by cost)
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    per_package: dict[str, int] = defaultdict(int)
+    total_us = 0
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        per_package[name.split(".")[0]] += int(self_us)
+        if name == module and len(indent) == 1:
+            total_us = int(cumulative_us)
+    timings = [ImportTiming(package, us / 1000) for package, us in per_package.items()]
+    timings.sort(key=lambda t: t.self_ms, reverse=True)
+    return total_us / 1000, timings
+
+
+def startup_report(limit: int = 15) -> str:
+    """Build a human-readable start-up cost report."""
+    total_ms, timings = measure_import("backend.main")
+    lines = [f"import backend.main: {total_ms:.1f} ms", ""]
+    lines.append(f"{'package':<30} {'self ms':>10}")
+    for timing in timings[:limit]:
+        lines.append(f"{timing.package:<30} {timing.self_ms:>10.1f}")
+    lines.append("")
+    lines.append("Deferred until first use:")
+    for module in DEFERRED_MODULES:
+        deferred_ms, _ = measure_import(module)
+        lines.append(f"  {module:<28} {deferred_ms:>10.1f}")
+    return "\n".join(lines)
+
+
+def warm_up() -> None:
+    """
+    Load and initialize shared state once, before forking workers.
+
+    Imports the application and every deferred dependency, then freezes the
+    GC so the objects created here are not touched by collections in the
+    children and their pages stay shared copy-on-write.
+    """
+    import backend.main  # noqa: F401
+    from agent.agent import load_agno
+
+    load_agno()
+    import pypdf  # noqa: F401
+
+    gc.collect()
+    gc.freeze()
+
+
+if __name__ == "__main__":
+    print(startup_report())
@@ -0,0 +1,477 @@
+"""
+Per-session document storage with incremental, searchable ingestion.
+"""
+import re
+import threading
+from typing import Iterable
+
+from parsing.lazy_pdf import LazyPDF, PrefetchJob, page_prefetcher
+from parsing.normalize import TextNormalizer
+from parsing.pdf_parser import PDFMetadata
+from retrieval.index import Chunk, DocumentIndex, tokenize
+
+
+CONTEXT_CHAR_BUDGET = 8000  # characters of document text injected per prompt
+CONTEXT_TOP_K = 8  # chunks retrieved per question
+MAX_PAGE_RANGE = 50  # pages returned by one page-range request
+REVISION_MIN_REUSE = 0.5  # fraction of pages that must be unchanged to build on the previous version
+
+_PAGE_REFERENCE = re.compile(r"\bpages?\s+(\d+)(?:\s*(?:-|–|to)\s*(\d+))?", re.IGNORECASE)
+
+
+class StoredDocument:
+    """
+    An uploaded document whose pages become searchable as they are extracted.
+
+    Ingestion runs on a worker thread while chat requests read the index, so
+    already-indexed pages can be used before the whole document is parsed.
+
+    Page text is held only by the index, in compressed form. A document
+    created from a LazyPDF starts with no text at all: pages are extracted on
+    demand (page-range requests, pages named in a question) or by the shared
+    idle-time prefetcher, and either way go into the index, which stays the
+    only copy of the text.
+
+    Page text is normalized before it is stored (see TextNormalizer), so
+    repeated headers and footers never reach a prompt.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        metadata: PDFMetadata,
+        source: LazyPDF | None = None,
+        content_hash: str = "",
+    ) -> None:
+        """Create an empty document for the given file."""
+        self.filename = filename
+        self.content_hash = content_hash
+        self.metadata = metadata
+        self.source = source
+        self.index = DocumentIndex()
+        self.indexed_pages: set[int] = set()
+        self.pages_processed = 0
+        self.done = False
+        self.error: str | None = None
+        self.cancelled = False
+        self.prefetcher: PrefetchJob | None = None
+        self.blank_pages: set[int] = set()  # extracted pages without text (lazy documents)
+        self.normalizer = TextNormalizer()
+        self.page_hashes: list[str] = []  # content and resources hash per page, for revisions
+        # Pages dropped for exceeding the parse time budget (a lazy source records its own)
+        self.skipped_pages: list[int] = source.skipped_pages if source is not None else []
+        self.changed_pages: list[int] | None = None  # set when built as a revision
+        self._text_length = 0
+        self._lock = threading.Lock()
+
+    @property
+    def lazy(self) -> bool:
+        """Whether page text is extracted on demand."""
+        return self.source is not None
+
+    @property
+    def text(self) -> str:
+        """Full text of the pages ingested so far, in page order."""
+        if self.lazy:
+            return "\n\n".join(text for _, text in self.page_range(1, self.metadata.pages)).strip()
+        with self._lock:
+            pages = sorted(self.indexed_pages)
+        return "\n\n".join(self.index.page_text(n) for n in pages).strip()
+
+    @property
+    def text_length(self) -> int:
+        """Characters of text ingested so far."""
+        return self._text_length
+
+    def add_page(self, page: int, text: str) -> None:
+        """Store and index one page (pages already indexed are ignored)."""
+        with self._lock:
+            if page in self.indexed_pages:
+                return
+            self.indexed_pages.add(page)
+            self._text_length += len(text)
+            self.pages_processed = max(self.pages_processed, page)
+        self.index.add_page(page, text)
+
+    def add_extracted_page(self, page: int, text: str) -> str:
+        """
+        Normalize and store one page of raw extracted text.
+
+        Used for pages extracted out of order (on demand or by the prefetcher),
+        where boilerplate is learned from the pages seen so far.
+
+        Returns:
+            The stored (normalized) page text
+        """
+        with self._lock:
+            if page in self.indexed_pages:
+                return self.index.page_text(page) or ""
+            if text:
+                self.normalizer.observe(text, page)
+                text = self.normalizer.clean(text, page)
+            if not text:
+                self.blank_pages.add(page)
+        if text:
+            self.add_page(page, text)
+        return text
+
+    def can_revise(self) -> bool:
+        """Whether a new version of this document can reuse its pages."""
+        return bool(self.page_hashes) and self.done and not self.lazy and not self.cancelled
+
+    def revise(self, previous: "StoredDocument", page_hashes: list[str]) -> list[int] | None:
+        """
+        Start this document as a revision of ``previous``, reusing its unchanged pages.
+
+        Pages are matched by hash of their content stream and resources, so
+        unchanged pages are found even if pages were inserted or removed
+        before them. Their text, chunks
+        and postings are taken over without re-extraction or re-indexing; the
+        returned pages still have to be ingested. ``previous`` is not modified.
+
+        Unrelated uploads are not treated as revisions, so they do not keep
+        the previous document's storage alive.
+
+        Args:
+            previous: Stored document of the earlier version (see can_revise)
+            page_hashes: PDFParser.page_hashes() of the new version
+
+        Returns:
+            Page numbers (in the new version) that changed, in order, or None
+            (nothing reused) if under REVISION_MIN_REUSE of the pages are unchanged
+        """
+        old_pages: dict[str, int] = {}
+        for page, page_hash in enumerate(previous.page_hashes, start=1):
+            old_pages.setdefault(page_hash, page)
+        page_map: dict[int, int] = {}
+        reused: set[int] = set()
+        changed: list[int] = []
+        for page, page_hash in enumerate(page_hashes, start=1):
+            old = old_pages.get(page_hash)
+            if old is None or old in reused:
+                changed.append(page)
+                continue
+            reused.add(old)
+            if old in previous.indexed_pages:
+                page_map[old] = page
+        if len(page_hashes) - len(changed) < REVISION_MIN_REUSE * len(page_hashes):
+            return None
+        self.index = previous.index.derive(page_map)
+        self.normalizer = previous.normalizer.copy()
+        with self._lock:
+            self.indexed_pages = set(page_map.values())
+            self._text_length = sum(self.index.page_length(page) for page in self.indexed_pages)
+        self.page_hashes = page_hashes
+        self.changed_pages = changed
+        return changed
+
+    def page_text(self, page: int) -> str:
+        """
+        Text of one page, extracting (and indexing) it on demand for lazy documents.
+
+        Raises:
+            ValueError: If the page is out of range or cannot be parsed
+        """
+        if not 1 <= page <= self.metadata.pages:
+            raise ValueError(f"Page {page} out of range (document has {self.metadata.pages} pages).")
+        text = self.index.page_text(page)
+        if text is not None or not self.lazy or page in self.blank_pages:
+            return text or ""
+        with page_prefetcher.foreground():
+            text = self.source.page_text(page)
+        return self.add_extracted_page(page, text)
+
+    def find_phrase(self, phrase: str) -> list[int] | None:
+        """
+        Pages whose text contains a phrase (case-insensitive, whole words).
+
+        Returns:
+            Sorted page numbers, or None if the answer is not known yet
+            (lazy or still-ingesting documents, phrases without indexable words)
+        """
+        terms = tokenize(phrase)
+        if self.lazy or not self.done or not terms:
+            return None
+        words = (re.escape(word) for word in phrase.split())
+        # Whole words: "clause 14" matches "clause 14." but not "clause 14.2"
+        pattern = re.compile(
+            r"(?<!\w)(?<!\w[.,])" + r"\s+".join(words) + r"(?![.,]?\w)", re.IGNORECASE
+        )
+        return sorted(
+            page for page in self.index.pages_with_terms(terms)
+            if pattern.search(self.index.page_text(page) or "")
+        )
+
+    def page_range(self, start: int, end: int) -> list[tuple[int, str]]:
+        """(page_number, text) for an inclusive page range, clamped to the document."""
+        return [
+            (page, self.page_text(page))
+            for page in range(max(1, start), min(end, self.metadata.pages) + 1)
+        ]
+
+    def leading_text(self, limit: int) -> str:
+        """Up to ``limit`` characters from the start of the document."""
+        if self.lazy:
+            pages: Iterable[int] = range(1, self.metadata.pages + 1)
+        else:
+            with self._lock:
+                pages = sorted(self.indexed_pages)
+        parts: list[str] = []
+        used = 0
+        # Page by page, so only the pages needed are decompressed (or extracted)
+        for page in pages:
+            text = self.page_text(page)
+            if text:
+                parts.append(text)
+                used += len(text)
+            if used >= limit:
+                break
+        return "\n\n".join(parts).strip()[:limit]
+
+    def start_prefetch(self) -> None:
+        """Queue a lazy document for idle-time background extraction."""
+        self.prefetcher = page_prefetcher.add(self.source, self.add_extracted_page)
+
+    def close(self) -> None:
+        """Stop ingestion and release any on-demand page source."""
+        self.cancelled = True
+        if self.prefetcher is not None:
+            self.prefetcher.stop()
+        if self.source is not None:
+            self.source.close()
+
+    def ingest(self, pages: Iterable[tuple[int, str]], limit: int | None = None) -> int:
+        """
+        Add pages from an extraction iterator.
+
+        Args:
+            pages: Iterator of normalized (page_number, text), e.g.
+                ``document.normalizer.normalize_pages(PDFParser.iter_pages(reader))``
+            limit: Stop after this many pages (the iterator can be resumed)
+
+        Returns:
+            Number of pages added
+        """
+        added = 0
+        try:
+            # Lazy documents are only prefetched while no upload is being ingested
+            with page_prefetcher.foreground():
+                for page, text in pages:
+                    if self.cancelled:
+                        break
+                    self.add_page(page, text)
+                    added += 1
+                    if limit is not None and added >= limit:
+                        return added
+        except ValueError as e:
+            self.error = str(e)
+        self.pages_processed = self.metadata.pages
+        self.metadata.text_length = self._text_length
+        self.metadata.chars_saved = self.normalizer.chars_saved
+        self.index.seal()
+        self.done = True
+        return added
+
+    def progress(self) -> dict:
+        """Ingestion progress for status endpoints."""
+        if self.prefetcher is not None:
+            self.pages_processed = self.prefetcher.next_page - 1
+            self.done = self.prefetcher.done
+            self.error = self.prefetcher.error
+        return {
+            "lazy": self.lazy,
+            "pages_processed": self.pages_processed,
+            "pages_total": self.metadata.pages,
+            "pages_indexed": len(self.indexed_pages),
+            "chunks_indexed": len(self.index),
+            "memory_bytes": self.index.nbytes,
+            "chars_saved": self.normalizer.chars_saved,
+            "changed_pages": self.changed_pages,
+            "skipped_pages": self.skipped_pages,
+            "done": self.done,
+            "error": self.error,
+        }
+
+
+class DocumentRegistry:
+    """
+    Session -> document mapping where identical uploads share one document.
+
+    Documents are keyed by content hash and reference-counted by the sessions
+    using them, so the text, chunks and index of a popular document are held
+    once however many sessions upload it. A document is closed when its last
+    session drops it.
+    """
+
+    def __init__(self) -> None:
+        """Create an empty registry."""
+        self._documents: dict[str, StoredDocument] = {}  # content hash -> shared document
+        self._refs: dict[str, int] = {}  # content hash -> sessions using it
+        self._sessions: dict[str, str] = {}  # session -> content hash
+        self._lock = threading.Lock()
+
+    def __contains__(self, session: str) -> bool:
+        """Whether a session has a document."""
+        return session in self._sessions
+
+    def __getitem__(self, session: str) -> StoredDocument:
+        """The document of a session (KeyError if it has none)."""
+        with self._lock:
+            return self._documents[self._sessions[session]]
+
+    def get(self, session: str) -> StoredDocument | None:
+        """The document of a session, or None."""
+        with self._lock:
+            content_hash = self._sessions.get(session)
+            return self._documents[content_hash] if content_hash is not None else None
+
+    def attach_existing(self, session: str, content_hash: str) -> StoredDocument | None:
+        """
+        Give a session the stored document with this content, if any session holds one.
+
+        Lookup and attach are one step under the registry lock, so the
+        document cannot be released (and closed) in between.
+
+        Returns:
+            The shared document, or None if no session holds this content
+        """
+        with self._lock:
+            document = self._documents.get(content_hash)
+            if document is None:
+                return None
+            released = self._attach(session, document)
+        for stale in released:
+            stale.close()
+        return document
+
+    def attach(self, session: str, document: StoredDocument) -> StoredDocument:
+        """
+        Give a session a document, sharing an existing copy of the same content.
+
+        The session's previous document loses a reference. If another copy of
+        ``document`` is already stored (e.g. two sessions uploaded the same
+        file concurrently), ``document`` is closed and the stored copy is used.
+
+        Returns:
+            The document the session now points at
+
+        Raises:
+            ValueError: If ``document`` has already been closed
+        """
+        with self._lock:
+            if document.cancelled:
+                # A released document must never be registered again
+                raise ValueError("Document has been closed.")
+            shared = self._documents.setdefault(document.content_hash, document)
+            released = self._attach(session, shared)
+        if shared is not document:
+            released.append(document)
+        for stale in released:
+            stale.close()
+        return shared
+
+    def _attach(self, session: str, document: StoredDocument) -> list[StoredDocument]:
+        """Point a session at a registered document (lock held); returns documents to close."""
+        key = document.content_hash
+        if self._sessions.get(session) == key:
+            return []
+        released = self._release(session)
+        self._refs[key] = self._refs.get(key, 0) + 1
+        self._sessions[session] = key
+        return released
+
+    def detach(self, session: str) -> bool:
+        """
+        Drop a session's document reference, closing the document if it was the last.
+
+        Returns:
+            Whether the session had a document
+        """
+        with self._lock:
+            if session not in self._sessions:
+                return False
+            released = self._release(session)
+        for document in released:
+            document.close()
+        return True
+
+    def _release(self, session: str) -> list[StoredDocument]:
+        """Remove a session's reference (lock held); returns documents left unreferenced."""
+        key = self._sessions.pop(session, None)
+        if key is None:
+            return []
+        self._refs[key] -= 1
+        if self._refs[key] > 0:
+            return []
+        del self._refs[key]
+        return [self._documents.pop(key)]
+
+    def stats(self) -> dict:
+        """Sessions, distinct documents and the memory saved by sharing them."""
+        with self._lock:
+            entries = [(document, self._refs[key]) for key, document in self._documents.items()]
+            sessions = len(self._sessions)
+        sizes = [(document.index.nbytes, refs) for document, refs in entries]
+        return {
+            "sessions": sessions,
+            "documents": len(entries),
+            "memory_bytes": sum(size for size, _ in sizes),
+            "memory_saved_bytes": sum(size * (refs - 1) for size, refs in sizes),
+        }
+
+
+def build_context(document: StoredDocument, query: str, chunks: list[Chunk] | None = None) -> str:
+    """
+    Assemble the document text to inject for a question.
+
+    Pages named in the question ("page 12", "pages 3-5") come first and are
+    extracted on demand if needed, then the best-matching chunks, all within
+    CONTEXT_CHAR_BUDGET. Falls back to the beginning of the document.
+
+    Args:
+        document: Stored document (possibly still ingesting)
+        query: User's question
+        chunks: Retrieval results for ``query`` if already computed
+
+    Returns:
+        Context text, or an empty string if nothing is indexed yet
+    """
+    if chunks is None:
+        chunks = document.index.search(query, k=CONTEXT_TOP_K)
+    parts: list[str] = []
+    used = 0
+    for start, end in referenced_pages(query):
+        for page, text in document.page_range(start, min(end, start + MAX_PAGE_RANGE - 1)):
+            text = text[:CONTEXT_CHAR_BUDGET - used]
+            if text:
+                parts.append(f"[Page {page}]\n{text}")
+                used += len(text)
+    for chunk in chunks:
+        if used + len(chunk.text) > CONTEXT_CHAR_BUDGET:
+            break
+        parts.append(f"[Page {chunk.page}]\n{chunk.text}")
+        used += len(chunk.text)
+    context = "\n\n".join(parts) if parts else document.leading_text(CONTEXT_CHAR_BUDGET)
+
+    if context and not document.progress()["done"]:
+        context += (
+            f"\n\n(Document still loading: {document.pages_processed} of "
+            f"{document.metadata.pages} pages processed so far.)"
+        )
+    return context
+
+
+def build_contexts(document: StoredDocument, queries: list[str]) -> list[str]:
+    """Assemble contexts for many questions with a single retrieval pass."""
+    results = document.index.search_many(queries, k=CONTEXT_TOP_K)
+    return [build_context(document, query, chunks) for query, chunks in zip(queries, results)]
+
+
+def referenced_pages(query: str) -> list[tuple[int, int]]:
+    """Inclusive page ranges mentioned in a question, e.g. "pages 3 to 5" -> [(3, 5)]."""
+    ranges = []
+    for match in _PAGE_REFERENCE.finditer(query):
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) else start
+        ranges.append((start, max(start, end)))
+    return ranges
@@ -0,0 +1,373 @@
+"""
+Lightweight per-request tracing with nested spans and an opt-in sampling profiler.
+"""
+import asyncio
+import json
+import logging
+import os
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Iterator
+
+
+# Tracing configuration
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH")  # OTLP/JSON lines file; logs if unset
+SERVICE_NAME = "workingagent"
+
+# Profiling configuration (off unless explicitly enabled)
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILE_HEADER = b"x-profile"
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+
+logger = logging.getLogger("workingagent.trace")
+if not logger.handlers:
+    # Timelines are the output of tracing, so they are emitted even when the
+    # application has not configured logging (the default level is WARNING)
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+# Finished traces are written from here, never from the event loop
+_export_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="trace-export")
+
+
+@dataclass
+class Span:
+    """A single timed operation inside a trace."""
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: str | None = None
+    start_ns: int = field(default_factory=time.time_ns)
+    end_ns: int | None = None
+    attributes: dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def duration_ms(self) -> float:
+        """Span duration in milliseconds (up to now if still open)."""
+        end_ns = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end_ns - self.start_ns) / 1_000_000
+
+    def end(self) -> None:
+        """Close the span if it is still open."""
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+
+
+class Trace:
+    """Collection of spans recorded for one request."""
+
+    def __init__(self, name: str) -> None:
+        """Create a trace with a root span."""
+        self.trace_id = secrets.token_hex(16)
+        self.spans: list[Span] = []
+        self.threads: Counter[int] = Counter()  # thread id -> spans open on it
+        self._lock = threading.Lock()
+        self.root = self.start_span(name, parent=None)
+
+    def start_span(self, name: str, parent: Span | None, **attributes: Any) -> Span:
+        """Open a new span; spans may be opened from worker threads."""
+        new_span = Span(
+            name=name,
+            trace_id=self.trace_id,
+            span_id=secrets.token_hex(8),
+            parent_id=parent.span_id if parent else None,
+            attributes=dict(attributes),
+        )
+        with self._lock:
+            self.spans.append(new_span)
+        return new_span
+
+    def enter_thread(self) -> None:
+        """Note that the calling thread is working for this trace."""
+        with self._lock:
+            self.threads[threading.get_ident()] += 1
+
+    def leave_thread(self) -> None:
+        """Undo one enter_thread on the calling thread."""
+        thread_id = threading.get_ident()
+        with self._lock:
+            self.threads[thread_id] -= 1
+            if self.threads[thread_id] <= 0:
+                del self.threads[thread_id]
+
+    def active_threads(self) -> list[int]:
+        """Ids of the threads currently inside a span of this trace."""
+        with self._lock:
+            return list(self.threads)
+
+    def to_otlp(self) -> dict[str, Any]:
+        """Render the trace in the OTLP/JSON layout used by OpenTelemetry file exporters."""
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": [_otlp_attribute("service.name", SERVICE_NAME)]},
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": "workingagent.tracing"},
+                            "spans": [_otlp_span(s) for s in self.spans],
+                        }
+                    ],
+                }
+            ]
+        }
+
+    def summary(self) -> dict[str, Any]:
+        """Compact timeline used for structured log output."""
+        return {
+            "trace_id": self.trace_id,
+            "name": self.root.name,
+            "duration_ms": round(self.root.duration_ms, 3),
+            "spans": [
+                {
+                    "name": s.name,
+                    "offset_ms": round((s.start_ns - self.root.start_ns) / 1_000_000, 3),
+                    "duration_ms": round(s.duration_ms, 3),
+                    **({"attributes": s.attributes} if s.attributes else {}),
+                }
+                for s in self.spans
+                if s is not self.root
+            ],
+        }
+
+
+def _otlp_attribute(key: str, value: Any) -> dict[str, Any]:
+    """Encode a single attribute as an OTLP key/value pair."""
+    if isinstance(value, bool):
+        encoded = {"boolValue": value}
+    elif isinstance(value, int):
+        encoded = {"intValue": str(value)}
+    elif isinstance(value, float):
+        encoded = {"doubleValue": value}
+    else:
+        encoded = {"stringValue": str(value)}
+    return {"key": key, "value": encoded}
+
+
+def _otlp_span(s: Span) -> dict[str, Any]:
+    """Encode a span in OTLP/JSON form."""
+    encoded = {
+        "traceId": s.trace_id,
+        "spanId": s.span_id,
+        "name": s.name,
+        "startTimeUnixNano": str(s.start_ns),
+        "endTimeUnixNano": str(s.end_ns if s.end_ns is not None else time.time_ns()),
+        "attributes": [_otlp_attribute(k, v) for k, v in s.attributes.items()],
+    }
+    if s.parent_id:
+        encoded["parentSpanId"] = s.parent_id
+    return encoded
+
+
+_current_trace: ContextVar[Trace | None] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+def current_trace() -> Trace | None:
+    """Return the trace active in this context, if any."""
+    return _current_trace.get()
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span | None]:
+    """
+    Record a nested span around a block of code.
+
+    Does nothing (yields None) when no trace is active, so library code can
+    be instrumented unconditionally.
+
+    Args:
+        name: Span name, e.g. "agent.create"
+        **attributes: Extra attributes attached to the span
+
+    Yields:
+        The open span, or None when tracing is inactive
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+
+    new_span = trace.start_span(name, parent=_current_span.get() or trace.root, **attributes)
+    token = _current_span.set(new_span)
+    trace.enter_thread()
+    try:
+        yield new_span
+    except BaseException as e:
+        new_span.attributes["error"] = type(e).__name__
+        raise
+    finally:
+        new_span.end()
+        trace.leave_thread()
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # Async generators may be finalized from a different context
+            pass
+
+
+def export_trace(trace: Trace) -> None:
+    """Write a finished trace to the OTLP file exporter, or to the structured log."""
+    if TRACE_EXPORT_PATH:
+        line = json.dumps(trace.to_otlp(), separators=(",", ":"))
+        with open(TRACE_EXPORT_PATH, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+    else:
+        logger.info(json.dumps(trace.summary(), separators=(",", ":")))
+
+
+def _finish_trace(trace: Trace, profiler: "SamplingProfiler | None") -> None:
+    """Stop the request's profiler, then export its trace (runs on the export thread)."""
+    try:
+        if profiler is not None:
+            profiler.stop()
+            path = profiler.write_folded(Path(PROFILE_DIR) / f"{trace.trace_id}.folded")
+            trace.root.attributes["profile.path"] = str(path)
+        export_trace(trace)
+    except Exception:
+        logger.exception("Failed to export trace %s", trace.trace_id)
+
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler for the threads working on one request.
+
+    A background thread periodically captures stacks and counts identical
+    stacks; the result is written in the folded format read by flamegraph.pl
+    and speedscope.
+
+    Which threads are sampled:
+    - ``thread_id`` (the event-loop thread): only while the task it is
+      running belongs to ``trace``, so other requests' coroutines sharing the
+      loop are not attributed to this one. Without a trace it is always sampled.
+    - Any other thread while it is inside a span of ``trace`` (worker threads
+      inherit the request's context, so their spans join its trace).
+    """
+
+    def __init__(
+        self,
+        thread_id: int,
+        interval: float = PROFILE_INTERVAL,
+        trace: Trace | None = None,
+        loop: asyncio.AbstractEventLoop | None = None,
+    ) -> None:
+        """Create a profiler for a thread and, given a trace, the threads working for it."""
+        self.thread_id = thread_id
+        self.interval = interval
+        self.trace = trace
+        self.loop = loop
+        self.samples: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def start(self) -> None:
+        """Start sampling."""
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop sampling and wait for the sampler thread."""
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        """Sampler loop."""
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            thread_ids = [self.thread_id] if self._owns_loop_thread() else []
+            if self.trace is not None:
+                thread_ids += [t for t in self.trace.active_threads() if t != self.thread_id]
+            for thread_id in thread_ids:
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack: list[str] = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.samples[";".join(reversed(stack))] += 1
+
+    def _owns_loop_thread(self) -> bool:
+        """Whether the ``thread_id`` thread is currently working for the trace."""
+        if self.trace is None or self.loop is None:
+            return True
+        task = asyncio.current_task(self.loop)
+        if task is None:
+            return False  # loop idle, or running a callback outside any task
+        get_context = getattr(task, "get_context", None)  # Python 3.12+
+        return get_context is None or get_context().get(_current_trace) is self.trace
+
+    def write_folded(self, path: str | Path) -> Path:
+        """Write collected samples as folded stacks."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware that opens a trace per HTTP request.
+
+    The trace stays open until the last body chunk has been sent, so spans
+    recorded while a StreamingResponse is being consumed are included. When
+    profiling is enabled, a request carrying ``X-Profile: 1`` is profiled and
+    its flame-graph written to ``PROFILE_DIR/<trace_id>.folded``. Stopping
+    the profiler and exporting the trace happen on a background thread.
+    """
+
+    def __init__(self, app: Any) -> None:
+        """Wrap an ASGI application."""
+        self.app = app
+
+    async def __call__(self, scope: dict, receive: Any, send: Any) -> None:
+        """Handle an ASGI call."""
+        if scope["type"] != "http" or not TRACING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace(f"{scope['method']} {scope['path']}")
+        trace.root.attributes["http.method"] = scope["method"]
+        trace.root.attributes["http.target"] = scope["path"]
+
+        profiler = None
+        headers = dict(scope.get("headers") or [])
+        if PROFILING_ENABLED and headers.get(PROFILE_HEADER, b"").lower() in (b"1", b"true"):
+            profiler = SamplingProfiler(
+                threading.get_ident(), trace=trace, loop=asyncio.get_running_loop()
+            )
+            profiler.start()
+
+        async def send_with_trace_id(message: dict) -> None:
+            if message["type"] == "http.response.start":
+                trace.root.attributes["http.status_code"] = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = [
+                    *message["headers"],
+                    (b"x-trace-id", trace.trace_id.encode()),
+                ]
+            await send(message)
+
+        trace_token = _current_trace.set(trace)
+        span_token = _current_span.set(trace.root)
+        try:
+            await self.app(scope, receive, send_with_trace_id)
+        finally:
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+            trace.root.end()
+            _export_executor.submit(_finish_trace, trace, profiler)
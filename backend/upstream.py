@@ -0,0 +1,207 @@
+"""
+Cancellable, deadline-bounded streaming of upstream generations.
+"""
+import asyncio
+import contextvars
+import os
+from contextlib import aclosing
+from typing import AsyncIterator, Awaitable, Callable
+
+
+STREAM_TTFT_TIMEOUT = float(os.getenv("STREAM_TTFT_TIMEOUT", "30"))  # seconds to first token
+STREAM_TOTAL_TIMEOUT = float(os.getenv("STREAM_TOTAL_TIMEOUT", "300"))  # seconds for the whole answer
+DISCONNECT_POLL_INTERVAL = 0.5  # seconds between client-disconnect checks while waiting
+
+_DONE = object()
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a stream misses its time-to-first-token or total deadline."""
+
+    def __init__(self, kind: str, timeout: float) -> None:
+        """Record which deadline ("ttft" or "total") was missed."""
+        self.kind = kind
+        self.timeout = timeout
+        what = "the first token" if kind == "ttft" else "the full response"
+        super().__init__(f"Timed out after {timeout:g}s waiting for {what}.")
+
+
+class ClientDisconnected(Exception):
+    """Raised when the client went away while the answer was being generated."""
+
+
+async def stream_upstream(
+    open_stream: Callable[[], AsyncIterator[str]],
+    ttft_timeout: float = STREAM_TTFT_TIMEOUT,
+    total_timeout: float = STREAM_TOTAL_TIMEOUT,
+    is_disconnected: Callable[[], Awaitable[bool]] | None = None,
+    poll_interval: float = DISCONNECT_POLL_INTERVAL,
+) -> AsyncIterator[str]:
+    """
+    Iterate an upstream chunk stream under deadlines and disconnect checks.
+
+    The upstream is read by a separate task. Whenever this async generator
+    stops early (deadline, client disconnect, consumer cancelled or closed),
+    that task is cancelled, which interrupts a pending upstream read at once
+    (even one still waiting for the first token) and closes the HTTP stream.
+
+    Args:
+        open_stream: Starts the upstream call and returns its async chunk iterator
+        ttft_timeout: Seconds allowed until the first chunk
+        total_timeout: Seconds allowed for the whole stream
+        is_disconnected: Async check for a departed client, polled every
+            ``poll_interval`` seconds whether or not chunks are arriving
+        poll_interval: Seconds between disconnect checks
+
+    Yields:
+        Chunks as the upstream produces them
+
+    Raises:
+        DeadlineExceeded: If a deadline is missed
+        ClientDisconnected: If ``is_disconnected`` reports the client has gone
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def pump() -> None:
+        try:
+            async with aclosing(open_stream()) as iterator:
+                async for chunk in iterator:
+                    queue.put_nowait(chunk)
+        except Exception as e:
+            queue.put_nowait(e)
+        finally:
+            queue.put_nowait(_DONE)
+
+    # Its own context, so spans opened by the upstream nest under the current one
+    reader = loop.create_task(pump(), name="upstream-stream", context=contextvars.copy_context())
+
+    started = loop.time()
+    last_check = started
+    first = True
+    try:
+        while True:
+            # Checked on a timer rather than only on idle waits, so a steady
+            # token flow to a departed client is stopped too
+            if is_disconnected is not None and loop.time() - last_check >= poll_interval:
+                last_check = loop.time()
+                if await is_disconnected():
+                    raise ClientDisconnected()
+            if first and ttft_timeout < total_timeout:
+                timeout, kind = ttft_timeout, "ttft"
+            else:
+                timeout, kind = total_timeout, "total"
+            remaining = started + timeout - loop.time()
+            if remaining <= 0:
+                raise DeadlineExceeded(kind, timeout)
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout=min(remaining, poll_interval))
+            except asyncio.TimeoutError:
+                continue
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            first = False
+            yield item
+    finally:
+        if not reader.done():
+            reader.cancel()
+            await asyncio.gather(reader, return_exceptions=True)
+
+
+async def _close_stream(task: asyncio.Task | None, stream: AsyncIterator[str]) -> None:
+    """Cancel a pending read and close its stream (which cancels the upstream call)."""
+    if task is not None and not task.done():
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+    await stream.aclose()
+
+
+async def hedged_stream(
+    open_primary: Callable[[], AsyncIterator[str]],
+    open_backup: Callable[[], AsyncIterator[str]] | None,
+    hedge_after: float,
+    on_first_chunk: Callable[[str], None] | None = None,
+) -> AsyncIterator[str]:
+    """
+    Stream from whichever of two upstreams produces a first chunk sooner.
+
+    The backup is only started if the primary has not produced a chunk within
+    ``hedge_after`` seconds (or fails before then). Once one stream delivers
+    its first chunk the other is cancelled and only the winner is streamed.
+
+    Args:
+        open_primary: Starts the primary stream
+        open_backup: Starts the hedged stream, or None to disable hedging
+        hedge_after: Seconds to wait for the primary's first chunk before hedging
+        on_first_chunk: Called with "primary" or "backup" when a winner is chosen
+
+    Yields:
+        Chunks of the winning stream
+
+    Raises:
+        ClientDisconnected: As soon as either stream reports a departed client
+        Exception: The first error, if neither stream produced anything
+    """
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    pending: dict[asyncio.Task, tuple[str, AsyncIterator[str]]] = {}
+    error: Exception | None = None
+
+    def start(name: str, opener: Callable[[], AsyncIterator[str]]) -> None:
+        nonlocal error
+        try:
+            stream = opener()
+        except Exception as e:
+            error = error or e
+            return
+        pending[asyncio.ensure_future(anext(stream, _DONE))] = (name, stream)
+
+    start("primary", open_primary)
+    backup_started = open_backup is None
+    winner: AsyncIterator[str] | None = None
+    first_chunk: object = _DONE
+    try:
+        while winner is None and (pending or not backup_started):
+            if not pending:
+                # The primary failed early; hedge right away
+                start("backup", open_backup)
+                backup_started = True
+                continue
+            timeout = None if backup_started else max(0.0, started + hedge_after - loop.time())
+            done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                start("backup", open_backup)
+                backup_started = True
+                continue
+            for task in done:
+                name, stream = pending.pop(task)
+                try:
+                    chunk = task.result()
+                except ClientDisconnected:
+                    await stream.aclose()
+                    raise
+                except Exception as e:
+                    error = error or e
+                    await stream.aclose()
+                    continue
+                if winner is None:
+                    winner, first_chunk = stream, chunk
+                    if on_first_chunk is not None:
+                        on_first_chunk(name)
+                else:
+                    await stream.aclose()
+    finally:
+        for task, (_, stream) in pending.items():
+            await _close_stream(task, stream)
+        pending.clear()
+
+    if winner is None:
+        raise error
+    async with aclosing(winner):
+        if first_chunk is _DONE:
+            return
+        yield first_chunk
+        async for chunk in winner:
+            yield chunk
@@ -0,0 +1,186 @@
+"""
+Lazy, on-demand PDF page extraction from a file on disk, in the parse sandbox.
+"""
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+from parsing.sandbox import ParseSandbox, parse_sandbox
+
+
+IDLE_DELAY = 0.2  # seconds the process must be idle before pre-extraction runs
+
+
+class LazyPDF:
+    """
+    PDF whose page text is extracted only when first needed.
+
+    The upload is written to a temporary file that the parse sandbox's
+    workers open (and keep open between pages), so the API process holds
+    neither the upload nor a PdfReader, and opening the file and extracting
+    each page run under the sandbox's limits like an eager upload. A page
+    over its time budget comes back empty and is listed in
+    ``skipped_pages``. Extracted text is not kept here: the caller stores it
+    (see StoredDocument, whose compressed index is the single copy of page
+    text).
+    """
+
+    def __init__(
+        self, file_content: bytes, filename: str, sandbox: ParseSandbox = parse_sandbox
+    ) -> None:
+        """
+        Open a PDF for lazy extraction.
+
+        Raises:
+            ValueError: If file is invalid or corrupted, or a sandbox limit was exceeded
+        """
+        fd, self.path = tempfile.mkstemp(suffix=".pdf")
+        with os.fdopen(fd, "wb") as f:
+            f.write(file_content)
+        self.filename = filename
+        self.sandbox = sandbox
+        self.skipped_pages: list[int] = []
+        self.closed = False
+        try:
+            self.metadata = sandbox.metadata(self.path, filename)
+        except ValueError:
+            self.close()
+            raise
+
+    @property
+    def page_count(self) -> int:
+        """Number of pages in the document."""
+        return self.metadata.pages
+
+    def page_text(self, page: int) -> str:
+        """
+        Extract the text of one page in a sandbox worker.
+
+        Args:
+            page: 1-based page number
+
+        Returns:
+            Page text ("" for pages without extractable text or over their time budget)
+
+        Raises:
+            ValueError: If the page number is out of range or cannot be parsed
+        """
+        if not 1 <= page <= self.page_count:
+            raise ValueError(f"Page {page} out of range (document has {self.page_count} pages).")
+        if self.closed:
+            raise ValueError("Document has been closed.")
+        skipped: list[int] = []
+        pages = list(self.sandbox.iter_pages(self.path, self.filename, [page], skipped))
+        self.skipped_pages.extend(skipped)
+        return pages[0][1] if pages else ""
+
+    def close(self) -> None:
+        """Delete the temporary file (workers still reading it keep their handle)."""
+        self.closed = True
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class PrefetchJob:
+    """Background extraction state of one lazy document."""
+
+    def __init__(self, pdf: LazyPDF, on_page: Callable[[int, str], None]) -> None:
+        """Describe a job; PagePrefetcher.add() schedules it."""
+        self.pdf = pdf
+        self.on_page = on_page
+        self.next_page = 1
+        self.error: str | None = None
+        self.cancelled = False
+
+    @property
+    def done(self) -> bool:
+        """Whether every page has been pre-extracted (or prefetching failed)."""
+        return self.next_page > self.pdf.page_count or self.error is not None
+
+    def stop(self) -> None:
+        """Stop prefetching this document (does not wait for the current page)."""
+        self.cancelled = True
+
+
+class PagePrefetcher:
+    """
+    One background thread that pre-extracts pages of every lazy document.
+
+    Pages are extracted one at a time, round-robin across documents, and only
+    while the whole process is idle: no foreground work (see foreground()) is
+    running and none finished in the last ``idle_delay`` seconds. Each page is
+    handed to its job's ``on_page`` (typically the document's index).
+    """
+
+    def __init__(self, idle_delay: float = IDLE_DELAY) -> None:
+        """Create a prefetcher; its thread starts with the first job."""
+        self.idle_delay = idle_delay
+        self.last_activity = 0.0
+        self._active = 0  # foreground operations in progress
+        self._jobs: deque[PrefetchJob] = deque()
+        self._wake = threading.Condition()
+        self._thread: threading.Thread | None = None
+
+    def add(self, pdf: LazyPDF, on_page: Callable[[int, str], None]) -> PrefetchJob:
+        """Schedule background extraction of a document."""
+        job = PrefetchJob(pdf, on_page)
+        with self._wake:
+            self._jobs.append(job)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="page-prefetcher", daemon=True)
+                self._thread.start()
+            self._wake.notify()
+        return job
+
+    @contextmanager
+    def foreground(self) -> Iterator[None]:
+        """Mark a block of request-serving work; prefetching pauses around it."""
+        with self._wake:
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._wake:
+                self._active -= 1
+                self.last_activity = time.monotonic()
+                self._wake.notify()
+
+    def _next_job(self) -> PrefetchJob:
+        """Wait until the process is idle and a job has pages left; rotate it to the back."""
+        with self._wake:
+            while True:
+                while self._jobs and (self._jobs[0].cancelled or self._jobs[0].done):
+                    self._jobs.popleft()
+                if not self._jobs or self._active:
+                    self._wake.wait()
+                    continue
+                idle_for = time.monotonic() - self.last_activity
+                if idle_for < self.idle_delay:
+                    self._wake.wait(self.idle_delay - idle_for)
+                    continue
+                job = self._jobs[0]
+                self._jobs.rotate(-1)
+                return job
+
+    def _run(self) -> None:
+        """Prefetch loop."""
+        while True:
+            job = self._next_job()
+            page = job.next_page
+            try:
+                text = job.pdf.page_text(page)
+            except ValueError as e:
+                job.error = str(e)
+                continue
+            if not job.cancelled:
+                job.on_page(page, text)
+            job.next_page = page + 1
+
+
+page_prefetcher = PagePrefetcher()
@@ -0,0 +1,156 @@
+"""
+Ingest-time text normalization: repeated headers/footers, hyphenation, whitespace.
+"""
+import re
+from collections import Counter
+from typing import Iterable, Iterator
+
+
+EDGE_LINES = 3  # lines at the top and bottom of a page that may be headers/footers
+MIN_PAGE_LINES = 3  # pages with fewer lines are all body text
+MAX_BOILERPLATE_CHARS = 120  # longer lines are never treated as headers/footers
+MIN_REPEAT_PAGES = 3  # a line must repeat on at least this many pages...
+REPEAT_FRACTION = 0.5  # ...and on at least this fraction of the pages seen
+NORMALIZE_WINDOW = 8  # pages buffered to learn boilerplate before streaming
+
+_DIGITS = re.compile(r"\d+")
+_SPACES = re.compile(r"[ \t\u00a0\u2000-\u200b]+")
+_BLANK_LINES = re.compile(r"\n{3,}")
+_HYPHENATED = re.compile(r"(\w)-[ \t]*\n[ \t]*([a-z])")
+_PAGE_NUMBER = re.compile(r"^[\s\-–—\[(]*(page\s*)?\d+(\s*(of|/)\s*\d+)?[\s\-–—\])]*$", re.IGNORECASE)
+
+
+def _line_keys(line: str, page: int | None = None) -> set[str]:
+    """
+    Comparison keys for a line, with case and spacing folded.
+
+    The line itself is always a key. On a known page, each number is also
+    masked in turn together with its offset from the page number, so
+    "Page 3 of 40" on page 3 and "Page 4 of 40" on page 4 share a key while
+    "Article 3" on page 5 and "Article 4" on page 9 do not.
+    """
+    text = " ".join(line.lower().split())
+    keys = {text}
+    if page is not None:
+        for match in _DIGITS.finditer(text):
+            offset = int(match.group()) - page
+            keys.add(f"{text[:match.start()]}\0{offset:+d}\0{text[match.end():]}")
+    return keys
+
+
+def _lines(text: str) -> list[str]:
+    """Split page text into stripped lines, with spacing collapsed and hyphenated breaks rejoined."""
+    text = _HYPHENATED.sub(r"\1\2", _SPACES.sub(" ", text))
+    return [line.strip() for line in text.splitlines()]
+
+
+def _edge_lines(lines: list[str]) -> list[int]:
+    """Indices of the non-empty lines of a page that may be headers/footers."""
+    filled = [i for i, line in enumerate(lines) if line.strip()]
+    if len(filled) < MIN_PAGE_LINES:
+        return []
+    edges = sorted(set(filled[:EDGE_LINES] + filled[-EDGE_LINES:]))
+    return [i for i in edges if len(lines[i].strip()) <= MAX_BOILERPLATE_CHARS]
+
+
+class TextNormalizer:
+    """
+    Learns a document's running headers and footers and cleans page text.
+
+    Boilerplate is found with a frequency pass over the edge lines of each
+    page. Lines must repeat exactly, except for numbers that follow the page
+    number (so "Page 3 of 40" matches "Page 4 of 40" on the next page, but a
+    numbered heading such as "Article 3" does not match "Article 4"). A line
+    counts as boilerplate once it appears on at least MIN_REPEAT_PAGES pages
+    and REPEAT_FRACTION of the pages observed so far. Cleaning also rejoins
+    words hyphenated across line breaks and collapses whitespace.
+    """
+
+    def __init__(self) -> None:
+        """Create a normalizer that has seen no pages."""
+        self._counts: Counter[str] = Counter()
+        self.pages_observed = 0
+        self.chars_in = 0
+        self.chars_out = 0
+
+    def copy(self) -> "TextNormalizer":
+        """Normalizer that starts with this one's learned boilerplate (e.g. for a revised document)."""
+        other = TextNormalizer()
+        other._counts = self._counts.copy()
+        other.pages_observed = self.pages_observed
+        return other
+
+    @property
+    def chars_saved(self) -> int:
+        """Characters removed by clean() so far."""
+        return self.chars_in - self.chars_out
+
+    def observe(self, text: str, page: int | None = None) -> None:
+        """Count one page's candidate header/footer lines (``page`` lets page numbers match)."""
+        self.pages_observed += 1
+        lines = _lines(text)
+        self._counts.update(set().union(*(_line_keys(lines[i], page) for i in _edge_lines(lines))))
+
+    def is_boilerplate(self, line: str, page: int | None = None) -> bool:
+        """Whether a line (on the given page, if known) is a learned header/footer."""
+        threshold = max(MIN_REPEAT_PAGES, REPEAT_FRACTION * self.pages_observed)
+        return any(self._counts.get(key, 0) >= threshold for key in _line_keys(line, page))
+
+    def clean(self, text: str, page: int | None = None) -> str:
+        """
+        Normalize one page of text.
+
+        Args:
+            text: Raw extracted page text
+            page: Page number, so running page numbers are recognised
+
+        Returns:
+            Text without repeated headers/footers or page numbers at the page
+            edges, with hyphenated line breaks rejoined and whitespace collapsed
+        """
+        lines = _lines(text)
+        removed = {
+            i for i in _edge_lines(lines)
+            if self.is_boilerplate(lines[i], page) or _PAGE_NUMBER.match(lines[i])
+        }
+        kept = [line for i, line in enumerate(lines) if i not in removed]
+        if not any(kept):
+            # Never drop a whole page; it is all content that happens to repeat
+            kept = lines
+        cleaned = _BLANK_LINES.sub("\n\n", "\n".join(kept)).strip()
+        self.chars_in += len(text)
+        self.chars_out += len(cleaned)
+        return cleaned
+
+    def normalize_pages(
+        self, pages: Iterable[tuple[int, str]], window: int = NORMALIZE_WINDOW
+    ) -> Iterator[tuple[int, str]]:
+        """
+        Normalize a stream of pages, buffering only the first ``window`` pages.
+
+        The first pages are observed together so boilerplate is recognised
+        from the start; later pages are observed and cleaned as they arrive.
+
+        Args:
+            pages: (page_number, raw_text) in page order, e.g. PDFParser.iter_pages()
+            window: Pages buffered before the first one is yielded
+
+        Yields:
+            (page_number, cleaned_text) for pages that still have text
+        """
+        buffered: list[tuple[int, str]] = []
+        iterator = iter(pages)
+        for page, text in iterator:
+            self.observe(text, page)
+            buffered.append((page, text))
+            if len(buffered) >= window:
+                break
+        for page, text in buffered:
+            cleaned = self.clean(text, page)
+            if cleaned:
+                yield page, cleaned
+        for page, text in iterator:
+            self.observe(text, page)
+            cleaned = self.clean(text, page)
+            if cleaned:
+                yield page, cleaned
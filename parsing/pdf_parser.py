@@ -1,11 +1,17 @@
 """
 PDF parsing functionality.
 """
-from pypdf import PdfReader
 from pydantic import BaseModel
-from typing import BinaryIO
+from typing import TYPE_CHECKING, BinaryIO, Iterable, Iterator
+import hashlib
 import io
 
+from backend.tracing import span
+from parsing.normalize import TextNormalizer
+
+if TYPE_CHECKING:
+    from pypdf import PdfReader
+
 
 class PDFMetadata(BaseModel):
     """Metadata extracted from PDF."""
@@ -13,6 +19,7 @@ class PDFMetadata(BaseModel):
     author: str | None = None
     pages: int = 0
     text_length: int = 0
+    chars_saved: int = 0  # removed by normalization (headers, footers, hyphenation, whitespace)
 
 
 class PDFParser:
@@ -45,53 +52,173 @@ class PDFParser:
             raise ValueError(f"File too large. Maximum size is {cls.MAX_FILE_SIZE / (1024*1024):.1f}MB")
     
     @classmethod
-    def parse(cls, file_content: bytes, filename: str) -> tuple[str, PDFMetadata]:
+    def open(cls, file_content: bytes | BinaryIO, filename: str) -> tuple["PdfReader", PDFMetadata]:
         """
-        Parse PDF file and extract text and metadata.
+        Open PDF file and read its metadata without extracting any text.
         
         Args:
-            file_content: Binary content of the PDF file
+            file_content: Binary content of the PDF file, or a seekable binary
+                stream (e.g. a memory map) that the reader keeps using
             filename: Name of the file
             
         Returns:
-            Tuple of (extracted_text, metadata)
+            Tuple of (reader, metadata); metadata.text_length is 0
             
         Raises:
             ValueError: If file is invalid or corrupted
         """
         try:
-            # Create file-like object
-            pdf_file = io.BytesIO(file_content)
+            with span("parse.open"):
+                # pypdf is imported lazily to keep application start-up fast
+                from pypdf import PdfReader
+                
+                # Create file-like object
+                if isinstance(file_content, bytes):
+                    pdf_file = io.BytesIO(file_content)
+                else:
+                    pdf_file = file_content
+                
+                # Read PDF
+                reader = PdfReader(pdf_file)
             
-            # Read PDF
-            reader = PdfReader(pdf_file)
+            # Extract metadata
+            with span("parse.metadata"):
+                metadata = reader.metadata or {}
+                
+                pdf_metadata = PDFMetadata(
+                    title=metadata.get("/Title", "").strip() or None,
+                    author=metadata.get("/Author", "").strip() or None,
+                    pages=len(reader.pages),
+                )
             
-            # Extract text from all pages
-            text_parts: list[str] = []
-            for page in reader.pages:
-                text = page.extract_text()
-                if text:
-                    text_parts.append(text)
+            return reader, pdf_metadata
             
-            full_text = "\n\n".join(text_parts).strip()
+        except Exception as e:
+            raise ValueError(f"Failed to parse PDF: {str(e)}")
+    
+    @classmethod
+    def iter_pages(cls, reader: "PdfReader", pages: Iterable[int] | None = None) -> Iterator[tuple[int, str]]:
+        """
+        Extract text page by page, yielding each page as soon as it is ready.
+        
+        Args:
+            reader: Reader returned by open()
+            pages: 1-based page numbers to extract, in order (default: all)
             
-            if not full_text:
-                raise ValueError("PDF contains no extractable text.")
+        Yields:
+            Tuples of (page_number, text) for pages with extractable text;
+            page numbers are 1-based
             
-            # Extract metadata
-            metadata = reader.metadata or {}
+        Raises:
+            ValueError: If a page cannot be parsed
+        """
+        if pages is None:
+            pages = range(1, len(reader.pages) + 1)
+        for page_number in pages:
+            try:
+                text = reader.pages[page_number - 1].extract_text()
+            except Exception as e:
+                raise ValueError(f"Failed to parse PDF page {page_number}: {str(e)}")
+            if text:
+                yield page_number, text
+    
+    @classmethod
+    def page_hashes(cls, reader: "PdfReader") -> list[str]:
+        """
+        Hash every page's content stream and resources without extracting any text.
+        
+        Text depends on the content stream and on the resources it draws
+        with (fonts and their encodings, form XObjects), so both are hashed:
+        pages with equal hashes produce the same text, and a revised document
+        only needs its pages with new hashes extracted. Resources shared by
+        many pages are hashed once.
+        
+        Args:
+            reader: Reader returned by open()
             
-            pdf_metadata = PDFMetadata(
-                title=metadata.get("/Title", "").strip() or None,
-                author=metadata.get("/Author", "").strip() or None,
-                pages=len(reader.pages),
-                text_length=len(full_text),
-            )
+        Returns:
+            One hex digest per page, in page order
             
-            return full_text, pdf_metadata
+        Raises:
+            ValueError: If a page cannot be read
+        """
+        digests: dict[tuple[int, int], bytes] = {}
+        hashes = []
+        for page_number, page in enumerate(reader.pages, start=1):
+            try:
+                contents = page.get_contents()
+                data = contents.get_data() if contents is not None else b""
+                resources = page.raw_get("/Resources") if "/Resources" in page else None
+                data += cls._object_digest(resources, digests)
+            except Exception as e:
+                raise ValueError(f"Failed to parse PDF page {page_number}: {str(e)}")
+            hashes.append(hashlib.blake2b(data, digest_size=16).hexdigest())
+        return hashes
+    
+    @classmethod
+    def _object_digest(
+        cls, obj: object, digests: dict[tuple[int, int], bytes], active: frozenset = frozenset()
+    ) -> bytes:
+        """
+        Digest of a PDF object including everything it references (stream data too).
+        
+        Indirect objects are digested once and remembered in ``digests``;
+        ``/Parent`` links are not followed, and reference cycles are cut.
+        """
+        from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, StreamObject
+        
+        if isinstance(obj, IndirectObject):
+            key = (obj.idnum, obj.generation)
+            if key in digests:
+                return digests[key]
+            if key in active:
+                return b"cycle"
+            digest = cls._object_digest(obj.get_object(), digests, active | {key})
+            digests[key] = digest
+            return digest
+        hasher = hashlib.blake2b(digest_size=16)
+        if isinstance(obj, StreamObject):
+            hasher.update(b"stream")
+            hasher.update(obj.get_data())
+        if isinstance(obj, DictionaryObject):
+            for key in sorted(obj):
+                if key != "/Parent":
+                    hasher.update(key.encode())
+                    hasher.update(cls._object_digest(obj.raw_get(key), digests, active))
+        elif isinstance(obj, ArrayObject):
+            hasher.update(b"[")
+            for item in obj:
+                hasher.update(cls._object_digest(item, digests, active))
+        else:
+            hasher.update(repr(obj).encode())
+        return hasher.digest()
+    
+    @classmethod
+    def parse(cls, file_content: bytes, filename: str) -> tuple[str, PDFMetadata]:
+        """
+        Parse PDF file and extract normalized text and metadata.
+        
+        Args:
+            file_content: Binary content of the PDF file
+            filename: Name of the file
             
-        except Exception as e:
-            if isinstance(e, ValueError):
-                raise
-            raise ValueError(f"Failed to parse PDF: {str(e)}")
-
+        Returns:
+            Tuple of (extracted_text, metadata)
+            
+        Raises:
+            ValueError: If file is invalid or corrupted
+        """
+        reader, pdf_metadata = cls.open(file_content, filename)
+        
+        # Extract text from all pages, dropping repeated headers and footers
+        with span("parse.extract", pages=pdf_metadata.pages):
+            normalizer = TextNormalizer()
+            text_parts = [text for _, text in normalizer.normalize_pages(cls.iter_pages(reader))]
+            full_text = "\n\n".join(text_parts).strip()
+        
+        if not full_text:
+            raise ValueError("PDF contains no extractable text.")
+        
+        pdf_metadata.text_length = len(full_text)
+        pdf_metadata.chars_saved = normalizer.chars_saved
+        return full_text, pdf_metadata
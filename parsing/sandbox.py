@@ -0,0 +1,353 @@
+"""
+PDF parsing in isolated, resource-limited worker processes.
+"""
+import math
+import mmap
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from typing import Iterable, Iterator
+
+from parsing.pdf_parser import PDFMetadata, PDFParser
+
+try:
+    import resource
+except ImportError:  # not available on Windows; limits are then wall-clock only
+    resource = None
+
+
+SANDBOX_WORKERS = int(os.getenv("SANDBOX_WORKERS", "2"))  # parse processes
+SANDBOX_CPU_SECONDS = int(os.getenv("SANDBOX_CPU_SECONDS", "60"))  # CPU time per job
+SANDBOX_WALL_SECONDS = float(os.getenv("SANDBOX_WALL_SECONDS", "120"))  # wall-clock time per job
+SANDBOX_MEMORY_MB = int(os.getenv("SANDBOX_MEMORY_MB", "1024"))  # address space per worker
+SANDBOX_PAGE_SECONDS = float(os.getenv("SANDBOX_PAGE_SECONDS", "5"))  # pages slower than this are skipped
+SANDBOX_MAX_JOBS = 100  # jobs a worker runs before it is replaced
+
+
+class _PageTimeout(BaseException):
+    """A page ran over its time budget (BaseException so extraction cannot swallow it)."""
+
+
+def _page_timeout(signum, frame) -> None:
+    """SIGALRM handler: abandon the current page."""
+    raise _PageTimeout()
+
+
+def _limit_cpu(seconds: int) -> None:
+    """Let the worker use ``seconds`` more CPU time before the kernel stops it."""
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    used = math.ceil(usage.ru_utime + usage.ru_stime)
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    resource.setrlimit(resource.RLIMIT_CPU, (used + seconds, hard))
+
+
+def _open_source(source: bytes | str, filename: str, opened: dict) -> tuple:
+    """
+    Open a job's PDF in the worker.
+
+    Bytes are opened for this job only. A file path is memory-mapped and its
+    reader kept in ``opened`` for the next job on the same path, so page-by-
+    page extraction of an on-disk document does not re-parse it every time.
+    """
+    if isinstance(source, bytes):
+        return PDFParser.open(source, filename)
+    if opened.get("path") != source:
+        _close_source(opened)
+        with open(source, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            opened.update(path=source, mapped=mapped, pdf=PDFParser.open(mapped, filename))
+        except BaseException:
+            mapped.close()
+            raise
+    return opened["pdf"]
+
+
+def _close_source(opened: dict) -> None:
+    """Drop the reader kept for a file path."""
+    mapped = opened.get("mapped")
+    opened.clear()
+    if mapped is not None:
+        try:
+            mapped.close()
+        except BufferError:
+            pass  # still referenced by the reader; released with it
+
+
+def _worker_main(conn, memory_bytes: int, page_seconds: float) -> None:
+    """
+    Serve parse jobs until the pipe closes.
+
+    Jobs are (kind, source, filename, pages, cpu_seconds), where source is
+    the PDF's bytes or the path of a file holding it. ``inspect`` replies
+    ("meta", metadata, page_hashes); ``metadata`` replies ("meta", metadata,
+    None); ``extract`` replies one ("page", n, text) or ("skipped", n) per
+    page, then ("done",). Failures reply ("error", message).
+    """
+    if resource is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+    signal.signal(signal.SIGALRM, _page_timeout)
+    opened: dict = {}
+    while True:
+        try:
+            kind, source, filename, pages, cpu_seconds = conn.recv()
+        except EOFError:
+            return
+        if resource is not None:
+            _limit_cpu(cpu_seconds)
+        try:
+            reader, metadata = _open_source(source, filename, opened)
+            if kind == "inspect":
+                conn.send(("meta", metadata.model_dump(), PDFParser.page_hashes(reader)))
+                continue
+            if kind == "metadata":
+                conn.send(("meta", metadata.model_dump(), None))
+                continue
+            for page in pages if pages is not None else range(1, metadata.pages + 1):
+                try:
+                    signal.setitimer(signal.ITIMER_REAL, page_seconds)
+                    extracted = list(PDFParser.iter_pages(reader, [page]))
+                except _PageTimeout:
+                    conn.send(("skipped", page))
+                    continue
+                finally:
+                    signal.setitimer(signal.ITIMER_REAL, 0)
+                if extracted:
+                    conn.send(("page", page, extracted[0][1]))
+            conn.send(("done",))
+        except OSError as e:
+            conn.send(("error", f"Failed to read PDF: {str(e)}"))
+        except MemoryError:
+            conn.send(("error", f"PDF needs more than {memory_bytes // 2**20}MB to parse"))
+        except ValueError as e:
+            conn.send(("error", str(e)))
+        except Exception as e:
+            conn.send(("error", f"Failed to parse PDF: {str(e)}"))
+
+
+class _Worker:
+    """A parse process and the parent's end of its pipe."""
+
+    def __init__(self, context, memory_bytes: int, page_seconds: float) -> None:
+        """Start a worker process."""
+        self.conn, child = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main, args=(child, memory_bytes, page_seconds), daemon=True
+        )
+        self.process.start()
+        child.close()
+        self.jobs = 0
+
+    def alive(self) -> bool:
+        """Whether the process is still running."""
+        return self.process.is_alive()
+
+    def kill(self) -> None:
+        """Kill the process, whatever it is doing."""
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def stop(self) -> None:
+        """Let an idle process exit, killing it if it does not."""
+        self.conn.close()  # the worker exits on EOF
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.kill()
+
+
+class ParseSandbox:
+    """
+    Pool of worker processes that parse PDFs under resource limits.
+
+    A malformed or adversarial PDF can make pypdf spin or allocate without
+    bound; in a worker it can only exhaust that worker. Each job is limited
+    in CPU time (RLIMIT_CPU) and wall-clock time, each worker in address
+    space (RLIMIT_AS), and each page to a time budget after which the page
+    is skipped. A worker that is killed or has served ``max_jobs`` jobs is
+    replaced.
+
+    Jobs take the PDF's bytes, or the path of a file holding it (used for
+    lazy documents: a worker keeps the last file it opened, so extracting
+    one page at a time does not re-parse the document per page).
+
+    All failures, including limits being hit, surface as ValueError.
+    """
+
+    def __init__(
+        self,
+        workers: int = SANDBOX_WORKERS,
+        cpu_seconds: int = SANDBOX_CPU_SECONDS,
+        wall_seconds: float = SANDBOX_WALL_SECONDS,
+        memory_mb: int = SANDBOX_MEMORY_MB,
+        page_seconds: float = SANDBOX_PAGE_SECONDS,
+        max_jobs: int = SANDBOX_MAX_JOBS,
+    ) -> None:
+        """Create a pool; workers are started when first needed."""
+        self.cpu_seconds = cpu_seconds
+        self.wall_seconds = wall_seconds
+        self.memory_bytes = memory_mb * 2**20
+        self.page_seconds = page_seconds
+        self.max_jobs = max_jobs
+        self.kills = 0
+        # spawn: workers must not inherit the API process's threads and locks
+        self._context = multiprocessing.get_context("spawn")
+        self._slots = threading.BoundedSemaphore(workers)
+        self._idle: list[_Worker] = []
+        self._lock = threading.Lock()
+
+    def inspect(self, file_content: bytes | str, filename: str) -> tuple[PDFMetadata, list[str]]:
+        """
+        Open a PDF and hash its pages (see PDFParser.open and page_hashes).
+
+        Returns:
+            Tuple of (metadata, page_hashes); metadata.text_length is 0
+
+        Raises:
+            ValueError: If the file is invalid or a limit was exceeded
+        """
+        return self._request("inspect", file_content, filename)
+
+    def metadata(self, file_content: bytes | str, filename: str) -> PDFMetadata:
+        """
+        Open a PDF and read only its metadata (see PDFParser.open).
+
+        Raises:
+            ValueError: If the file is invalid or a limit was exceeded
+        """
+        return self._request("metadata", file_content, filename)[0]
+
+    def _request(
+        self, kind: str, file_content: bytes | str, filename: str
+    ) -> tuple[PDFMetadata, list[str] | None]:
+        """Run a single-reply job in a worker."""
+        deadline = time.monotonic() + self.wall_seconds
+        worker = self._acquire(deadline)
+        healthy = False
+        try:
+            worker.conn.send((kind, file_content, filename, None, self.cpu_seconds))
+            reply = self._receive(worker, deadline)
+            healthy = True
+            if reply[0] == "error":
+                raise ValueError(reply[1])
+            return PDFMetadata(**reply[1]), reply[2]
+        finally:
+            self._release(worker, healthy)
+
+    def iter_pages(
+        self,
+        file_content: bytes | str,
+        filename: str,
+        pages: Iterable[int] | None = None,
+        skipped: list[int] | None = None,
+    ) -> Iterator[tuple[int, str]]:
+        """
+        Extract text page by page in a worker (see PDFParser.iter_pages).
+
+        The worker is held until the iterator is exhausted or closed; the
+        wall-clock limit covers the whole extraction.
+
+        Args:
+            file_content: Binary content of the PDF file, or the path of a file holding it
+            filename: Name of the file
+            pages: 1-based page numbers to extract, in order (default: all)
+            skipped: Receives the pages dropped for exceeding their time budget
+
+        Yields:
+            Tuples of (page_number, text) for pages with extractable text
+
+        Raises:
+            ValueError: If a page cannot be parsed or a limit was exceeded
+        """
+        deadline = time.monotonic() + self.wall_seconds
+        worker = self._acquire(deadline)
+        healthy = False
+        try:
+            pages = list(pages) if pages is not None else None
+            worker.conn.send(("extract", file_content, filename, pages, self.cpu_seconds))
+            while True:
+                reply = self._receive(worker, deadline)
+                if reply[0] == "page":
+                    yield reply[1], reply[2]
+                elif reply[0] == "skipped":
+                    if skipped is not None:
+                        skipped.append(reply[1])
+                elif reply[0] == "error":
+                    healthy = True
+                    raise ValueError(reply[1])
+                else:
+                    healthy = True
+                    return
+        finally:
+            # A worker abandoned mid-job is still working on it; it is replaced
+            self._release(worker, healthy)
+
+    def close(self) -> None:
+        """Stop idle workers."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.stop()
+
+    def _acquire(self, deadline: float) -> _Worker:
+        """Take an idle worker, starting one if needed."""
+        if not self._slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            raise ValueError("PDF parsing is busy. Please try again shortly.")
+        try:
+            with self._lock:
+                while self._idle:
+                    worker = self._idle.pop()
+                    if worker.alive():
+                        break
+                    worker.conn.close()
+                else:
+                    worker = None
+            if worker is None:
+                worker = _Worker(self._context, self.memory_bytes, self.page_seconds)
+            worker.jobs += 1
+            return worker
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _release(self, worker: _Worker, healthy: bool) -> None:
+        """Return a worker to the pool, or replace it if it is spent or mid-job."""
+        try:
+            if not healthy or not worker.alive():
+                if worker.alive():
+                    worker.kill()
+                worker.conn.close()
+            elif worker.jobs >= self.max_jobs:
+                worker.stop()
+            else:
+                with self._lock:
+                    self._idle.append(worker)
+        finally:
+            self._slots.release()
+
+    def _receive(self, worker: _Worker, deadline: float) -> tuple:
+        """
+        Next reply from a worker within the job's deadline.
+
+        Raises:
+            ValueError: If the job ran out of time or the worker died
+        """
+        if not worker.conn.poll(max(0.0, deadline - time.monotonic())):
+            self.kills += 1
+            worker.kill()
+            raise ValueError(f"PDF parsing took longer than {self.wall_seconds:g}s and was stopped.")
+        try:
+            return worker.conn.recv()
+        except (EOFError, OSError):
+            worker.process.join()
+            self.kills += 1
+            if worker.process.exitcode == -getattr(signal, "SIGXCPU", 0):
+                raise ValueError(
+                    f"PDF parsing used more than {self.cpu_seconds}s of CPU time and was stopped."
+                )
+            raise ValueError("PDF parsing failed: the parser exceeded its resource limits.")
+
+
+parse_sandbox = ParseSandbox()
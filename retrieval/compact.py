@@ -0,0 +1,140 @@
+"""
+Compact, compressed in-memory text storage.
+"""
+import sys
+import zlib
+from collections import OrderedDict
+
+
+BLOCK_CHARS = 16 * 1024  # characters per compressed block
+DECOMPRESSED_CACHE_BLOCKS = 4  # recently used blocks kept decompressed
+COMPRESSION_LEVEL = 6
+
+
+class CompressedText:
+    """
+    Append-only text stored as zlib-compressed UTF-8 blocks.
+
+    Text is addressed by character offsets. Appended text accumulates in an
+    uncompressed tail until a full block is available; seal() compresses the
+    partial tail once no more text is expected. Reads decompress only the
+    blocks a range touches, keeping a few recently used blocks decoded.
+    """
+
+    __slots__ = ("_blocks", "_tail", "_sealed_tail", "_tail_start", "_length", "_cache")
+
+    def __init__(self) -> None:
+        """Create empty storage."""
+        self._blocks: list[bytes] = []  # block i holds characters [i * BLOCK_CHARS, (i + 1) * BLOCK_CHARS)
+        self._tail: list[str] = []
+        self._sealed_tail: bytes | None = None  # compressed partial tail after seal()
+        self._tail_start = 0
+        self._length = 0
+        self._cache: OrderedDict[int, str] = OrderedDict()
+
+    def __len__(self) -> int:
+        """Total number of characters stored."""
+        return self._length
+
+    def append(self, text: str) -> tuple[int, int]:
+        """
+        Append text.
+
+        Returns:
+            (start, end) character offsets of the appended text
+        """
+        start = self._length
+        if self._sealed_tail is not None:
+            self._tail = [self._tail_text()]
+            self._sealed_tail = None
+            self._cache.pop(-1, None)
+        self._tail.append(text)
+        self._length += len(text)
+        if self._length - self._tail_start >= BLOCK_CHARS:
+            self._compress_tail()
+        return start, self._length
+
+    def copy(self) -> "CompressedText":
+        """
+        Copy that shares the compressed blocks with this text.
+
+        Blocks are immutable, so copying costs one list of references; text
+        appended to either copy afterwards is independent.
+        """
+        other = CompressedText()
+        other._blocks = list(self._blocks)
+        other._tail = list(self._tail)
+        other._sealed_tail = self._sealed_tail
+        other._tail_start = self._tail_start
+        other._length = self._length
+        return other
+
+    def _compress_tail(self) -> None:
+        """Move complete blocks from the tail into compressed storage."""
+        pending = "".join(self._tail)
+        offset = 0
+        while len(pending) - offset >= BLOCK_CHARS:
+            block = pending[offset:offset + BLOCK_CHARS]
+            self._blocks.append(zlib.compress(block.encode("utf-8"), COMPRESSION_LEVEL))
+            offset += BLOCK_CHARS
+        self._tail_start += offset
+        self._tail = [pending[offset:]] if offset < len(pending) else []
+
+    def seal(self) -> None:
+        """Compress the partial tail block (appending later is still allowed)."""
+        if self._tail and self._sealed_tail is None:
+            tail = "".join(self._tail)
+            self._sealed_tail = zlib.compress(tail.encode("utf-8"), COMPRESSION_LEVEL)
+            self._tail = []
+
+    def _tail_text(self) -> str:
+        """Text of the tail, decompressing it if sealed."""
+        if self._sealed_tail is not None:
+            return self._block(-1)
+        if len(self._tail) > 1:
+            self._tail = ["".join(self._tail)]
+        return self._tail[0] if self._tail else ""
+
+    def _block(self, index: int) -> str:
+        """Decompressed text of one block."""
+        text = self._cache.get(index)
+        if text is None:
+            data = self._sealed_tail if index == -1 else self._blocks[index]
+            text = zlib.decompress(data).decode("utf-8")
+            self._cache[index] = text
+            if len(self._cache) > DECOMPRESSED_CACHE_BLOCKS:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(index)
+        return text
+
+    def slice(self, start: int, end: int) -> str:
+        """Return the text between two character offsets."""
+        end = min(end, self._length)
+        if start >= end:
+            return ""
+        parts: list[str] = []
+        position = start
+        # Compressed blocks
+        block = position // BLOCK_CHARS
+        while position < end and position < self._tail_start:
+            block_start = block * BLOCK_CHARS
+            text = self._block(block)
+            parts.append(text[position - block_start:end - block_start])
+            position = block_start + len(text)
+            block += 1
+        # Uncompressed tail
+        if position < end:
+            tail = self._tail_text()
+            parts.append(tail[position - self._tail_start:end - self._tail_start])
+        return "".join(parts)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held: compressed blocks, uncompressed tail and decoded cache, with object overhead."""
+        blocks = sys.getsizeof(self._blocks) + sum(sys.getsizeof(b) for b in self._blocks)
+        if self._sealed_tail is not None:
+            blocks += sys.getsizeof(self._sealed_tail)
+        tail = sys.getsizeof(self._tail) + sum(sys.getsizeof(t) for t in self._tail)
+        cache = sys.getsizeof(self._cache) + sum(sys.getsizeof(t) for t in self._cache.values())
+        return sys.getsizeof(self) + blocks + tail + cache
@@ -0,0 +1,378 @@
+"""
+Incremental keyword index over document chunks.
+"""
+import heapq
+import math
+import re
+import sys
+import threading
+from array import array
+from collections import Counter
+from dataclasses import dataclass
+
+from retrieval.compact import CompressedText
+
+
+CHUNK_SIZE = 1000  # characters per chunk
+CHUNK_OVERLAP = 200  # characters shared between neighbouring chunks
+COMPACT_DEAD_FRACTION = 0.5  # derive() compacts once more than this share of chunks is dead
+
+# BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    """Lower-case word tokens used for indexing and queries."""
+    return [t for t in _TOKEN_PATTERN.findall(text.lower()) if len(t) > 1]
+
+
+def chunk_spans(text: str, size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> list[tuple[int, int]]:
+    """
+    Split text into overlapping chunks, preferring whitespace boundaries.
+
+    Args:
+        text: Text to split
+        size: Target chunk size in characters
+        overlap: Characters repeated at the start of the next chunk
+
+    Returns:
+        (start, end) offsets into ``text``, trimmed of surrounding whitespace
+    """
+    spans: list[tuple[int, int]] = []
+    begin = len(text) - len(text.lstrip())
+    finish = len(text.rstrip())
+    start = begin
+    while start < finish:
+        end = min(start + size, finish)
+        if end < finish:
+            boundary = text.rfind(" ", start + size // 2, end)
+            if boundary != -1:
+                end = boundary
+        # Trim whitespace at the chunk edges
+        chunk_start, chunk_end = start, end
+        while chunk_start < chunk_end and text[chunk_start].isspace():
+            chunk_start += 1
+        while chunk_end > chunk_start and text[chunk_end - 1].isspace():
+            chunk_end -= 1
+        if chunk_start < chunk_end:
+            spans.append((chunk_start, chunk_end))
+        if end >= finish:
+            break
+        start = max(end - overlap, start + 1)
+    return spans
+
+
+def split_chunks(text: str, size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> list[str]:
+    """Split text into overlapping chunk strings (see chunk_spans)."""
+    return [text[start:end] for start, end in chunk_spans(text, size, overlap)]
+
+
+@dataclass(slots=True)
+class Chunk:
+    """A searchable piece of a document page (materialized on demand)."""
+    chunk_id: int
+    page: int
+    text: str
+
+
+class DocumentIndex:
+    """
+    BM25 keyword index that can be searched while pages are still being added.
+
+    Page text is held once, in compressed blocks; chunks are offset ranges into
+    it kept in flat arrays, and postings are flat (chunk_id, tf) int arrays, so
+    no per-chunk or per-posting Python objects are kept. Chunk records are only
+    created for search results.
+
+    Pages may be added from an ingestion thread while request handlers search,
+    so all mutation and lookups happen under a lock.
+
+    derive() builds the index of a revised document from this one without
+    re-chunking or re-tokenizing unchanged pages: text blocks and posting
+    arrays are shared (postings are copied on first write) and chunks of
+    dropped pages are left in place as dead entries. Once dead entries make
+    up more than COMPACT_DEAD_FRACTION of the chunks, derive() compacts
+    instead: live text, chunks and postings are copied (still without
+    re-tokenizing) and the dead ones dropped.
+    """
+
+    def __init__(self) -> None:
+        """Create an empty index."""
+        self._text = CompressedText()
+        # Page table: page number and its offsets in the compressed text
+        self._page_slots: dict[int, int] = {}
+        self._page_starts = array("Q")
+        self._page_ends = array("Q")
+        # Chunk table
+        self._chunk_pages = array("I")
+        self._chunk_starts = array("Q")
+        self._chunk_ends = array("Q")
+        self._lengths = array("I")  # tokens per chunk
+        self._live = bytearray()  # 0 for chunks of pages dropped by derive()
+        self._live_count = 0
+        self._postings: dict[str, array] = {}  # term -> flat [chunk_id, tf, chunk_id, tf, ...]
+        self._shared_terms: set[str] = set()  # postings still shared with the parent index
+        self._total_length = 0  # tokens in live chunks
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Number of indexed (live) chunks."""
+        return self._live_count
+
+    def add_page(self, page: int, text: str) -> int:
+        """
+        Chunk and index one page of text.
+
+        Args:
+            page: 1-based page number
+            text: Extracted page text
+
+        Returns:
+            Number of chunks added
+        """
+        spans = chunk_spans(text)
+        with self._lock:
+            page_start, page_end = self._text.append(text)
+            self._page_slots[page] = len(self._page_starts)
+            self._page_starts.append(page_start)
+            self._page_ends.append(page_end)
+            for start, end in spans:
+                chunk_id = len(self._chunk_pages)
+                terms = Counter(tokenize(text[start:end]))
+                for term, tf in terms.items():
+                    postings = self._postings.get(term)
+                    if postings is None:
+                        postings = self._postings[term] = array("I")
+                    elif term in self._shared_terms:
+                        postings = self._postings[term] = array("I", postings)
+                        self._shared_terms.discard(term)
+                    postings.append(chunk_id)
+                    postings.append(tf)
+                length = sum(terms.values())
+                self._lengths.append(length)
+                self._live.append(1)
+                self._live_count += 1
+                self._total_length += length
+                self._chunk_pages.append(page)
+                self._chunk_starts.append(page_start + start)
+                self._chunk_ends.append(page_start + end)
+        return len(spans)
+
+    def derive(self, page_map: dict[int, int]) -> "DocumentIndex":
+        """
+        Index for a revised document that keeps some of this index's pages.
+
+        Args:
+            page_map: Page number here -> page number in the revision, for
+                every unchanged page; other pages are left out
+
+        Returns:
+            A new index holding the mapped pages, ready for changed pages to be added
+        """
+        with self._lock:
+            live = sum(
+                1 for alive, page in zip(self._live, self._chunk_pages) if alive and page in page_map
+            )
+            if len(self._chunk_pages) - live > COMPACT_DEAD_FRACTION * len(self._chunk_pages):
+                return self._compacted(page_map)
+            index = DocumentIndex()
+            index._text = self._text.copy()
+            index._page_starts = array("Q", self._page_starts)
+            index._page_ends = array("Q", self._page_ends)
+            index._page_slots = {
+                new: self._page_slots[old] for old, new in page_map.items() if old in self._page_slots
+            }
+            index._chunk_starts = array("Q", self._chunk_starts)
+            index._chunk_ends = array("Q", self._chunk_ends)
+            index._lengths = array("I", self._lengths)
+            index._chunk_pages = array("I", (page_map.get(page, 0) for page in self._chunk_pages))
+            index._live = bytearray(
+                live and page in page_map for live, page in zip(self._live, self._chunk_pages)
+            )
+            index._live_count = sum(index._live)
+            index._total_length = sum(
+                length for length, live in zip(self._lengths, index._live) if live
+            )
+            index._postings = dict(self._postings)
+            index._shared_terms = set(self._postings)
+            return index
+
+    def _compacted(self, page_map: dict[int, int]) -> "DocumentIndex":
+        """derive() that copies only the kept pages' text, chunks and postings (lock held)."""
+        index = DocumentIndex()
+        shifts: dict[int, int] = {}  # kept page (here) -> offset change of its text
+        for old, new in sorted(page_map.items(), key=lambda item: item[1]):
+            slot = self._page_slots.get(old)
+            if slot is None:
+                continue
+            start, end = self._page_starts[slot], self._page_ends[slot]
+            new_start, new_end = index._text.append(self._text.slice(start, end))
+            index._page_slots[new] = len(index._page_starts)
+            index._page_starts.append(new_start)
+            index._page_ends.append(new_end)
+            shifts[old] = new_start - start
+        index._text.seal()
+
+        chunk_ids = array("q", [-1]) * len(self._chunk_pages)  # old chunk id -> new, -1 if dropped
+        for chunk_id, (alive, page) in enumerate(zip(self._live, self._chunk_pages)):
+            shift = shifts.get(page)
+            if not alive or shift is None:
+                continue
+            chunk_ids[chunk_id] = len(index._chunk_pages)
+            index._chunk_pages.append(page_map[page])
+            index._chunk_starts.append(self._chunk_starts[chunk_id] + shift)
+            index._chunk_ends.append(self._chunk_ends[chunk_id] + shift)
+            index._lengths.append(self._lengths[chunk_id])
+            index._live.append(1)
+            index._total_length += self._lengths[chunk_id]
+        index._live_count = len(index._chunk_pages)
+
+        for term, postings in self._postings.items():
+            kept = array("I")
+            for i in range(0, len(postings), 2):
+                chunk_id = chunk_ids[postings[i]]
+                if chunk_id >= 0:
+                    kept.append(chunk_id)
+                    kept.append(postings[i + 1])
+            if kept:
+                index._postings[term] = kept
+        return index
+
+    def page_length(self, page: int) -> int:
+        """Characters stored for a page (0 if the page is not indexed)."""
+        with self._lock:
+            slot = self._page_slots.get(page)
+            return 0 if slot is None else self._page_ends[slot] - self._page_starts[slot]
+
+    def seal(self) -> None:
+        """Compress any buffered text once ingestion has finished."""
+        with self._lock:
+            self._text.seal()
+
+    def page_text(self, page: int) -> str | None:
+        """Stored text of a page, or None if the page is not indexed."""
+        with self._lock:
+            slot = self._page_slots.get(page)
+            if slot is None:
+                return None
+            return self._text.slice(self._page_starts[slot], self._page_ends[slot])
+
+    def chunk(self, chunk_id: int) -> Chunk:
+        """Materialize one chunk record."""
+        with self._lock:
+            return self._chunk(chunk_id)
+
+    def _chunk(self, chunk_id: int) -> Chunk:
+        """Materialize one chunk record (lock held)."""
+        text = self._text.slice(self._chunk_starts[chunk_id], self._chunk_ends[chunk_id])
+        return Chunk(chunk_id=chunk_id, page=self._chunk_pages[chunk_id], text=text)
+
+    def search(self, query: str, k: int = 5) -> list[Chunk]:
+        """
+        Return the ``k`` best-matching chunks for a query.
+
+        Args:
+            query: Free-text query
+            k: Maximum number of chunks
+
+        Returns:
+            Chunks ordered by descending BM25 score
+        """
+        return self.search_many([query], k)[0]
+
+    def search_many(self, queries: list[str], k: int = 5) -> list[list[Chunk]]:
+        """
+        Search for many queries in one pass over the index.
+
+        Each posting list is read once and its BM25 contributions (which do
+        not depend on the query) are added to every query containing the term.
+
+        Args:
+            queries: Free-text queries
+            k: Maximum number of chunks per query
+
+        Returns:
+            One result list per query, each ordered by descending BM25 score
+        """
+        term_queries: dict[str, list[int]] = {}
+        for query_number, query in enumerate(queries):
+            for term in set(tokenize(query)):
+                term_queries.setdefault(term, []).append(query_number)
+
+        scores: list[dict[int, float]] = [{} for _ in queries]
+        with self._lock:
+            n = self._live_count
+            if n == 0:
+                return [[] for _ in queries]
+            avg_length = self._total_length / n or 1.0
+            live = self._live
+            for term, query_numbers in term_queries.items():
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                df = len(postings) // 2  # includes dead chunks; close enough for ranking
+                idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+                targets = [scores[q] for q in query_numbers]
+                for i in range(0, len(postings), 2):
+                    chunk_id, tf = postings[i], postings[i + 1]
+                    if not live[chunk_id]:
+                        continue
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[chunk_id] / avg_length)
+                    contribution = idf * tf * (BM25_K1 + 1) / (tf + norm)
+                    for target in targets:
+                        target[chunk_id] = target.get(chunk_id, 0.0) + contribution
+            return [
+                [self._chunk(chunk_id) for chunk_id in heapq.nlargest(k, s, key=s.__getitem__)]
+                for s in scores
+            ]
+
+    def pages_with_terms(self, terms: list[str]) -> set[int]:
+        """
+        Pages that contain every one of the given terms (in any of their chunks).
+
+        Used as the candidate set for exact phrase lookups, which then check
+        the page text itself.
+        """
+        pages: set[int] | None = None
+        with self._lock:
+            for term in set(terms):
+                postings = self._postings.get(term)
+                if not postings:
+                    return set()
+                term_pages = {
+                    self._chunk_pages[postings[i]]
+                    for i in range(0, len(postings), 2)
+                    if self._live[postings[i]]
+                }
+                pages = term_pages if pages is None else pages & term_pages
+                if not pages:
+                    return set()
+        return pages or set()
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Approximate memory held by the index.
+
+        Counts the text, the page and chunk tables and the postings including
+        Python object overhead (array headers and spare capacity, dicts, term
+        strings), so it tracks what the process actually allocates.
+        """
+        with self._lock:
+            tables = sum(
+                sys.getsizeof(a)
+                for a in (
+                    self._page_starts, self._page_ends, self._chunk_pages,
+                    self._chunk_starts, self._chunk_ends, self._lengths, self._live,
+                )
+            )
+            pages = sys.getsizeof(self._page_slots) + sum(
+                sys.getsizeof(page) + sys.getsizeof(slot) for page, slot in self._page_slots.items()
+            )
+            postings = sys.getsizeof(self._postings) + sys.getsizeof(self._shared_terms) + sum(
+                sys.getsizeof(term) + sys.getsizeof(a) for term, a in self._postings.items()
+            )
+            return sys.getsizeof(self) + self._text.nbytes + tables + pages + postings
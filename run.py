@@ -1,57 +1,365 @@
 """
 Simple script to run the application.
 Run FastAPI backend and NiceGUI UI together.
+
+Usage:
+    python run.py          # development: single backend with --reload, plus UI
+    python run.py --prod   # production: supervised backend, no reload, plus UI
+    python run.py --prod --preload   # warm up once, then fork workers (copy-on-write)
 """
+import argparse
+import os
+import signal
+import socket
 import subprocess
 import sys
-import os
+import threading
+import time
+from typing import IO
+
+BACKEND_PORT = int(os.getenv("BACKEND_PORT", "8000"))
+GRACEFUL_TIMEOUT = int(os.getenv("GRACEFUL_TIMEOUT", "30"))  # seconds to drain in-flight streams
+HEALTH_CHECK_INTERVAL = 1.0  # seconds between child liveness checks
+MAX_RESTART_BACKOFF = 30.0  # seconds
+STABLE_UPTIME = 60.0  # seconds a child must stay up before its backoff resets
+# Documents, sessions, prefetched contexts and resumable stream logs live in
+# the backend's memory, so a second worker would not see another worker's
+# uploads. Keep one worker until that state moves out of the process.
+DEFAULT_WORKERS = 1
+
+
+def forward_output(stream: IO[str], prefix: str) -> None:
+    """
+    Forward a child's output line by line so its pipe never fills up.
+
+    Runs on a daemon thread per child; returns when the child closes the pipe.
+    """
+    for line in stream:
+        sys.stdout.write(f"[{prefix}] {line}")
+        sys.stdout.flush()
+    stream.close()
+
+
+class ChildProcess:
+    """A supervised child process with forwarded output."""
+
+    def __init__(self, name: str, args: list[str], pass_fds: tuple[int, ...] = ()) -> None:
+        """Describe a child; it is not started until start() is called."""
+        self.name = name
+        self.args = args
+        self.pass_fds = pass_fds
+        self.process: subprocess.Popen | None = None
+        self.restarts = 0
+        self.next_start = 0.0
+        self.started_at = 0.0
+
+    def start(self) -> None:
+        """Launch the child and start forwarding its output."""
+        self.launch()
+        self.forward()
+
+    def launch(self) -> None:
+        """Launch the child process without starting any thread."""
+        self.started_at = time.monotonic()
+        self.process = subprocess.Popen(
+            self.args,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            pass_fds=self.pass_fds,
+            text=True,
+            bufsize=1,
+        )
+
+    def forward(self) -> None:
+        """Start the thread forwarding the launched child's output."""
+        threading.Thread(
+            target=forward_output,
+            args=(self.process.stdout, self.name),
+            name=f"forward-{self.name}",
+            daemon=True,
+        ).start()
+
+    def is_running(self) -> bool:
+        """Whether the child is currently alive."""
+        return self.process is not None and self.process.poll() is None
+
+    def terminate(self) -> None:
+        """Ask the child to shut down gracefully."""
+        if self.is_running():
+            self.process.terminate()
+
+    def kill(self) -> None:
+        """Force the child to stop."""
+        if self.is_running():
+            self.process.kill()
+
+
+class ForkedProcess:
+    """Minimal Popen-compatible handle for a worker created with os.fork()."""
+
+    def __init__(self, pid: int, stdout: IO[str]) -> None:
+        """Wrap a forked child's pid and output pipe."""
+        self.pid = pid
+        self.stdout = stdout
+        self.returncode: int | None = None
+
+    def poll(self) -> int | None:
+        """Return the exit code if the child has exited, else None."""
+        if self.returncode is None:
+            pid, status = os.waitpid(self.pid, os.WNOHANG)
+            if pid:
+                self.returncode = os.waitstatus_to_exitcode(status)
+        return self.returncode
+
+    def wait(self, timeout: float | None = None) -> int:
+        """Wait for the child to exit."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.poll() is None:
+            if deadline is not None and time.monotonic() >= deadline:
+                raise subprocess.TimeoutExpired(str(self.pid), timeout)
+            time.sleep(0.05)
+        return self.returncode
+
+    def terminate(self) -> None:
+        """Send SIGTERM."""
+        os.kill(self.pid, signal.SIGTERM)
+
+    def kill(self) -> None:
+        """Send SIGKILL."""
+        os.kill(self.pid, signal.SIGKILL)
+
+
+def backend_worker_args(fd: int) -> list[str]:
+    """Command line of a backend worker serving on the inherited socket ``fd``."""
+    return [
+        sys.executable, "-m", "uvicorn", "backend.main:app",
+        "--fd", str(fd),
+        "--timeout-graceful-shutdown", str(GRACEFUL_TIMEOUT),
+    ]
+
+
+def serve_backend_worker(fd: int) -> None:
+    """Serve the (already imported) backend app on an inherited socket."""
+    import uvicorn
+    from backend.main import app
+
+    config = uvicorn.Config(app, fd=fd, timeout_graceful_shutdown=GRACEFUL_TIMEOUT)
+    uvicorn.Server(config).run()
+
+
+class ForkedChild(ChildProcess):
+    """
+    A backend worker forked from a warmed-up supervisor.
+
+    The child inherits the parent's imported modules and initialized state,
+    so start-up is near-instant and unchanged memory pages stay shared.
+
+    Forking is only safe while the supervisor has a single thread: a lock
+    held by another thread at fork time (such as stdout's, taken by an
+    output forwarder) stays held forever in the child. The supervisor
+    therefore forks every worker before any forwarder starts, and a worker
+    restarted later is re-executed from scratch instead.
+    """
+
+    def __init__(self, name: str, fd: int) -> None:
+        """Describe a forked worker serving on ``fd``."""
+        super().__init__(name, backend_worker_args(fd), pass_fds=(fd,))
+        self.fd = fd
+
+    def launch(self) -> None:
+        """Fork the worker (or re-execute it once threads exist), piping its output."""
+        if threading.active_count() > 1:
+            super().launch()
+            return
+        self.started_at = time.monotonic()
+        read_fd, write_fd = os.pipe()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 1
+            try:
+                os.close(read_fd)
+                os.dup2(write_fd, 1)
+                os.dup2(write_fd, 2)
+                os.close(write_fd)
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                serve_backend_worker(self.fd)
+                exit_code = 0
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(exit_code)
+        os.close(write_fd)
+        self.process = ForkedProcess(pid, os.fdopen(read_fd, "r", buffering=1))
+
+
+class Supervisor:
+    """
+    Keeps a set of children alive and shuts them down gracefully.
+
+    Crashed children are restarted with exponential backoff. On SIGTERM or
+    SIGINT every child receives SIGTERM and gets ``graceful_timeout`` seconds
+    to finish in-flight requests before being killed.
+    """
+
+    def __init__(
+        self,
+        children: list[ChildProcess],
+        graceful_timeout: float = GRACEFUL_TIMEOUT,
+        check_interval: float = HEALTH_CHECK_INTERVAL,
+    ) -> None:
+        """Create a supervisor for the given children."""
+        self.children = children
+        self.graceful_timeout = graceful_timeout
+        self.check_interval = check_interval
+        self.shutdown_event = threading.Event()
+
+    def request_shutdown(self, signum: int | None = None, frame: object = None) -> None:
+        """Signal handler: begin graceful shutdown."""
+        self.shutdown_event.set()
+
+    def check_children(self) -> None:
+        """Restart any child that has exited (respecting its backoff)."""
+        now = time.monotonic()
+        for child in self.children:
+            if child.is_running() or now < child.next_start:
+                continue
+            if child.process is not None:
+                if now - child.started_at > STABLE_UPTIME:
+                    child.restarts = 0
+                child.restarts += 1
+                backoff = min(MAX_RESTART_BACKOFF, 0.5 * 2 ** (child.restarts - 1))
+                print(
+                    f"[supervisor] {child.name} exited with code {child.process.returncode}; "
+                    f"restarting in {backoff:.1f}s"
+                )
+                child.process = None
+                child.next_start = now + backoff
+                continue
+            child.start()
+
+    def stop_children(self) -> None:
+        """Terminate all children, killing any that outlive the grace period."""
+        for child in self.children:
+            child.terminate()
+        deadline = time.monotonic() + self.graceful_timeout
+        for child in self.children:
+            if child.process is None:
+                continue
+            try:
+                child.process.wait(timeout=max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                print(f"[supervisor] {child.name} did not drain in time; killing")
+                child.kill()
+                child.process.wait()
+
+    def run(self) -> None:
+        """Start all children and supervise them until shutdown is requested."""
+        signal.signal(signal.SIGTERM, self.request_shutdown)
+        signal.signal(signal.SIGINT, self.request_shutdown)
+        try:
+            # Launch everything before the first forwarding thread, so forked
+            # workers are created while this process is still single-threaded
+            for child in self.children:
+                child.launch()
+            for child in self.children:
+                child.forward()
+            while not self.shutdown_event.wait(self.check_interval):
+                self.check_children()
+        finally:
+            print("\nShutting down...")
+            self.stop_children()
+
+
+def bind_backend_socket(host: str, port: int) -> socket.socket:
+    """Bind the listening socket shared by all backend workers."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def build_children(
+    host: str, workers: int, listen_sock: socket.socket | None = None, preload: bool = False
+) -> list[ChildProcess]:
+    """
+    Create the backend and UI child process definitions.
+
+    With a listening socket (production), ``workers`` backend processes share it
+    without the reloader; otherwise a single reloading backend is started.
+    With ``preload`` the workers are forked from this (warmed-up) process.
+    """
+    children: list[ChildProcess] = []
+    if listen_sock is not None and preload:
+        fd = listen_sock.fileno()
+        children.extend(ForkedChild(f"backend-{i}", fd) for i in range(workers))
+    elif listen_sock is not None:
+        # Workers accept on one inherited socket, so the kernel balances connections
+        fd = listen_sock.fileno()
+        for i in range(workers):
+            children.append(ChildProcess(f"backend-{i}", backend_worker_args(fd), pass_fds=(fd,)))
+    else:
+        children.append(ChildProcess(
+            "backend",
+            [
+                sys.executable, "-m", "uvicorn", "backend.main:app",
+                "--host", host, "--port", str(BACKEND_PORT), "--reload",
+            ],
+        ))
+    # Start NiceGUI directly (don't import, just run the file)
+    children.append(ChildProcess("ui", [sys.executable, "ui/app.py"]))
+    return children
+
 
 def main():
     """Run both FastAPI and NiceGUI."""
+    parser = argparse.ArgumentParser(description="Run the workingAgent backend and UI.")
+    parser.add_argument("--prod", action="store_true", help="multi-worker mode without reload")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="backend workers in --prod mode (default: 1; state is per process)")
+    parser.add_argument("--preload", action="store_true",
+                        help="with --prod, load the app once and fork workers from it")
+    parser.add_argument("--host", default=None,
+                        help="backend bind address (default: 127.0.0.1, or 0.0.0.0 with --prod)")
+    args = parser.parse_args()
+    host = args.host or ("0.0.0.0" if args.prod else "127.0.0.1")
+
     print("Starting workingAgent application...")
     print("=" * 50)
-    
+
     # Check if .env exists
     if not os.path.exists(".env"):
         print("⚠️  WARNING: .env file not found!")
         print("Please create .env file with your OPENAI_API_KEY")
         print("You can copy .env.example to .env and add your key")
-        response = input("Continue anyway? (y/n): ")
-        if response.lower() != 'y':
-            sys.exit(1)
-    
-    print("\n1. Starting FastAPI backend on http://localhost:8000")
+        if sys.stdin.isatty():
+            response = input("Continue anyway? (y/n): ")
+            if response.lower() != 'y':
+                sys.exit(1)
+
+    if args.prod and args.workers > 1:
+        print(f"⚠️  WARNING: {args.workers} workers do not share uploaded documents or sessions;")
+        print("requests for one conversation may reach a worker that has never seen its PDF")
+    workers = f"{args.workers} workers, no reload" if args.prod else "reload enabled"
+    print(f"\n1. Starting FastAPI backend on http://{host}:{BACKEND_PORT} ({workers})")
     print("2. Starting NiceGUI UI on http://localhost:8080")
     print("\nPress Ctrl+C to stop both servers")
     print("=" * 50)
-    
-    # Start FastAPI in background
-    fastapi_process = subprocess.Popen(
-        [sys.executable, "-m", "uvicorn", "backend.main:app", "--reload"],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-    )
-    
-    # Start NiceGUI directly (don't import, just run the file)
-    try:
-        import subprocess as sp
-        ui_process = sp.Popen(
-            [sys.executable, "ui/app.py"],
-            stdout=sp.PIPE,
-            stderr=sp.PIPE,
-        )
-        # Wait for UI process
-        ui_process.wait()
-    except KeyboardInterrupt:
-        print("\nShutting down...")
-    finally:
-        fastapi_process.terminate()
-        fastapi_process.wait()
-        if 'ui_process' in locals():
-            ui_process.terminate()
-            ui_process.wait()
+
+    listen_sock = bind_backend_socket(host, BACKEND_PORT) if args.prod else None
+    preload = args.prod and args.preload
+    if preload:
+        from backend.startup import warm_up
+
+        started = time.perf_counter()
+        warm_up()
+        print(f"Warm-up complete in {time.perf_counter() - started:.2f}s; forking workers")
+    Supervisor(build_children(host, args.workers, listen_sock, preload)).run()
 
 
 if __name__ == "__main__":
     main()
-
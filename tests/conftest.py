@@ -0,0 +1,130 @@
+"""
+Shared test fixtures.
+"""
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+def build_pdf(pages: list[str], title: str | None = None, author: str | None = None) -> bytes:
+    """
+    Build a minimal, valid PDF with one text page per entry.
+
+    Lines in each page string become separate text lines on the page.
+    """
+    objects: list[bytes] = []
+    page_ids = [4 + 2 * i for i in range(len(pages))]
+    kids = " ".join(f"{pid} 0 R" for pid in page_ids)
+    objects.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>".encode())
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    for i, text in enumerate(pages):
+        lines = []
+        for line in text.split("\n"):
+            escaped = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            lines.append(f"({escaped}) Tj T*")
+        stream = f"BT /F1 10 Tf 12 TL 50 750 Td {' '.join(lines)} ET".encode("latin-1")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {page_ids[i] + 1} 0 R >>".encode()
+        )
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+
+    info_id = None
+    if title or author:
+        fields = ""
+        if title:
+            fields += f" /Title ({title})"
+        if author:
+            fields += f" /Author ({author})"
+        objects.append(f"<<{fields} >>".encode())
+        info_id = len(objects)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref_at = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode()
+    trailer = f"<< /Size {len(objects) + 1} /Root 1 0 R"
+    if info_id:
+        trailer += f" /Info {info_id} 0 R"
+    out += f"trailer\n{trailer} >>\nstartxref\n{xref_at}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+@pytest.fixture
+def make_pdf():
+    """Factory fixture returning PDF bytes for a list of page texts."""
+    return build_pdf
+
+
+@dataclass
+class FakeOpenAIEndpoint:
+    """A local OpenAI-compatible chat endpoint that streams a fixed answer."""
+    base_url: str
+    requests: list[dict] = field(default_factory=list)
+
+
+def serve_fake_openai(answer: str, first_token_delay: float = 0.0, token_delay: float = 0.0):
+    """
+    Start an OpenAI-compatible streaming chat server on a free local port.
+
+    Returns:
+        Tuple of (endpoint, server)
+    """
+    endpoint = FakeOpenAIEndpoint(base_url="")
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            endpoint.requests.append(json.loads(body or b"{}"))
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            time.sleep(first_token_delay)
+            try:
+                for word in answer.split():
+                    chunk = {
+                        "id": "fake", "object": "chat.completion.chunk", "created": 0, "model": "fake",
+                        "choices": [{"index": 0, "delta": {"role": "assistant", "content": word + " "},
+                                     "finish_reason": None}],
+                    }
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.flush()
+                    time.sleep(token_delay)
+                self.wfile.write(b"data: [DONE]\n\n")
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    endpoint.base_url = f"http://127.0.0.1:{server.server_port}/v1"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return endpoint, server
+
+
+@pytest.fixture
+def fake_openai():
+    """Factory fixture starting local fake OpenAI endpoints, shut down after the test."""
+    servers = []
+
+    def start(answer: str, first_token_delay: float = 0.0, token_delay: float = 0.0) -> FakeOpenAIEndpoint:
+        endpoint, server = serve_fake_openai(answer, first_token_delay, token_delay)
+        servers.append(server)
+        return endpoint
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -139,3 +139,447 @@ def test_upload_parse_query_answer_flow(client):
     # Cleanup: Remove PDF
     client.delete("/pdf/remove")
 
+
+
+def test_response_carries_trace_id(client):
+    """Test every HTTP response exposes the request trace ID."""
+    response = client.get("/health")
+    assert response.status_code == 200
+    assert len(response.headers["x-trace-id"]) == 32
+
+
+def test_background_upload_reports_progress(client, make_pdf):
+    """Test background ingestion returns early and finishes with all pages searchable."""
+    import time
+
+    pages = [f"Page {i} discusses topic{i} in detail." for i in range(1, 31)]
+    response = client.post(
+        "/upload",
+        params={"session_id": "bg-test", "background": "true"},
+        files={"file": ("big.pdf", make_pdf(pages), "application/pdf")},
+    )
+    assert response.status_code == 200
+    assert response.json()["metadata"]["pages"] == 30
+
+    for _ in range(100):
+        progress = client.get("/pdf/progress", params={"session_id": "bg-test"}).json()
+        if progress["done"]:
+            break
+        time.sleep(0.05)
+    assert progress["done"]
+    assert progress["pages_indexed"] == 30
+    assert progress["error"] is None
+
+    client.delete("/pdf/remove", params={"session_id": "bg-test"})
+    assert client.get("/pdf/progress", params={"session_id": "bg-test"}).status_code == 404
+
+
+def test_lazy_upload_serves_page_ranges(client, make_pdf):
+    """Test lazy uploads return immediately and extract requested pages on demand."""
+    pages = [f"Lazy page {i} mentions item{i}." for i in range(1, 11)]
+    response = client.post(
+        "/upload",
+        params={"session_id": "lazy-test", "lazy": "true"},
+        files={"file": ("big.pdf", make_pdf(pages), "application/pdf")},
+    )
+    assert response.status_code == 200
+    assert response.json()["metadata"]["pages"] == 10
+
+    response = client.get("/pdf/pages", params={"session_id": "lazy-test", "start": 4, "end": 5})
+    assert response.status_code == 200
+    data = response.json()["pages"]
+    assert [p["page"] for p in data] == [4, 5]
+    assert "item4" in data[0]["text"]
+
+    response = client.get("/pdf/pages", params={"session_id": "lazy-test", "start": 5, "end": 2})
+    assert response.status_code == 400
+
+    client.delete("/pdf/remove", params={"session_id": "lazy-test"})
+
+
+def test_stream_extracts_lazy_pages_off_the_event_loop(client, make_pdf, monkeypatch):
+    """Test /stream context assembly for lazy uploads never extracts pages on the loop thread."""
+    import asyncio
+    from types import SimpleNamespace
+
+    import backend.main
+    from backend.storage import StoredDocument
+
+    class FakeAgent:
+        async def arun(self, prompt, stream=False, session_id=None):
+            yield SimpleNamespace(content="answer")
+
+    monkeypatch.setattr(backend.main, "create_agent", lambda route=None: FakeAgent())
+
+    on_loop = []
+    page_text = StoredDocument.page_text
+
+    def recording_page_text(self, page):
+        try:
+            asyncio.get_running_loop()
+            on_loop.append(page)
+        except RuntimeError:
+            pass
+        return page_text(self, page)
+
+    monkeypatch.setattr(StoredDocument, "page_text", recording_page_text)
+
+    pages = [f"Page {i} covers topic{i}." for i in range(1, 5)]
+    client.post(
+        "/upload",
+        params={"session_id": "lazy-stream-test", "lazy": "true"},
+        files={"file": ("doc.pdf", make_pdf(pages), "application/pdf")},
+    )
+    for message in ("What does page 3 say?", "Summarise the opening"):
+        response = client.post("/stream", json={"message": message, "session_id": "lazy-stream-test"})
+        assert response.text == "answer"
+    assert on_loop == []
+
+    client.delete("/pdf/remove", params={"session_id": "lazy-stream-test"})
+
+
+def test_batch_answers_questions_concurrently(client, make_pdf, monkeypatch):
+    """Test /batch streams one tagged result per question, reporting partial failures."""
+    import json
+    import threading
+    import time
+    from types import SimpleNamespace
+
+    import backend.main
+
+    in_flight = 0
+    peak = 0
+    threads = set()
+    lock = threading.Lock()
+
+    class FakeAgent:
+        def run(self, prompt):
+            nonlocal in_flight, peak
+            threads.add(threading.current_thread().name)
+            if "explode" in prompt:
+                raise RuntimeError("upstream failure")
+            with lock:
+                in_flight += 1
+                peak = max(peak, in_flight)
+            time.sleep(0.05)
+            with lock:
+                in_flight -= 1
+            return SimpleNamespace(content=f"answer with {len(prompt)} chars of prompt")
+
+    monkeypatch.setattr(backend.main, "create_agent", lambda route=None: FakeAgent())
+
+    pages = [f"Clause {i}: the deadline for item{i} is day {i}." for i in range(1, 6)]
+    client.post(
+        "/upload",
+        params={"session_id": "batch-test"},
+        files={"file": ("contract.pdf", make_pdf(pages), "application/pdf")},
+    )
+
+    questions = [f"What is the deadline for item{i}?" for i in range(1, 11)] + ["explode", " "]
+    response = client.post(
+        "/batch",
+        json={"questions": questions, "session_id": "batch-test", "concurrency": 4},
+    )
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    results, summary = lines[:-1], lines[-1]
+
+    assert sorted(r["index"] for r in results) == list(range(len(questions)))
+    errors = {r["index"]: r["error"] for r in results if r["error"]}
+    assert set(errors) == {10, 11}
+    assert "upstream failure" in errors[10]
+    assert summary == {"done": True, "total": 12, "succeeded": 10, "failed": 2}
+    assert 1 < peak <= 4
+    # Completions run on their own bounded pool, not the shared threadpool
+    assert all(name.startswith("completion") for name in threads)
+
+    client.delete("/pdf/remove", params={"session_id": "batch-test"})
+
+
+def test_batch_requires_document(client):
+    """Test /batch rejects sessions without a PDF."""
+    response = client.post("/batch", json={"questions": ["q"], "session_id": "no-such-session"})
+    assert response.status_code == 400
+
+
+def test_stream_deadline_reports_timeout_and_metrics(client, monkeypatch):
+    """Test a slow upstream hits the TTFT deadline and is counted in /metrics."""
+    import asyncio
+    from types import SimpleNamespace
+
+    import backend.main
+
+    class SlowAgent:
+        async def arun(self, prompt, stream=False, session_id=None):
+            await asyncio.sleep(0.5)
+            yield SimpleNamespace(content="too late")
+
+    monkeypatch.setattr(backend.main, "create_agent", lambda route=None: SlowAgent())
+
+    before = client.get("/metrics").json()["counters"].get("stream.deadline_exceeded.ttft", 0)
+    response = client.post("/stream", json={"message": "Hello", "ttft_timeout": 0.1})
+    assert response.status_code == 200
+    assert "Timed out after 0.1s waiting for the first token" in response.text
+    assert "too late" not in response.text
+
+    after = client.get("/metrics").json()["counters"]["stream.deadline_exceeded.ttft"]
+    assert after == before + 1
+
+
+def test_map_phase_counts_against_total_not_ttft_budget(client, make_pdf, monkeypatch):
+    """Test the first-token deadline starts at the upstream call, after the map phase."""
+    import time
+    from types import SimpleNamespace
+
+    import backend.main
+    from agent.mapreduce import map_cache
+
+    class MapAgent:
+        def run(self, prompt):
+            time.sleep(0.3)  # slow map call
+            return SimpleNamespace(content="section notes")
+
+        async def arun(self, prompt, stream=False, session_id=None):
+            yield SimpleNamespace(content="the summary")
+
+    monkeypatch.setattr(backend.main, "create_agent", lambda route=None: MapAgent())
+    client.post(
+        "/upload",
+        params={"session_id": "map-deadline"},
+        files={"file": ("doc.pdf", make_pdf(["Some section text."]), "application/pdf")},
+    )
+    request = {"message": "Summarize this document", "session_id": "map-deadline", "mode": "map_reduce"}
+    try:
+        map_cache.clear()
+        response = client.post("/stream", json={**request, "ttft_timeout": 0.2})
+        assert response.text == "the summary"
+
+        map_cache.clear()
+        response = client.post("/stream", json={**request, "total_timeout": 0.1})
+        assert "Timed out after 0.1s waiting for the full response" in response.text
+    finally:
+        map_cache.clear()
+        client.delete("/pdf/remove", params={"session_id": "map-deadline"})
+
+
+def _route_to_fake_endpoints(monkeypatch, primary, backup):
+    """Point routing at a primary and a hedge endpoint, hedging after 0.2s."""
+    import json
+
+    import agent.routing
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setenv("AGNO_TELEMETRY", "false")
+    monkeypatch.setenv("MODEL_ROUTES", json.dumps([{"model": "primary-model", "base_url": primary.base_url}]))
+    monkeypatch.setenv("HEDGE_MODEL", "backup-model")
+    monkeypatch.setenv("HEDGE_BASE_URL", backup.base_url)
+    monkeypatch.setattr(agent.routing, "HEDGE_DELAY", 0.2)
+    monkeypatch.setattr(agent.routing, "HEDGE_MIN_SAMPLES", 10**9)
+
+
+def test_stream_hedges_slow_primary_endpoint(client, fake_openai, monkeypatch):
+    """Test a slow primary endpoint is hedged and the faster backup's answer streams."""
+    primary = fake_openai("slow primary answer", first_token_delay=1.5)
+    backup = fake_openai("fast backup answer", first_token_delay=0.05)
+    _route_to_fake_endpoints(monkeypatch, primary, backup)
+
+    response = client.post("/stream", json={"message": "Hello", "session_id": "hedge-test"})
+    assert response.status_code == 200
+    assert response.text.strip() == "fast backup answer"
+    assert primary.requests[0]["model"] == "primary-model"
+    assert backup.requests[0]["model"] == "backup-model"
+
+
+def test_stream_fast_primary_is_not_hedged(client, fake_openai, monkeypatch):
+    """Test a primary that answers within the hedge threshold never contacts the backup."""
+    primary = fake_openai("quick primary answer")
+    backup = fake_openai("unused backup answer")
+    _route_to_fake_endpoints(monkeypatch, primary, backup)
+
+    response = client.post("/stream", json={"message": "Hello", "session_id": "hedge-test"})
+    assert response.text.strip() == "quick primary answer"
+    assert len(primary.requests) == 1
+    assert backup.requests == []
+
+
+def test_upload_strips_repeated_headers(client, make_pdf):
+    """Test uploaded pages are stored without running headers and report the characters saved."""
+    words = ["apples", "pears", "plums", "grapes", "melons", "cherries"]
+    pages = [
+        f"Northwind Supply Agreement\nThe buyer orders {word} weekly.\nDelivery is at the main dock.\nPage {n}"
+        for n, word in enumerate(words, start=1)
+    ]
+    response = client.post(
+        "/upload",
+        params={"session_id": "normalize-test"},
+        files={"file": ("supply.pdf", make_pdf(pages), "application/pdf")},
+    )
+    assert response.status_code == 200
+    assert response.json()["metadata"]["chars_saved"] > 0
+
+    text = client.get("/pdf/pages", params={"start": 1, "end": 6, "session_id": "normalize-test"}).text
+    assert "Northwind Supply Agreement" not in text
+    assert "The buyer orders plums weekly." in text
+
+    client.delete("/pdf/remove", params={"session_id": "normalize-test"})
+
+
+def test_identical_uploads_share_one_document(client, make_pdf):
+    """Test sessions uploading the same PDF share storage until the last one removes it."""
+    pdf = make_pdf(["Onboarding handbook: badges are collected at reception."] * 3)
+    sessions = [f"dedup-{i}" for i in range(3)]
+    for session in sessions:
+        response = client.post(
+            "/upload",
+            params={"session_id": session},
+            files={"file": ("handbook.pdf", pdf, "application/pdf")},
+        )
+        assert response.status_code == 200
+    assert "sharing" in response.json()["message"]
+
+    document_bytes = client.get("/pdf/progress", params={"session_id": "dedup-0"}).json()["memory_bytes"]
+    before_removal = client.get("/pdf/storage").json()["memory_saved_bytes"]
+    assert before_removal >= 2 * document_bytes > 0
+
+    client.delete("/pdf/remove", params={"session_id": "dedup-0"})
+    client.delete("/pdf/remove", params={"session_id": "dedup-1"})
+    info = client.get("/pdf/info", params={"session_id": "dedup-2"}).json()
+    assert info["has_pdf"] is True
+
+    client.delete("/pdf/remove", params={"session_id": "dedup-2"})
+    assert client.get("/pdf/storage").json()["memory_saved_bytes"] == before_removal - 2 * document_bytes
+
+
+def test_revised_upload_reindexes_only_changed_pages(client, make_pdf):
+    """Test uploading v2 of a session's PDF reports and re-indexes only the changed pages."""
+    pages = [f"Section {n}: the {word} requirements." for n, word in
+             enumerate(["network", "storage", "latency", "backup", "audit", "billing"], start=1)]
+    client.post(
+        "/upload",
+        params={"session_id": "revision-test"},
+        files={"file": ("spec.pdf", make_pdf(pages), "application/pdf")},
+    )
+
+    pages[2] = "Section 3: the revised latency budget is fifty milliseconds."
+    response = client.post(
+        "/upload",
+        params={"session_id": "revision-test"},
+        files={"file": ("spec-v2.pdf", make_pdf(pages), "application/pdf")},
+    )
+    assert response.status_code == 200
+    assert response.json()["changed_pages"] == [3]
+
+    text = client.get("/pdf/pages", params={"start": 1, "end": 6, "session_id": "revision-test"}).text
+    assert "fifty milliseconds" in text
+    assert "the latency requirements" not in text
+    assert "the audit requirements" in text
+
+    client.delete("/pdf/remove", params={"session_id": "revision-test"})
+
+
+def test_prefetch_hint_is_reused_by_stream(make_pdf, monkeypatch):
+    """Test /stream reuses the context prepared from a typing hint."""
+    from types import SimpleNamespace
+
+    import backend.main
+
+    prompts = []
+
+    class EchoAgent:
+        async def arun(self, prompt, stream=False, session_id=None):
+            prompts.append(prompt)
+            yield SimpleNamespace(content="ok")
+
+    monkeypatch.setattr(backend.main, "create_agent", lambda route=None: EchoAgent())
+
+    # One client context keeps a single event loop across requests, as in a server
+    with TestClient(app) as client:
+        pages = ["Payment terms: invoices are due within thirty days.", "Warranty lasts two years."]
+        client.post(
+            "/upload",
+            params={"session_id": "prefetch-test"},
+            files={"file": ("terms.pdf", make_pdf(pages), "application/pdf")},
+        )
+        counters = client.get("/metrics").json()["counters"]
+        hits, misses = counters.get("prefetch.hits", 0), counters.get("prefetch.misses", 0)
+
+        assert client.post("/prefetch", json={"partial": "when are invoices due", "session_id": "prefetch-test"}).json() == {
+            "prefetched": True
+        }
+        client.post("/stream", json={"message": "When are invoices due?", "session_id": "prefetch-test"})
+        client.post("/stream", json={"message": "How long is the warranty?", "session_id": "prefetch-test"})
+
+        counters = client.get("/metrics").json()["counters"]
+        assert counters["prefetch.hits"] == hits + 1
+        assert counters["prefetch.misses"] == misses + 1
+        assert "thirty days" in prompts[0]
+        assert "two years" in prompts[1]
+
+        client.delete("/pdf/remove", params={"session_id": "prefetch-test"})
+
+
+def test_stream_can_be_resumed_from_an_offset(monkeypatch):
+    """Test /stream answers carry a stream ID that replays the answer without a new completion."""
+    from types import SimpleNamespace
+
+    import backend.main
+
+    runs = []
+
+    class CountingAgent:
+        async def arun(self, prompt, stream=False, session_id=None):
+            runs.append(prompt)
+            for word in ("alpha ", "beta ", "gamma"):
+                yield SimpleNamespace(content=word)
+
+    monkeypatch.setattr(backend.main, "create_agent", lambda route=None: CountingAgent())
+
+    with TestClient(app) as client:
+        response = client.post("/stream", json={"message": "Hello"})
+        assert response.text == "alpha beta gamma"
+        stream_id = response.headers["X-Stream-Id"]
+
+        resumed = client.get("/stream/resume", params={"stream_id": stream_id, "offset": 8})
+        assert resumed.status_code == 200
+        assert resumed.text == "ta gamma"
+        assert len(runs) == 1
+
+        assert client.get("/stream/resume", params={"stream_id": stream_id, "offset": 99}).status_code == 400
+        assert client.get("/stream/resume", params={"stream_id": "unknown"}).status_code == 404
+
+
+def test_fast_path_answers_without_the_model(client, make_pdf, monkeypatch):
+    """Test metadata and lookup questions are answered locally and others reach the agent."""
+    from types import SimpleNamespace
+
+    import backend.main
+
+    class RecordingAgent:
+        prompts = []
+
+        async def arun(self, prompt, stream=False, session_id=None):
+            self.prompts.append(prompt)
+            yield SimpleNamespace(content="model answer")
+
+    monkeypatch.setattr(backend.main, "create_agent", lambda route=None: RecordingAgent())
+
+    pdf = make_pdf(["Scope of work.", "Clause 14.2: fees are fixed.", "Signatures."], author="Jane Roe")
+    client.post(
+        "/upload",
+        params={"session_id": "fastpath-test"},
+        files={"file": ("contract.pdf", pdf, "application/pdf")},
+    )
+
+    def ask(message):
+        return client.post("/stream", json={"message": message, "session_id": "fastpath-test"}).text
+
+    assert ask("How many pages is this document?") == "The document has 3 pages."
+    assert ask("Who is the author?") == "The author is Jane Roe."
+    assert ask("Which page mentions clause 14.2?") == '"clause 14.2" appears on page 2.'
+    assert RecordingAgent.prompts == []
+
+    assert ask("Which page mentions the warranty?") == "model answer"
+    assert len(RecordingAgent.prompts) == 1
+    assert client.get("/metrics").json()["counters"]["fastpath.lookup"] >= 1
+
+    client.delete("/pdf/remove", params={"session_id": "fastpath-test"})
@@ -0,0 +1,158 @@
+"""
+Integration tests for the multiplexed WebSocket chat endpoint.
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+import backend.main
+from backend.main import app
+
+
+class WordAgent:
+    """Fake agent streaming the words of a canned answer chosen by the prompt."""
+
+    answers = {
+        "fast": "one two three",
+        "long": "a b c d e f",
+        "slow": "never finishes",
+    }
+
+    async def arun(self, prompt, stream=False, session_id=None):
+        key = next(k for k in self.answers if prompt.endswith(k))
+        for word in self.answers[key].split():
+            if key == "slow":
+                await asyncio.sleep(0.2)
+            yield SimpleNamespace(content=word + " ")
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Test client whose agent streams canned answers."""
+    monkeypatch.setattr(backend.main, "create_agent", lambda route=None: WordAgent())
+    return TestClient(app)
+
+
+def receive_until_end(ws, stream_id):
+    """Collect frames until the given stream ends; returns (text by stream, end frame)."""
+    texts: dict[str, str] = {}
+    while True:
+        frame = ws.receive_json()
+        if frame["type"] == "chunk":
+            texts[frame["stream_id"]] = texts.get(frame["stream_id"], "") + frame["text"]
+        elif frame["type"] == "end" and frame["stream_id"] == stream_id:
+            return texts, frame
+
+
+def test_concurrent_streams_are_tagged(client):
+    """Test two questions stream concurrently over one connection, tagged by stream ID."""
+    with client.websocket_connect("/ws?session_id=ws-none") as ws:
+        ws.send_json({"type": "ask", "stream_id": "a", "message": "long"})
+        ws.send_json({"type": "ask", "stream_id": "b", "message": "fast"})
+        ended = {}
+        texts: dict[str, str] = {}
+        while len(ended) < 2:
+            frame = ws.receive_json()
+            if frame["type"] == "chunk":
+                texts[frame["stream_id"]] = texts.get(frame["stream_id"], "") + frame["text"]
+            elif frame["type"] == "end":
+                ended[frame["stream_id"]] = frame["reason"]
+    assert texts == {"a": "a b c d e f ", "b": "one two three "}
+    assert ended == {"a": "done", "b": "done"}
+
+
+def test_stream_can_be_cancelled(client):
+    """Test cancelling one stream ends it without closing the connection."""
+    with client.websocket_connect("/ws?session_id=ws-none") as ws:
+        ws.send_json({"type": "ask", "stream_id": "s", "message": "slow"})
+        ws.send_json({"type": "cancel", "stream_id": "s"})
+        _, end = receive_until_end(ws, "s")
+        assert end["reason"] == "cancelled"
+
+        ws.send_json({"type": "ask", "stream_id": "s", "message": "fast"})
+        texts, end = receive_until_end(ws, "s")
+        assert end["reason"] == "done"
+        assert texts["s"] == "one two three "
+
+
+def test_credits_pause_a_stream(client):
+    """Test a stream without credits waits while other streams proceed."""
+    with client.websocket_connect("/ws?session_id=ws-none") as ws:
+        ws.send_json({"type": "ask", "stream_id": "paused", "message": "long", "credits": 2})
+        assert ws.receive_json()["type"] == "start"
+        first = [ws.receive_json() for _ in range(2)]
+        assert [f["text"] for f in first] == ["a ", "b "]
+
+        # The paused stream sends nothing more until credits arrive
+        ws.send_json({"type": "ask", "stream_id": "other", "message": "fast"})
+        texts, _ = receive_until_end(ws, "other")
+        assert texts == {"other": "one two three "}
+
+        ws.send_json({"type": "credit", "stream_id": "paused", "credits": 10})
+        texts, end = receive_until_end(ws, "paused")
+        assert texts == {"paused": "c d e f "}
+        assert end["reason"] == "done"
+
+
+def test_invalid_frames_report_errors(client):
+    """Test malformed frames get error frames and leave the connection usable."""
+    with client.websocket_connect("/ws?session_id=ws-none") as ws:
+        ws.send_text("not json")
+        assert ws.receive_json()["type"] == "error"
+        ws.send_json({"type": "ask", "stream_id": "x", "message": "  "})
+        assert ws.receive_json() == {"type": "error", "stream_id": "x", "error": "Message cannot be empty"}
+
+
+def test_ingestion_progress_is_pushed(client, make_pdf):
+    """Test the session's ingestion progress is pushed on connect."""
+    client.post(
+        "/upload",
+        params={"session_id": "ws-progress"},
+        files={"file": ("doc.pdf", make_pdf(["Page one text.", "Page two text."]), "application/pdf")},
+    )
+    with client.websocket_connect("/ws?session_id=ws-progress") as ws:
+        frame = ws.receive_json()
+    assert frame["type"] == "progress"
+    assert frame["session_id"] == "ws-progress"
+    assert frame["progress"]["done"] is True
+    assert frame["progress"]["pages_total"] == 2
+    client.delete("/pdf/remove", params={"session_id": "ws-progress"})
+
+
+def test_dropped_connection_resumes_without_new_completion(monkeypatch):
+    """Test an answer interrupted by a dropped socket is resumed on a new connection."""
+    runs = []
+
+    class CountingAgent(WordAgent):
+        async def arun(self, prompt, stream=False, session_id=None):
+            runs.append(prompt)
+            async for event in super().arun(prompt, stream, session_id):
+                yield event
+
+    monkeypatch.setattr(backend.main, "create_agent", lambda route=None: CountingAgent())
+
+    # One client context keeps the event loop (and the generation) alive between sockets
+    with TestClient(app) as client:
+        with client.websocket_connect("/ws?session_id=ws-none") as ws:
+            ws.send_json({"type": "ask", "stream_id": "q1", "message": "slow"})
+            start = ws.receive_json()
+            assert start["type"] == "start"
+            first = ws.receive_json()
+        assert first == {"type": "chunk", "stream_id": "q1", "text": "never "}
+
+        with client.websocket_connect("/ws?session_id=ws-none") as ws:
+            ws.send_json({
+                "type": "resume",
+                "stream_id": "q1",
+                "resume_id": start["resume_id"],
+                "offset": len(first["text"]),
+            })
+            texts, end = receive_until_end(ws, "q1")
+            assert texts == {"q1": "finishes "}
+            assert end["reason"] == "done"
+
+            ws.send_json({"type": "resume", "stream_id": "q2", "resume_id": "unknown"})
+            assert ws.receive_json()["error"] == "Unknown or expired stream"
+    assert len(runs) == 1
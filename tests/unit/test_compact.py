@@ -0,0 +1,65 @@
+"""
+Unit tests for compressed text storage.
+"""
+import random
+import sys
+import tracemalloc
+
+from retrieval.compact import BLOCK_CHARS, CompressedText
+from retrieval.index import DocumentIndex, split_chunks
+
+
+def test_slices_round_trip_across_blocks_and_seal():
+    """Test any character range reads back exactly, before and after sealing."""
+    rng = random.Random(0)
+    store = CompressedText()
+    reference = ""
+    for _ in range(120):
+        text = "".join(rng.choice("abc déf\n€") for _ in range(rng.randint(0, 800)))
+        assert store.append(text) == (len(reference), len(reference) + len(text))
+        reference += text
+        if rng.random() < 0.1:
+            store.seal()
+
+    assert len(reference) > 2 * BLOCK_CHARS
+    for _ in range(500):
+        start = rng.randint(0, len(reference))
+        end = rng.randint(start, len(reference))
+        assert store.slice(start, end) == reference[start:end]
+
+
+def test_index_text_is_much_smaller_than_str_pages_and_chunks():
+    """Test stored document text uses several-fold less memory than str copies."""
+    rng = random.Random(1)
+    words = ["contract", "party", "shall", "notice", "clause", "payment", "€", "agreement"]
+    pages = [" ".join(rng.choice(words) for _ in range(600)) for _ in range(50)]
+
+    index = DocumentIndex()
+    str_bytes = 0
+    for number, text in enumerate(pages, start=1):
+        index.add_page(number, text)
+        str_bytes += sys.getsizeof(text) + sum(sys.getsizeof(c) for c in split_chunks(text))
+    index.seal()
+
+    assert index._text.nbytes * 4 < str_bytes
+    assert index.page_text(7) == pages[6]
+    assert index.search("notice clause", k=1)[0].page in range(1, 51)
+
+
+def test_index_nbytes_tracks_allocated_memory():
+    """Test the reported index size includes container overhead, close to what is allocated."""
+    rng = random.Random(2)
+    words = ["".join(rng.choice("abcdefghij") for _ in range(rng.randint(3, 9))) for _ in range(3000)]
+    pages = [" ".join(rng.choice(words) for _ in range(300)) for _ in range(100)]
+
+    tracemalloc.start()
+    try:
+        index = DocumentIndex()
+        for number, text in enumerate(pages, start=1):
+            index.add_page(number, text)
+        index.seal()
+        allocated, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert 0.9 * allocated < index.nbytes < 1.1 * allocated
@@ -0,0 +1,84 @@
+"""
+Unit tests for the local question fast path.
+"""
+import pytest
+
+from agent.fastpath import answer_locally, lookup_phrase
+from parsing.pdf_parser import PDFMetadata
+
+
+METADATA = PDFMetadata(title="Master Services Agreement", author="Jane Roe", pages=12)
+
+
+def no_lookup(phrase):
+    """Phrase finder for tests that must not look anything up."""
+    raise AssertionError(f"unexpected lookup of {phrase!r}")
+
+
+@pytest.mark.parametrize("question", [
+    "How many pages is this document?",
+    "how many pages does the document have",
+    "How many pages are in this PDF?",
+    "What's the page count?",
+    "number of pages",
+])
+def test_page_count_questions(question):
+    """Test page-count phrasings are answered from metadata."""
+    answer = answer_locally(question, METADATA, no_lookup)
+    assert answer.intent == "page_count"
+    assert answer.text == "The document has 12 pages."
+
+
+def test_author_and_title_questions():
+    """Test author and title questions are answered from metadata."""
+    assert answer_locally("Who is the author?", METADATA, no_lookup).text == "The author is Jane Roe."
+    assert answer_locally("who wrote this document", METADATA, no_lookup).intent == "author"
+    assert answer_locally("What is the title of the contract?", METADATA, no_lookup).text == (
+        'The title is "Master Services Agreement".'
+    )
+
+
+def test_missing_metadata_falls_through():
+    """Test questions the metadata cannot answer go to the model."""
+    anonymous = PDFMetadata(pages=3)
+    assert answer_locally("Who is the author?", anonymous, no_lookup) is None
+    assert answer_locally("What's the title?", anonymous, no_lookup) is None
+
+
+@pytest.mark.parametrize("question", [
+    "How many pages discuss termination?",
+    "Who is the author of clause 4?",
+    "Summarize the page count section",
+    "What are the payment terms?",
+    "How long is the contract?",
+    "How long is it?",
+    "How many pages is this?",
+    "How many pages is that?",
+    "How many pages does it have?",
+    "What is the number of pages in it?",
+])
+def test_other_questions_fall_through(question):
+    """Test questions that only resemble an intent are not answered locally."""
+    assert answer_locally(question, METADATA, lambda phrase: None) is None
+
+
+@pytest.mark.parametrize("question, phrase", [
+    ("Which page mentions clause 14.2?", "clause 14.2"),
+    ("On which pages is the termination fee mentioned?", "termination fee"),
+    ("where does the contract mention 'Force Majeure'", "Force Majeure"),
+    ("What page contains the indemnity cap in this document?", "indemnity cap"),
+])
+def test_lookup_phrase_extraction(question, phrase):
+    """Test the phrase is extracted from lookup questions."""
+    assert lookup_phrase(question) == phrase
+
+
+def test_lookup_answers_only_found_phrases():
+    """Test lookups answer with the pages found and fall through when nothing is found."""
+    pages = {"clause 14.2": [3, 7, 9]}
+    find = lambda phrase: pages.get(phrase)  # noqa: E731
+    answer = answer_locally("Which page mentions clause 14.2?", METADATA, find)
+    assert answer.intent == "lookup"
+    assert answer.text == '"clause 14.2" appears on pages 3, 7 and 9.'
+    assert answer_locally("Which page mentions clause 99?", METADATA, find) is None
+    assert lookup_phrase("Which page mentions " + "word " * 20) is None
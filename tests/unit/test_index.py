@@ -0,0 +1,106 @@
+"""
+Unit tests for the retrieval index.
+"""
+from retrieval.index import DocumentIndex, split_chunks, tokenize
+
+
+def test_tokenize_lowercases_and_drops_single_chars():
+    """Test tokenizer normalizes case and skips one-letter tokens."""
+    assert tokenize("The Quick, brown fox: a test") == ["the", "quick", "brown", "fox", "test"]
+
+
+def test_split_chunks_overlaps_and_covers_text():
+    """Test long text is split into overlapping chunks within the size limit."""
+    text = " ".join(f"word{i}" for i in range(500))
+    chunks = split_chunks(text, size=200, overlap=50)
+    assert len(chunks) > 1
+    assert all(len(c) <= 200 for c in chunks)
+    assert chunks[0].split()[0] == "word0"
+    assert chunks[-1].split()[-1] == "word499"
+
+
+def test_search_ranks_matching_chunks_first():
+    """Test BM25 search returns the page that mentions the query terms."""
+    index = DocumentIndex()
+    index.add_page(1, "Introduction to the payment schedule and general terms.")
+    index.add_page(2, "Termination requires ninety days written notice.")
+    index.add_page(3, "Appendix with unrelated tables.")
+
+    results = index.search("how much notice for termination?", k=2)
+    assert results[0].page == 2
+
+
+def test_search_sees_pages_added_later():
+    """Test pages become searchable as soon as they are added."""
+    index = DocumentIndex()
+    index.add_page(1, "Opening page.")
+    assert index.search("warranty") == []
+    index.add_page(2, "The warranty lasts twelve months.")
+    assert [c.page for c in index.search("warranty")] == [2]
+
+
+def test_search_many_matches_individual_searches():
+    """Test batched retrieval returns the same results as one search per query."""
+    index = DocumentIndex()
+    for page in range(1, 21):
+        index.add_page(page, f"Section {page} covers topic{page % 7} and shared terms.")
+
+    queries = ["topic3 terms", "topic5", "nothing matches zzz", "shared"]
+    batched = index.search_many(queries, k=3)
+    for query, results in zip(queries, batched):
+        assert [c.chunk_id for c in results] == [c.chunk_id for c in index.search(query, k=3)]
+    assert batched[2] == []
+
+
+def test_derive_reuses_unchanged_pages_without_touching_parent():
+    """Test a derived index remaps kept pages, drops others and leaves the parent intact."""
+    index = DocumentIndex()
+    index.add_page(1, "alpha clause about payment")
+    index.add_page(2, "beta clause about termination")
+    index.add_page(3, "gamma clause about payment schedules")
+    index.seal()
+
+    # Page 2 changed; page 3 moved to page 4 after an inserted page
+    derived = index.derive({1: 1, 3: 4})
+    derived.add_page(2, "revised beta clause about renewal")
+    derived.add_page(3, "inserted delta clause about payment")
+
+    assert len(derived) == 4
+    assert derived.page_text(4) == "gamma clause about payment schedules"
+    assert [c.page for c in derived.search("termination")] == []
+    assert sorted(c.page for c in derived.search("payment", k=10)) == [1, 3, 4]
+
+    assert len(index) == 3
+    assert index.page_text(2) == "beta clause about termination"
+    assert sorted(c.page for c in index.search("payment", k=10)) == [1, 3]
+
+
+def test_derive_compacts_once_most_chunks_are_dead():
+    """Test dead chunks, postings and text are dropped when they outnumber live ones."""
+    index = DocumentIndex()
+    for page, word in enumerate(["alpha", "beta", "gamma", "delta"], start=1):
+        index.add_page(page, f"{word} clause about payment")
+    index.seal()
+
+    derived = index.derive({3: 1})
+    derived.add_page(2, "new epsilon clause about renewal")
+
+    assert len(derived._chunk_pages) == len(derived) == 2
+    assert "alpha" not in derived._postings
+    assert len(derived._text) == len("gamma clause about payment") + len("new epsilon clause about renewal")
+    assert derived.page_text(1) == "gamma clause about payment"
+    assert [c.page for c in derived.search("payment", k=10)] == [1]
+    assert [c.text for c in derived.search("renewal")] == ["new epsilon clause about renewal"]
+    assert sorted(c.page for c in index.search("payment", k=10)) == [1, 2, 3, 4]
+
+
+def test_pages_with_terms_intersects_live_pages():
+    """Test candidate pages must contain every term and dropped pages are excluded."""
+    index = DocumentIndex()
+    index.add_page(1, "termination fee applies")
+    index.add_page(2, "the fee for termination is waived")
+    index.add_page(3, "fee schedule only")
+
+    assert index.pages_with_terms(["termination", "fee"]) == {1, 2}
+    assert index.pages_with_terms(["missing"]) == set()
+    assert index.derive({1: 1, 3: 2}).pages_with_terms(["termination", "fee"]) == {1}
@@ -0,0 +1,107 @@
+"""
+Unit tests for lazy PDF page extraction.
+"""
+import os
+import threading
+import time
+
+import pytest
+
+from parsing.lazy_pdf import LazyPDF, PagePrefetcher
+from parsing.sandbox import ParseSandbox
+
+
+def wait_until(condition, timeout: float = 5) -> bool:
+    """Poll ``condition`` until it holds or ``timeout`` seconds pass."""
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_pages_extracted_on_demand(make_pdf):
+    """Test page text is extracted per page from the mapped file."""
+    pdf = LazyPDF(make_pdf([f"page {i} text" for i in range(1, 6)]), "doc.pdf")
+    try:
+        assert pdf.page_count == 5
+        assert pdf.page_text(3).strip() == "page 3 text"
+    finally:
+        pdf.close()
+    with pytest.raises(ValueError, match="closed"):
+        pdf.page_text(1)
+
+
+def test_pages_are_extracted_in_the_sandbox_within_their_budget(make_pdf):
+    """Test lazy extraction runs in sandbox workers and over-budget pages are skipped."""
+    sandbox = ParseSandbox(workers=1, wall_seconds=30, page_seconds=1e-6)
+    pdf = LazyPDF(make_pdf(["one", "two"]), "doc.pdf", sandbox=sandbox)
+    try:
+        assert not hasattr(pdf, "reader")
+        assert pdf.page_text(2) == ""
+        assert pdf.skipped_pages == [2]
+    finally:
+        pdf.close()
+        sandbox.close()
+    assert not os.path.exists(pdf.path)
+
+
+def test_out_of_range_page_rejected(make_pdf):
+    """Test bad page numbers raise."""
+    pdf = LazyPDF(make_pdf(["one", "two", "three"]), "doc.pdf")
+    try:
+        with pytest.raises(ValueError, match="out of range"):
+            pdf.page_text(4)
+    finally:
+        pdf.close()
+
+
+def test_invalid_pdf_rejected():
+    """Test opening a non-PDF fails like the eager parser."""
+    with pytest.raises(ValueError):
+        LazyPDF(b"not a pdf", "doc.pdf")
+
+
+def test_prefetcher_extracts_all_pages_when_idle(make_pdf):
+    """Test one prefetcher thread serves several documents, handing every page over."""
+    first = LazyPDF(make_pdf([f"page {i}" for i in range(1, 4)]), "a.pdf")
+    second = LazyPDF(make_pdf(["only page"]), "b.pdf")
+    seen: list[tuple[str, int]] = []
+    prefetcher = PagePrefetcher(idle_delay=0.01)
+    try:
+        jobs = [
+            prefetcher.add(first, lambda page, text: seen.append(("a", page))),
+            prefetcher.add(second, lambda page, text: seen.append(("b", page))),
+        ]
+        assert wait_until(lambda: all(job.done for job in jobs))
+        assert [page for name, page in seen if name == "a"] == [1, 2, 3]
+        assert ("b", 1) in seen
+    finally:
+        first.close()
+        second.close()
+
+
+def test_prefetcher_waits_for_foreground_work(make_pdf):
+    """Test nothing is prefetched while any foreground work is running in the process."""
+    pdf = LazyPDF(make_pdf(["one", "two"]), "doc.pdf")
+    prefetcher = PagePrefetcher(idle_delay=0.01)
+    busy = threading.Event()
+    release = threading.Event()
+
+    def foreground_request():
+        with prefetcher.foreground():
+            busy.set()
+            release.wait()
+
+    worker = threading.Thread(target=foreground_request)
+    try:
+        worker.start()
+        busy.wait()
+        job = prefetcher.add(pdf, lambda page, text: None)
+        time.sleep(0.1)
+        assert job.next_page == 1
+        release.set()
+        assert wait_until(lambda: job.done)
+    finally:
+        release.set()
+        worker.join()
+        pdf.close()
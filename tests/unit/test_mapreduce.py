@@ -0,0 +1,118 @@
+"""
+Unit tests for map-reduce answering.
+"""
+import asyncio
+
+from agent.mapreduce import (
+    MapCache,
+    build_reduce_prompt,
+    is_whole_document_question,
+    map_document,
+    split_sections,
+)
+
+
+def test_detects_whole_document_questions():
+    """Test summary and exhaustive-listing questions are routed to map-reduce."""
+    assert is_whole_document_question("Summarize this document")
+    assert is_whole_document_question("Give me an overview of the contract.")
+    assert is_whole_document_question("summarize")
+    assert is_whole_document_question("TL;DR")
+    assert is_whole_document_question("List every deadline")
+    assert is_whole_document_question("what are all the parties?")
+    assert is_whole_document_question("List the obligations across the whole agreement")
+    assert not is_whole_document_question("What is the notice period in clause 4?")
+
+
+def test_questions_that_only_mention_summaries_use_retrieval():
+    """Test the trigger needs an explicit whole-document request."""
+    assert not is_whole_document_question("Where is the summary of fees?")
+    assert not is_whole_document_question("Summarize the termination clause")
+    assert not is_whole_document_question("Summarize the document's payment terms")
+    assert not is_whole_document_question("What does the overview say about pricing?")
+    assert not is_whole_document_question("Is the warranty valid throughout the term?")
+    assert not is_whole_document_question("List all fees in section 3")
+
+
+def test_split_sections_respects_token_budget():
+    """Test sections stay within budget and keep page ranges."""
+    pages = [(i, "x" * 300) for i in range(1, 11)]
+    sections = split_sections(pages, token_budget=200)  # 800 characters
+    assert all(len(s.text.replace("\n", "")) <= 800 + 20 * 3 for s in sections)
+    assert sections[0].first_page == 1
+    assert sections[-1].last_page == 10
+    assert "".join(s.text for s in sections).count("x") == 3000
+
+
+def test_split_sections_splits_oversized_pages():
+    """Test a page larger than the budget spans several sections."""
+    sections = split_sections([(1, "y" * 2500), (2, "z")], token_budget=250)
+    assert len(sections) == 3
+    assert sections[0].label == "page 1"
+    assert sections[-1].label == "pages 1-2"
+
+
+def test_map_document_caps_concurrency_and_caches_by_hash():
+    """Test map calls run concurrently up to the cap and are reused per document hash."""
+    calls = 0
+    in_flight = 0
+    peak = 0
+
+    async def complete(prompt: str) -> str:
+        nonlocal calls, in_flight, peak
+        calls += 1
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return f"notes {calls}"
+
+    pages = [(i, f"page {i} " * 200) for i in range(1, 21)]
+    cache = MapCache()
+
+    async def run() -> None:
+        first = await map_document("hash-a", lambda: pages, complete, concurrency=3,
+                                   token_budget=500, cache=cache)
+        mapped = calls
+        assert mapped == len(first) > 3
+        assert peak == 3
+
+        again = await map_document("hash-a", lambda: pages, complete, concurrency=3,
+                                   token_budget=500, cache=cache)
+        assert again == first
+        assert calls == mapped  # only the reduce step is left to pay for
+
+        await map_document("hash-b", lambda: pages, complete, token_budget=500, cache=cache)
+        assert calls == 2 * mapped
+
+    asyncio.run(run())
+
+
+def test_concurrent_requests_share_one_map_run():
+    """Test simultaneous questions about the same document map it only once."""
+    calls = 0
+
+    async def complete(prompt: str) -> str:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "notes"
+
+    pages = [(1, "only page")]
+    cache = MapCache()
+
+    async def run() -> None:
+        await asyncio.gather(*(
+            map_document("same", lambda: pages, complete, cache=cache) for _ in range(5)
+        ))
+
+    asyncio.run(run())
+    assert calls == 1
+
+
+def test_reduce_prompt_includes_all_notes_and_question():
+    """Test the reduce prompt carries every section's notes and the question."""
+    sections = split_sections([(1, "aaaa"), (2, "bbbb")], token_budget=1)
+    prompt = build_reduce_prompt("List every deadline", [(s, f"note {s.label}") for s in sections])
+    assert "note page 1" in prompt and "note page 2" in prompt
+    assert prompt.endswith("List every deadline")
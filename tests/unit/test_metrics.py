@@ -0,0 +1,33 @@
+"""
+Unit tests for in-process metrics.
+"""
+from backend.metrics import Metrics
+
+
+def test_counters_and_series_snapshot():
+    """Test counters accumulate and series report count, sum and percentiles."""
+    m = Metrics()
+    m.increment("requests")
+    m.increment("requests", 2)
+    for value in range(1, 101):
+        m.observe("latency", float(value))
+
+    snapshot = m.snapshot()
+    assert snapshot["counters"]["requests"] == 3
+    series = snapshot["series"]["latency"]
+    assert series["count"] == 100
+    assert series["sum"] == 5050
+    assert 49 <= series["p50"] <= 52
+    assert series["p99"] >= 98
+
+
+def test_percentile_uses_recent_window():
+    """Test percentiles only reflect the most recent observations."""
+    m = Metrics(window=10)
+    for _ in range(100):
+        m.observe("latency", 100.0)
+    for _ in range(10):
+        m.observe("latency", 1.0)
+
+    assert m.percentile("latency", 99) == 1.0
+    assert m.percentile("missing", 50) is None
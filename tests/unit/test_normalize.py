@@ -0,0 +1,90 @@
+"""
+Unit tests for ingest-time text normalization.
+"""
+from parsing.normalize import TextNormalizer
+
+
+def make_page(number: int, body: str) -> str:
+    """A page with a running header and a numbered footer."""
+    return f"ACME Corp   Confidential\nMaster Services Agreement\n{body}\n\nPage {number} of 10"
+
+
+WORDS = ["alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel", "india", "juliet"]
+PAGES = [
+    (n, make_page(n, f"Clause {n} covers the {word} obligations.\nThe sched-\nule for {word} applies."))
+    for n, word in enumerate(WORDS, start=1)
+]
+
+
+def test_strips_repeated_headers_and_footers():
+    """Test header and page-number footer lines repeated on every page are removed."""
+    normalizer = TextNormalizer()
+    cleaned = dict(normalizer.normalize_pages(PAGES))
+
+    assert len(cleaned) == 10
+    for n, text in cleaned.items():
+        assert "ACME Corp" not in text
+        assert "Master Services Agreement" not in text
+        assert "Page" not in text
+        assert f"Clause {n} covers the {WORDS[n - 1]} obligations." in text
+        assert f"The schedule for {WORDS[n - 1]} applies." in text
+
+
+def test_rejoins_hyphenation_and_collapses_whitespace():
+    """Test hyphenated line breaks are rejoined and runs of whitespace collapsed."""
+    normalizer = TextNormalizer()
+    text = normalizer.clean("The   agree-\n  ment is\t\tbinding.\n\n\n\nSigned.")
+    assert text == "The agreement is binding.\n\nSigned."
+    assert normalizer.chars_saved == len("The   agree-\n  ment is\t\tbinding.\n\n\n\nSigned.") - len(text)
+
+
+def test_reports_chars_saved():
+    """Test the normalizer counts the characters it removed."""
+    normalizer = TextNormalizer()
+    cleaned = list(normalizer.normalize_pages(PAGES))
+    raw_total = sum(len(text) for _, text in PAGES)
+    assert normalizer.chars_saved == raw_total - sum(len(text) for _, text in cleaned)
+    assert normalizer.chars_saved > 10 * len("ACME Corp Confidential")
+
+
+def test_keeps_body_lines_and_short_pages():
+    """Test lines that repeat on few pages and one-line pages are left alone."""
+    normalizer = TextNormalizer()
+    pages = [(1, "Definitions\nA term.\nAnother term."), (2, "Definitions\nMore terms.\nEven more.")]
+    pages += [(n, f"Only line on page {n} of the schedule.") for n in range(3, 11)]
+    cleaned = dict(normalizer.normalize_pages(pages))
+
+    assert cleaned[1].startswith("Definitions")
+    assert cleaned[2].startswith("Definitions")
+    assert cleaned[5] == "Only line on page 5 of the schedule."
+
+
+def test_never_empties_a_page():
+    """Test a page made only of repeated lines is kept rather than dropped."""
+    normalizer = TextNormalizer()
+    pages = [(n, "Intentionally left blank\nNotes\nSignature") for n in range(1, 6)]
+    cleaned = dict(normalizer.normalize_pages(pages))
+    assert cleaned[3] == "Intentionally left blank\nNotes\nSignature"
+
+
+def test_pages_after_window_are_learned_incrementally():
+    """Test boilerplate is still removed from pages streamed after the window."""
+    normalizer = TextNormalizer()
+    cleaned = dict(normalizer.normalize_pages(PAGES, window=2))
+    assert all("ACME Corp" not in text for n, text in cleaned.items() if n >= 4)
+
+
+def test_keeps_numbered_headings_and_amounts():
+    """Test edge lines differing only in numbers that do not follow the page number are kept."""
+    normalizer = TextNormalizer()
+    pages = [
+        (n, f"Article {(n + 1) // 2}\nTerms for part {n}.\nMore terms.\nTotal due: {n * 100} USD\nSection {n}.")
+        for n in range(1, 11)
+    ]
+    cleaned = dict(normalizer.normalize_pages(pages))
+
+    for n, text in cleaned.items():
+        assert text.startswith(f"Article {(n + 1) // 2}\n")
+        assert f"Total due: {n * 100} USD" in text
+        # A number that follows the page number on every page is running boilerplate
+        assert "Section" not in text
@@ -105,3 +105,20 @@ def test_parse_valid_pdf():
             # This is acceptable - the structure test is what matters
             pass
 
+
+
+def test_page_hashes_identify_identical_pages(make_pdf):
+    """Test pages with identical content share a hash and only requested pages are extracted."""
+    reader, _ = PDFParser.open(make_pdf(["same words", "other words", "same words"]), "test.pdf")
+    hashes = PDFParser.page_hashes(reader)
+    assert hashes[0] == hashes[2] != hashes[1]
+    assert [page for page, _ in PDFParser.iter_pages(reader, [2, 3])] == [2, 3]
+
+
+def test_page_hashes_cover_page_resources(make_pdf):
+    """Test a page drawn with the same content stream but a different font hashes differently."""
+    pdf = make_pdf(["same words"])
+    refonted = pdf.replace(b"/Helvetica", b"/Helvetico")
+    assert len(refonted) == len(pdf)
+    hashes = [PDFParser.page_hashes(PDFParser.open(data, "test.pdf")[0]) for data in (pdf, pdf, refonted)]
+    assert hashes[0] == hashes[1] != hashes[2]
@@ -0,0 +1,132 @@
+"""
+Unit tests for speculative context prefetch.
+"""
+import asyncio
+
+from backend.prefetch import ContextCache, content_terms, term_overlap
+from backend.storage import StoredDocument
+from parsing.pdf_parser import PDFMetadata
+
+
+def make_document(pages: list[str]) -> StoredDocument:
+    """Create a stored document with the given pages indexed."""
+    document = StoredDocument("doc.pdf", PDFMetadata(pages=len(pages) + 1))
+    document.ingest(iter(enumerate(pages, start=1)))
+    return document
+
+
+def counting_builder(calls: list[str], text: str):
+    """Build function that records each call and returns ``text``."""
+    async def build() -> str:
+        calls.append(text)
+        return text
+    return build
+
+
+def test_term_overlap_measures_query_coverage():
+    """Test overlap is the share of query terms the hint covered."""
+    hint = frozenset({"payment", "terms"})
+    assert term_overlap(hint, frozenset({"payment", "terms", "invoice"})) == 2 / 3
+    assert term_overlap(hint, frozenset()) == 0.0
+
+
+def test_prefetched_context_is_reused_for_overlapping_query():
+    """Test a completed question reuses the context prepared for its prefix."""
+    async def run():
+        cache = ContextCache()
+        document = make_document(["Payment terms are net thirty days."])
+        calls = []
+        assert cache.prefetch("s", "what are the payment terms", document, counting_builder(calls, "ctx"))
+        # Same hint again does not rebuild
+        assert cache.prefetch("s", "what are the payment terms", document, counting_builder(calls, "ctx"))
+        return await cache.get("s", "what are the payment terms?", document), calls
+
+    context, calls = asyncio.run(run())
+    assert context == "ctx"
+    assert calls == ["ctx"]
+
+
+def test_unrelated_query_misses():
+    """Test a question that drifted away from the hint is not served the hint's context."""
+    async def run():
+        cache = ContextCache()
+        document = make_document(["Payment terms are net thirty days."])
+        cache.prefetch("s", "payment terms", document, counting_builder([], "ctx"))
+        await asyncio.sleep(0)
+        return await cache.get("s", "who signed the warranty clause", document)
+
+    assert asyncio.run(run()) is None
+
+
+def test_questions_sharing_only_stop_words_miss():
+    """Test question words shared by hint and question do not count as overlap."""
+    async def run(hint: str, query: str):
+        cache = ContextCache()
+        document = make_document(["The notice period is ninety days. Penalties apply to deadlines."])
+        cache.prefetch("s", hint, document, counting_builder([], "ctx"))
+        return await cache.get("s", query, document)
+
+    assert content_terms("what is the termination fee") == {"termination", "fee"}
+    assert asyncio.run(run("what is the notice period", "what is the termination fee")) is None
+    assert asyncio.run(run("what are the deadlines", "what are the penalties")) is None
+    assert asyncio.run(run("what are the late deadlines", "what are the late penalties")) is None
+    assert asyncio.run(run("what is the notice period", "What is the notice period?")) == "ctx"
+
+
+def test_short_hints_are_not_prefetched():
+    """Test hints with fewer than two content terms are ignored."""
+    async def run():
+        cache = ContextCache()
+        document = make_document(["text"])
+        return (
+            cache.prefetch("s", "what", document, counting_builder([], "ctx")),
+            cache.prefetch("s", "what are the", document, counting_builder([], "ctx")),
+        )
+
+    assert asyncio.run(run()) == (False, False)
+
+
+def test_context_goes_stale_as_document_grows():
+    """Test contexts prepared before more pages were indexed are not reused."""
+    async def run():
+        cache = ContextCache()
+        document = make_document(["Payment terms are net thirty days."])
+        cache.prefetch("s", "payment terms", document, counting_builder([], "ctx"))
+        document.ingest(iter([(2, "Late payment terms add interest.")]))
+        return await cache.get("s", "payment terms", document)
+
+    assert asyncio.run(run()) is None
+
+
+def test_expired_and_discarded_contexts_miss():
+    """Test contexts are dropped after the TTL and on discard."""
+    async def run():
+        document = make_document(["Payment terms are net thirty days."])
+        expired = ContextCache(ttl=0)
+        expired.prefetch("s", "payment terms", document, counting_builder([], "ctx"))
+        await asyncio.sleep(0.01)
+
+        discarded = ContextCache()
+        discarded.prefetch("s", "payment terms", document, counting_builder([], "ctx"))
+        discarded.discard("s")
+        return (
+            await expired.get("s", "payment terms", document),
+            await discarded.get("s", "payment terms", document),
+        )
+
+    assert asyncio.run(run()) == (None, None)
+
+
+def test_failed_preparation_is_a_miss():
+    """Test a context build that raised falls back to a miss."""
+    async def run():
+        cache = ContextCache()
+        document = make_document(["Payment terms are net thirty days."])
+
+        async def build() -> str:
+            raise RuntimeError("retrieval failed")
+
+        cache.prefetch("s", "payment terms", document, build)
+        return await cache.get("s", "payment terms", document)
+
+    assert asyncio.run(run()) is None
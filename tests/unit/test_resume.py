@@ -0,0 +1,138 @@
+"""
+Unit tests for resumable stream token logs.
+"""
+import asyncio
+
+import pytest
+
+from backend.resume import StreamExpired, StreamLogs, TokenLog
+from backend.upstream import ClientDisconnected, stream_upstream
+
+
+async def collect(chunks) -> str:
+    """Join every chunk of an async iterator."""
+    return "".join([text async for text in chunks])
+
+
+def test_follow_replays_then_continues_live():
+    """Test a late reader gets the missed text from its offset, then the rest live."""
+    async def run():
+        log = TokenLog("s")
+        log.append("Hello ")
+        log.append("wor")
+        reader = asyncio.create_task(collect(log.follow(offset=3)))
+        await asyncio.sleep(0)
+        log.append("ld")
+        log.finish()
+        return await reader
+
+    assert asyncio.run(run()) == "lo world"
+
+
+def test_log_keeps_only_recent_text():
+    """Test old chunks are dropped past the size bound and offsets into them expire."""
+    async def run():
+        log = TokenLog("s", max_chars=10)
+        for word in ("aaaa", "bbbb", "cccc", "dddd"):
+            log.append(word)
+        log.finish()
+        with pytest.raises(StreamExpired):
+            log.check(0)
+        with pytest.raises(ValueError):
+            log.check(17)
+        return await collect(log.follow(offset=9))
+
+    assert asyncio.run(run()) == "cccdddd"
+
+
+def test_abandoned_after_grace_without_readers():
+    """Test generation counts as abandoned only once no reader is attached for the grace period."""
+    async def run():
+        log = TokenLog("s")
+        reader = log.follow()
+        log.append("x")
+        await anext(reader)
+        attached = await log.abandoned(grace=0)
+        await reader.aclose()
+        await asyncio.sleep(0.01)
+        return attached, await log.abandoned(grace=0), await log.abandoned(grace=60)
+
+    assert asyncio.run(run()) == (False, True, False)
+
+
+def test_logs_record_streams_and_evict():
+    """Test the registry fills logs from producers, expires them and bounds their number."""
+    async def answer(words):
+        for word in words:
+            yield word
+
+    async def run():
+        logs = StreamLogs(ttl=60, max_streams=2)
+        first = logs.start(lambda log: answer(["a", "b"]))
+        await first.task
+        assert first.done and await collect(first.follow()) == "ab"
+
+        second = logs.start(lambda log: answer(["c"]))
+        third = logs.start(lambda log: answer(["d"]))
+        await asyncio.gather(second.task, third.task)
+        # The oldest finished log made room for the third
+        assert logs.get(first.stream_id) is None
+        assert logs.get(third.stream_id) is third
+
+        logs.ttl = 0
+        await asyncio.sleep(0.01)
+        return logs.get(third.stream_id), len(logs)
+
+    assert asyncio.run(run()) == (None, 0)
+
+
+def test_cancel_stops_the_producer():
+    """Test cancelling a log stops generation and ends readers."""
+    async def endless(log):
+        while True:
+            yield "tok "
+            await asyncio.sleep(0.01)
+
+    async def run():
+        logs = StreamLogs()
+        log = logs.start(endless)
+        await asyncio.sleep(0.05)
+        log.cancel()
+        await asyncio.gather(log.task, return_exceptions=True)
+        return log.done, await collect(log.follow())
+
+    done, text = asyncio.run(run())
+    assert done
+    assert text.startswith("tok ")
+
+
+def test_abandoned_stream_stops_while_tokens_keep_arriving():
+    """Test generation stops after the reader leaves even though the upstream never pauses."""
+    produced = []
+    closed = asyncio.Event()
+
+    async def steady_upstream():
+        try:
+            while True:
+                produced.append(1)
+                yield "tok "
+                await asyncio.sleep(0.002)
+        finally:
+            closed.set()
+
+    async def run():
+        logs = StreamLogs()
+        log = logs.start(lambda log: stream_upstream(
+            steady_upstream, is_disconnected=lambda: log.abandoned(grace=0.02), poll_interval=0.01
+        ))
+        reader = log.follow()
+        await anext(reader)
+        await reader.aclose()
+        left_with = len(produced)
+        done, _ = await asyncio.wait([log.task], timeout=2)
+        stopped = bool(done) and isinstance(log.task.exception(), ClientDisconnected)
+        return stopped and closed.is_set(), left_with
+
+    stopped, left_with = asyncio.run(run())
+    assert stopped
+    assert len(produced) - left_with < 200
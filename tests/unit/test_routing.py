@@ -0,0 +1,72 @@
+"""
+Unit tests for model routing and hedging settings.
+"""
+import pytest
+
+from agent import routing
+from agent.routing import Route, hedge_delay, hedge_route, parse_routes, select_route
+from backend.metrics import Metrics
+
+
+ROUTES = (
+    Route(model="small", max_tokens=100),
+    Route(model="reduce-model", classes=("reduce",)),
+    Route(model="large"),
+)
+
+
+def test_select_route_by_prompt_size():
+    """Test short prompts use the small-model route and long ones fall through."""
+    assert select_route("short question", routes=ROUTES).model == "small"
+    assert select_route("x" * 2000, routes=ROUTES).model == "large"
+
+
+def test_select_route_by_request_class():
+    """Test class-restricted routes only serve their classes."""
+    assert select_route("x" * 2000, "reduce", routes=ROUTES).model == "reduce-model"
+    assert select_route("x" * 2000, "batch", routes=ROUTES).model == "large"
+
+
+def test_select_route_defaults_to_openai_model(monkeypatch):
+    """Test OPENAI_MODEL is used when no routes are configured."""
+    monkeypatch.delenv("MODEL_ROUTES", raising=False)
+    monkeypatch.setenv("OPENAI_MODEL", "gpt-4o")
+    assert select_route("hello") == Route(model="gpt-4o")
+    monkeypatch.delenv("OPENAI_MODEL")
+    assert select_route("hello").model == routing.DEFAULT_MODEL
+
+
+def test_parse_routes():
+    """Test MODEL_ROUTES JSON is parsed in order and bad values are rejected."""
+    routes = parse_routes(
+        '[{"model": "a", "max_tokens": 10, "base_url": "http://local/v1"}, {"model": "b", "classes": ["map"]}]'
+    )
+    assert routes == (
+        Route(model="a", base_url="http://local/v1", max_tokens=10),
+        Route(model="b", classes=("map",)),
+    )
+    with pytest.raises(ValueError):
+        parse_routes('{"model": "a"}')
+    with pytest.raises(ValueError):
+        parse_routes('[{"base_url": "http://local/v1"}]')
+
+
+def test_hedge_route(monkeypatch):
+    """Test hedging is off by default and inherits unset fields from the primary."""
+    monkeypatch.delenv("HEDGE_MODEL", raising=False)
+    monkeypatch.delenv("HEDGE_BASE_URL", raising=False)
+    primary = Route(model="a", base_url="http://primary/v1")
+    assert hedge_route(primary) is None
+
+    monkeypatch.setenv("HEDGE_BASE_URL", "http://backup/v1")
+    assert hedge_route(primary) == Route(model="a", base_url="http://backup/v1")
+
+
+def test_hedge_delay_tracks_ttft_percentile():
+    """Test the hedge threshold uses the default until enough TTFTs are observed."""
+    registry = Metrics()
+    assert hedge_delay(registry) == routing.HEDGE_DELAY
+
+    for i in range(100):
+        registry.observe(routing.UPSTREAM_TTFT_SERIES, 0.01 * (i + 1))
+    assert hedge_delay(registry) == pytest.approx(0.95, abs=0.02)
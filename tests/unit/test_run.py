@@ -0,0 +1,68 @@
+"""
+Unit tests for the process supervisor in run.py.
+"""
+import sys
+import time
+
+import run
+from run import ChildProcess, Supervisor
+
+
+def test_production_defaults_to_one_backend_worker():
+    """Test --prod runs a single backend, since documents and sessions are per process."""
+    sock = run.bind_backend_socket("127.0.0.1", 0)
+    try:
+        children = run.build_children("127.0.0.1", run.DEFAULT_WORKERS, sock)
+    finally:
+        sock.close()
+    assert [child.name for child in children] == ["backend-0", "ui"]
+
+
+def test_supervisor_restarts_crashed_child(monkeypatch):
+    """Test a child that exits is restarted after its backoff."""
+    monkeypatch.setattr(run, "MAX_RESTART_BACKOFF", 0.0)
+    child = ChildProcess("crasher", [sys.executable, "-c", "raise SystemExit(3)"])
+    supervisor = Supervisor([child], graceful_timeout=1, check_interval=0.01)
+
+    child.start()
+    child.process.wait()
+    supervisor.check_children()  # records the crash and schedules a restart
+    assert child.restarts == 1
+    assert child.process is None
+    supervisor.check_children()  # backoff elapsed: starts again
+    assert child.process is not None
+    supervisor.stop_children()
+
+
+def test_child_output_is_forwarded(capsys):
+    """Test child output is drained and prefixed instead of filling a pipe."""
+    child = ChildProcess("echo", [sys.executable, "-c", "print('x' * 100000); print('done')"])
+    child.start()
+    child.process.wait(timeout=10)
+    time.sleep(0.2)
+    out = capsys.readouterr().out
+    assert "[echo] done" in out
+
+
+def test_stop_children_kills_after_grace_period():
+    """Test children ignoring SIGTERM are killed once the grace period ends."""
+    code = "import signal, time; signal.signal(signal.SIGTERM, signal.SIG_IGN); print('up', flush=True); time.sleep(60)"
+    child = ChildProcess("stubborn", [sys.executable, "-c", code])
+    child.start()
+    time.sleep(0.5)
+    supervisor = Supervisor([child], graceful_timeout=0.2)
+    started = time.monotonic()
+    supervisor.stop_children()
+    assert not child.is_running()
+    assert time.monotonic() - started < 5
+
+
+def test_forked_worker_is_reexecuted_once_threads_exist(monkeypatch):
+    """Test a worker (re)started while forwarding threads run is executed, not forked."""
+    monkeypatch.setattr(run.threading, "active_count", lambda: 2)
+    child = run.ForkedChild("backend-0", fd=0)
+    assert child.args[1:4] == ["-m", "uvicorn", "backend.main:app"]
+    child.args = [sys.executable, "-c", "print('fresh interpreter')"]
+    child.start()
+    assert child.process.wait(timeout=10) == 0
+    assert not isinstance(child.process, run.ForkedProcess)
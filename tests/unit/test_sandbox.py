@@ -0,0 +1,92 @@
+"""
+Unit tests for sandboxed PDF parsing.
+"""
+import pytest
+
+from parsing.sandbox import ParseSandbox
+
+
+@pytest.fixture
+def sandbox():
+    """Single-worker sandbox, stopped after the test."""
+    pool = ParseSandbox(workers=1, wall_seconds=30)
+    yield pool
+    pool.close()
+
+
+def test_inspect_and_extract_in_worker(sandbox, make_pdf):
+    """Test metadata, page hashes and page text come back from the worker."""
+    pdf = make_pdf(["First page text.", "Second page text.", "First page text."], title="Report")
+    metadata, hashes = sandbox.inspect(pdf, "report.pdf")
+    assert metadata.pages == 3
+    assert metadata.title == "Report"
+    assert hashes[0] == hashes[2] != hashes[1]
+
+    pages = list(sandbox.iter_pages(pdf, "report.pdf", [2, 3]))
+    assert [(page, text.strip()) for page, text in pages] == [
+        (2, "Second page text."),
+        (3, "First page text."),
+    ]
+    assert list(sandbox.iter_pages(pdf, "report.pdf", [])) == []
+
+
+def test_invalid_pdf_keeps_the_worker(sandbox, make_pdf):
+    """Test a parse error is a ValueError and the worker stays in service."""
+    with pytest.raises(ValueError, match="Failed to parse PDF"):
+        sandbox.inspect(b"not a pdf", "broken.pdf")
+    assert sandbox.inspect(make_pdf(["ok"]), "ok.pdf")[0].pages == 1
+    assert sandbox.kills == 0
+
+
+def test_wall_clock_limit_kills_and_replaces_worker(sandbox, make_pdf):
+    """Test a job over its wall-clock limit is stopped and the next job gets a fresh worker."""
+    pdf = make_pdf(["Some text."])
+    sandbox.wall_seconds = 0.001
+    with pytest.raises(ValueError, match="longer than"):
+        sandbox.inspect(pdf, "slow.pdf")
+    assert sandbox.kills == 1
+
+    sandbox.wall_seconds = 30
+    assert sandbox.inspect(pdf, "ok.pdf")[0].pages == 1
+
+
+def test_pages_over_budget_are_skipped(make_pdf):
+    """Test pages exceeding the per-page time budget are skipped, not fatal."""
+    pool = ParseSandbox(workers=1, wall_seconds=30, page_seconds=1e-6)
+    try:
+        skipped = []
+        pages = list(pool.iter_pages(make_pdf(["one", "two"]), "doc.pdf", skipped=skipped))
+    finally:
+        pool.close()
+    assert pages == []
+    assert skipped == [1, 2]
+
+
+def test_memory_limit_fails_the_job(make_pdf):
+    """Test a worker over its memory limit fails the job with a ValueError."""
+    pool = ParseSandbox(workers=1, wall_seconds=30, memory_mb=1)
+    try:
+        with pytest.raises(ValueError):
+            pool.inspect(make_pdf(["text"] * 20), "big.pdf")
+    finally:
+        pool.close()
+
+
+def test_abandoned_extraction_replaces_worker(sandbox, make_pdf):
+    """Test closing a page iterator early does not return a busy worker to the pool."""
+    pdf = make_pdf([f"Page {i} text." for i in range(1, 6)])
+    pages = sandbox.iter_pages(pdf, "doc.pdf")
+    assert next(pages)[0] == 1
+    pages.close()
+    assert [page for page, _ in sandbox.iter_pages(pdf, "doc.pdf", [4])] == [4]
+
+
+def test_jobs_can_read_a_file_on_disk(sandbox, make_pdf, tmp_path):
+    """Test a PDF passed by path is opened once per worker and extracted page by page."""
+    path = tmp_path / "doc.pdf"
+    path.write_bytes(make_pdf(["First page.", "Second page."], title="On disk"))
+    assert sandbox.metadata(str(path), "doc.pdf").title == "On disk"
+    assert [text.strip() for _, text in sandbox.iter_pages(str(path), "doc.pdf", [2])] == ["Second page."]
+    assert [page for page, _ in sandbox.iter_pages(str(path), "doc.pdf", [1])] == [1]
+    with pytest.raises(ValueError, match="Failed to read PDF"):
+        sandbox.metadata(str(tmp_path / "missing.pdf"), "missing.pdf")
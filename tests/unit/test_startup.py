@@ -0,0 +1,26 @@
+"""
+Unit tests for lazy imports and start-up reporting.
+"""
+import subprocess
+import sys
+
+from backend.startup import measure_import
+
+
+def test_backend_import_defers_heavy_dependencies():
+    """Test importing the app does not import agno, openai or pypdf."""
+    code = (
+        "import sys, backend.main; "
+        "print('loaded:' + ','.join(m for m in ('agno', 'openai', 'pypdf') if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert result.stdout.splitlines()[-1] == "loaded:"
+
+
+def test_measure_import_reports_packages():
+    """Test import timing attributes cost to top-level packages."""
+    total_ms, timings = measure_import("json")
+    assert total_ms > 0
+    assert "json" in {t.package for t in timings}
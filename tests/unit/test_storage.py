@@ -0,0 +1,198 @@
+"""
+Unit tests for session document storage.
+"""
+import pytest
+
+from backend.storage import DocumentRegistry, StoredDocument, build_context
+from parsing.lazy_pdf import LazyPDF
+from parsing.pdf_parser import PDFMetadata
+
+
+def make_document(pages: int, content_hash: str = "") -> StoredDocument:
+    """Create an empty stored document for a PDF with the given page count."""
+    return StoredDocument("doc.pdf", PDFMetadata(pages=pages), content_hash=content_hash)
+
+
+def test_ingest_with_limit_can_resume():
+    """Test ingestion can stop after the first page and resume later."""
+    document = make_document(3)
+    pages = iter([(1, "alpha text"), (2, "beta text"), (3, "gamma text")])
+
+    assert document.ingest(pages, limit=1) == 1
+    assert not document.done
+    assert document.progress()["pages_indexed"] == 1
+
+    assert document.ingest(pages) == 2
+    assert document.done
+    assert document.text == "alpha text\n\nbeta text\n\ngamma text"
+    assert document.metadata.text_length == document.text_length
+
+
+def test_ingest_records_errors():
+    """Test a failing page marks the document done with an error."""
+    def pages():
+        yield 1, "first page"
+        raise ValueError("Failed to parse PDF page 2: boom")
+
+    document = make_document(2)
+    document.ingest(pages())
+    assert document.done
+    assert "page 2" in document.error
+    assert document.text == "first page"
+
+
+def test_build_context_uses_retrieval_and_notes_partial_ingest():
+    """Test context favours matching pages and flags documents still loading."""
+    document = make_document(10)
+    document.add_page(1, "General introduction.")
+    document.add_page(2, "Invoices are due within thirty days.")
+
+    context = build_context(document, "when are invoices due?")
+    assert context.startswith("[Page 2]")
+    assert "still loading" in context
+
+
+def test_build_context_falls_back_to_leading_text():
+    """Test unmatched questions get the start of the document."""
+    document = make_document(1)
+    document.ingest(iter([(1, "Opening words of the document.")]))
+    assert build_context(document, "zzz") == "Opening words of the document."
+
+
+def test_leading_text_stops_at_the_limit():
+    """Test leading text only reads the pages needed to fill the limit."""
+    document = make_document(4)
+    document.ingest(iter([(n, f"page {n} " + "x" * 20) for n in range(1, 5)]))
+    expected = document.text[:30]
+    read = []
+    page_text = document.index.page_text
+    document.index.page_text = lambda page: read.append(page) or page_text(page)
+
+    assert document.leading_text(30) == expected
+    assert read == [1, 2]
+
+
+def test_registry_shares_documents_by_content_hash():
+    """Test sessions uploading the same content share one reference-counted document."""
+    registry = DocumentRegistry()
+    document = make_document(1, "hash-a")
+    document.ingest(iter([(1, "shared onboarding text " * 50)]))
+
+    assert registry.attach("s1", document) is document
+    for session in ("s2", "s3"):
+        assert registry.attach_existing(session, "hash-a") is document
+
+    stats = registry.stats()
+    assert stats["sessions"] == 3
+    assert stats["documents"] == 1
+    assert stats["memory_saved_bytes"] == 2 * stats["memory_bytes"]
+
+    assert registry.detach("s1")
+    assert registry.detach("s2")
+    assert registry["s3"] is document and not document.cancelled
+    assert registry.detach("s3")
+    assert document.cancelled
+    assert registry.attach_existing("s4", "hash-a") is None
+    assert "s4" not in registry
+    assert not registry.detach("s3")
+
+
+def test_registry_never_reregisters_a_closed_document():
+    """Test a document released (and closed) by its last session cannot be attached again."""
+    registry = DocumentRegistry()
+    document = make_document(1, "hash-a")
+    registry.attach("s1", document)
+    registry.detach("s1")
+    with pytest.raises(ValueError, match="closed"):
+        registry.attach("s2", document)
+    assert registry.stats()["documents"] == 0
+
+
+def test_registry_keeps_first_copy_of_concurrent_uploads():
+    """Test a duplicate built concurrently is closed in favour of the stored copy."""
+    registry = DocumentRegistry()
+    first, duplicate = make_document(1, "hash-a"), make_document(1, "hash-a")
+
+    registry.attach("s1", first)
+    assert registry.attach("s2", duplicate) is first
+    assert duplicate.cancelled
+    assert registry.attach("s1", first) is first
+    assert registry.stats()["sessions"] == 2
+
+
+def test_registry_replacing_a_document_releases_the_old_one():
+    """Test a session uploading new content drops its reference to the old document."""
+    registry = DocumentRegistry()
+    old, new = make_document(1, "hash-a"), make_document(1, "hash-b")
+
+    registry.attach("s1", old)
+    registry.attach("s1", new)
+    assert old.cancelled
+    assert registry.get("s1") is new
+    assert registry.stats()["documents"] == 1
+
+
+def test_revise_only_extracts_changed_pages():
+    """Test a revision reuses pages by content hash, even when pages shift."""
+    previous = make_document(4, "v1")
+    previous.ingest(iter([(1, "intro text"), (2, "scope text"), (3, "fees text"), (4, "terms text")]))
+    previous.page_hashes = ["h-intro", "h-scope", "h-fees", "h-terms"]
+
+    revision = make_document(5, "v2")
+    changed = revision.revise(previous, ["h-intro", "h-new", "h-scope", "h-fees-2", "h-terms"])
+    assert changed == [2, 4]
+    assert revision.indexed_pages == {1, 3, 5}
+    assert revision.page_text(3) == "scope text"
+
+    revision.ingest(iter([(2, "new annex text"), (4, "updated fees text")]))
+    assert revision.text == "intro text\n\nnew annex text\n\nscope text\n\nupdated fees text\n\nterms text"
+    assert revision.text_length == len(revision.text.replace("\n\n", ""))
+    assert previous.text == "intro text\n\nscope text\n\nfees text\n\nterms text"
+
+
+def test_revise_ignores_unrelated_documents():
+    """Test an upload sharing few pages with the previous document is not a revision."""
+    previous = make_document(2, "v1")
+    previous.ingest(iter([(1, "one"), (2, "two")]))
+    previous.page_hashes = ["a", "b"]
+
+    revision = make_document(3, "other")
+    assert revision.revise(previous, ["a", "x", "y"]) is None
+    assert len(revision.index) == 0
+
+
+def test_find_phrase_matches_whole_words_once_ingested():
+    """Test phrase lookups match exact words across whitespace, only for fully ingested documents."""
+    document = make_document(3)
+    pages = iter([
+        (1, "See Clause 14.2 for fees."),
+        (2, "Clause 14.25 differs; clause\n14.2 applies."),
+        (3, "The fee for clause 14 is fixed."),
+    ])
+    document.ingest(pages, limit=1)
+    assert document.find_phrase("clause 14.2") is None
+
+    document.ingest(pages)
+    assert document.find_phrase("clause 14.2") == [1, 2]
+    assert document.find_phrase("Clause 14") == [3]
+    assert document.find_phrase("warranty") == []
+    assert document.find_phrase("a") is None
+
+
+def test_lazy_pages_are_extracted_once_into_the_index(make_pdf):
+    """Test on-demand pages are kept only by the index and blank pages are not re-extracted."""
+    source = LazyPDF(make_pdf(["Payment terms are net thirty days.", ""]), "doc.pdf")
+    document = StoredDocument("doc.pdf", source.metadata, source=source)
+    calls = []
+    extract = source.page_text
+    source.page_text = lambda page: calls.append(page) or extract(page)
+    try:
+        assert "net thirty" in document.page_text(1)
+        assert document.page_text(2) == ""
+        document.page_text(1)
+        document.page_text(2)
+        assert calls == [1, 2]
+        assert document.indexed_pages == {1}
+        assert document.index.search("payment terms")
+    finally:
+        document.close()
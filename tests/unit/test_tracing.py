@@ -0,0 +1,116 @@
+"""
+Unit tests for request tracing and the sampling profiler.
+"""
+import json
+import logging
+import threading
+import time
+
+from backend import tracing
+from backend.tracing import SamplingProfiler, Trace, span
+
+
+def test_span_without_trace_is_noop():
+    """Test spans are ignored when no trace is active."""
+    with span("orphan") as s:
+        assert s is None
+
+
+def test_spans_nest_under_active_trace():
+    """Test nested spans record their parent."""
+    trace = Trace("GET /test")
+    token = tracing._current_trace.set(trace)
+    try:
+        with span("outer") as outer:
+            with span("inner", pages=3) as inner:
+                pass
+    finally:
+        tracing._current_trace.reset(token)
+
+    assert outer.parent_id == trace.root.span_id
+    assert inner.parent_id == outer.span_id
+    assert inner.attributes == {"pages": 3}
+    assert inner.end_ns is not None
+
+
+def test_export_writes_otlp_json(tmp_path, monkeypatch):
+    """Test file exporter writes one OTLP/JSON line per trace."""
+    export_path = tmp_path / "traces.jsonl"
+    monkeypatch.setattr(tracing, "TRACE_EXPORT_PATH", str(export_path))
+
+    trace = Trace("POST /stream")
+    trace.root.end()
+    tracing.export_trace(trace)
+
+    data = json.loads(export_path.read_text().strip())
+    spans = data["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert spans[0]["traceId"] == trace.trace_id
+    assert spans[0]["name"] == "POST /stream"
+
+
+def test_sampling_profiler_collects_folded_stacks(tmp_path):
+    """Test profiler samples the target thread and writes folded output."""
+    profiler = SamplingProfiler(threading.get_ident(), interval=0.001)
+    profiler.start()
+    deadline = time.monotonic() + 0.05
+    while time.monotonic() < deadline:
+        sum(range(1000))
+    profiler.stop()
+
+    assert profiler.samples
+    path = profiler.write_folded(tmp_path / "profile.folded")
+    first_line = path.read_text().splitlines()[0]
+    stack, count = first_line.rsplit(" ", 1)
+    assert "test_sampling_profiler_collects_folded_stacks" in stack
+    assert int(count) > 0
+
+
+def test_trace_log_is_emitted_without_logging_config():
+    """Test timelines are logged even when the application configured no logging."""
+    assert tracing.logger.isEnabledFor(logging.INFO)
+    assert tracing.logger.handlers
+
+
+def test_profiler_samples_worker_threads_in_trace_spans():
+    """Test worker threads are sampled while inside a span of the profiled trace."""
+    trace = Trace("POST /stream")
+
+    def work():
+        with span("worker"):
+            deadline = time.monotonic() + 0.05
+            while time.monotonic() < deadline:
+                sum(range(1000))
+
+    def run_in_trace():
+        tracing._current_trace.set(trace)
+        work()
+
+    profiler = SamplingProfiler(-1, interval=0.001, trace=trace)
+    profiler.start()
+    worker = threading.Thread(target=run_in_trace)
+    worker.start()
+    worker.join()
+    profiler.stop()
+
+    assert any("work (test_tracing.py" in stack for stack in profiler.samples)
+    assert trace.active_threads() == []
+
+
+def test_middleware_exports_off_the_event_loop(monkeypatch):
+    """Test finished traces are exported from the export thread, not the loop."""
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    exported = []
+    monkeypatch.setattr(
+        tracing, "export_trace", lambda trace: exported.append(threading.current_thread().name)
+    )
+    app = FastAPI()
+    app.add_middleware(tracing.TracingMiddleware)
+    app.get("/ping")(lambda: {"ok": True})
+
+    with TestClient(app) as client:
+        assert client.get("/ping").headers["x-trace-id"]
+    tracing._export_executor.submit(lambda: None).result()
+
+    assert exported and exported[0].startswith("trace-export")
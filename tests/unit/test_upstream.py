@@ -0,0 +1,274 @@
+"""
+Unit tests for cancellable, deadline-bounded upstream streaming.
+"""
+import asyncio
+import time
+
+import pytest
+
+from backend.upstream import ClientDisconnected, DeadlineExceeded, hedged_stream, stream_upstream
+
+
+class FakeUpstream:
+    """Async chunk source that records how far it got and whether it was closed.
+
+    ``first_delay=None`` never produces a first chunk, like a stalled upstream.
+    """
+
+    def __init__(self, first_delay: float | None = 0.0, delay: float = 0.01, chunks: int = 1000) -> None:
+        self.first_delay = first_delay
+        self.delay = delay
+        self.chunks = chunks
+        self.produced = 0
+        self.closed_at: float | None = None
+
+    @property
+    def closed(self) -> bool:
+        return self.closed_at is not None
+
+    async def __call__(self):
+        try:
+            if self.first_delay is None:
+                await asyncio.Event().wait()
+            await asyncio.sleep(self.first_delay)
+            for i in range(self.chunks):
+                self.produced += 1
+                yield f"tok{i} "
+                await asyncio.sleep(self.delay)
+        finally:
+            self.closed_at = time.monotonic()
+
+
+def test_streams_all_chunks_in_order():
+    """Test a fast upstream is streamed completely."""
+    upstream = FakeUpstream(delay=0, chunks=5)
+
+    async def run():
+        return [chunk async for chunk in stream_upstream(upstream)]
+
+    assert asyncio.run(run()) == [f"tok{i} " for i in range(5)]
+
+
+def test_ttft_deadline_aborts_and_closes_upstream():
+    """Test a slow first token raises a TTFT deadline and the upstream is closed."""
+    upstream = FakeUpstream(first_delay=0.3)
+
+    async def run():
+        async for _ in stream_upstream(upstream, ttft_timeout=0.05, poll_interval=0.01):
+            pass
+
+    with pytest.raises(DeadlineExceeded) as excinfo:
+        asyncio.run(run())
+    assert excinfo.value.kind == "ttft"
+    assert upstream.closed
+    assert upstream.produced <= 1
+
+
+def test_ttft_deadline_closes_a_stalled_upstream_promptly():
+    """Test an upstream that never sends a first token is closed before the deadline error is raised."""
+    upstream = FakeUpstream(first_delay=None)
+
+    async def run():
+        with pytest.raises(DeadlineExceeded):
+            async for _ in stream_upstream(upstream, ttft_timeout=0.05, poll_interval=0.01):
+                pass
+        return time.monotonic()
+
+    raised_at = asyncio.run(run())
+    assert upstream.closed and upstream.closed_at <= raised_at
+    assert upstream.produced == 0
+
+
+def test_client_disconnect_closes_a_stalled_upstream_promptly():
+    """Test a client leaving before the first token closes the upstream within the poll interval."""
+    upstream = FakeUpstream(first_delay=None)
+    gone_at = time.monotonic() + 0.05
+
+    async def is_disconnected():
+        return time.monotonic() > gone_at
+
+    async def run():
+        with pytest.raises(ClientDisconnected):
+            async for _ in stream_upstream(upstream, is_disconnected=is_disconnected, poll_interval=0.01):
+                pass
+
+    asyncio.run(run())
+    assert upstream.closed and upstream.closed_at - gone_at < 0.05
+
+
+def test_total_deadline_aborts_long_generation():
+    """Test the total deadline stops a generation that runs too long."""
+    upstream = FakeUpstream(delay=0.01)
+
+    async def run():
+        async for _ in stream_upstream(upstream, total_timeout=0.1, poll_interval=0.01):
+            pass
+
+    with pytest.raises(DeadlineExceeded) as excinfo:
+        asyncio.run(run())
+    assert excinfo.value.kind == "total"
+    assert upstream.closed
+    assert upstream.produced < 100
+
+
+def test_first_token_wait_is_reported_against_the_tighter_deadline():
+    """Test a first-token wait cut short by the total budget is reported as a total deadline."""
+    upstream = FakeUpstream(first_delay=0.3)
+
+    async def run():
+        async for _ in stream_upstream(upstream, ttft_timeout=5, total_timeout=0.05, poll_interval=0.01):
+            pass
+
+    with pytest.raises(DeadlineExceeded) as excinfo:
+        asyncio.run(run())
+    assert (excinfo.value.kind, excinfo.value.timeout) == ("total", 0.05)
+
+
+def test_client_disconnect_cancels_upstream():
+    """Test a disconnected client stops the upstream while it is still waiting."""
+    upstream = FakeUpstream(first_delay=0.2)
+
+    async def is_disconnected():
+        return True
+
+    async def run():
+        async for _ in stream_upstream(upstream, is_disconnected=is_disconnected, poll_interval=0.01):
+            pass
+
+    with pytest.raises(ClientDisconnected):
+        asyncio.run(run())
+    assert upstream.closed
+    assert upstream.produced <= 1
+
+
+def test_disconnect_is_noticed_while_tokens_keep_arriving():
+    """Test a steady token flow does not keep a departed client's upstream running."""
+    upstream = FakeUpstream(delay=0.002)
+    gone_at = time.monotonic() + 0.05
+
+    async def is_disconnected():
+        return time.monotonic() > gone_at
+
+    async def run():
+        async for _ in stream_upstream(upstream, is_disconnected=is_disconnected, poll_interval=0.01):
+            pass
+
+    with pytest.raises(ClientDisconnected):
+        asyncio.run(run())
+    assert upstream.closed
+    assert upstream.produced < 200
+
+
+def test_consumer_closing_early_stops_upstream():
+    """Test closing the stream after a few chunks stops pulling tokens upstream."""
+    upstream = FakeUpstream(delay=0.01)
+
+    async def run():
+        stream = stream_upstream(upstream)
+        received = [await anext(stream) for _ in range(3)]
+        await stream.aclose()
+        return received
+
+    assert len(asyncio.run(run())) == 3
+    assert upstream.closed
+    assert upstream.produced < 20
+
+
+class FakeSource:
+    """Async chunk source with a first-chunk latency, recording whether it was closed."""
+
+    def __init__(self, name: str, first_delay: float, fail: bool = False) -> None:
+        self.name = name
+        self.first_delay = first_delay
+        self.fail = fail
+        self.started = False
+        self.closed = False
+
+    async def stream(self):
+        self.started = True
+        try:
+            await asyncio.sleep(self.first_delay)
+            if self.fail:
+                raise RuntimeError(f"{self.name} failed")
+            for i in range(3):
+                yield f"{self.name}{i} "
+        finally:
+            self.closed = True
+
+
+def _collect(primary: FakeSource, backup: FakeSource | None, hedge_after: float):
+    winners = []
+
+    async def run():
+        chunks = hedged_stream(
+            primary.stream,
+            backup.stream if backup else None,
+            hedge_after,
+            on_first_chunk=winners.append,
+        )
+        return "".join([chunk async for chunk in chunks])
+
+    return asyncio.run(run()), winners
+
+
+def test_hedge_fast_backup_wins_and_cancels_primary():
+    """Test a slow primary is hedged and cancelled once the backup answers."""
+    primary, backup = FakeSource("slow", 1.0), FakeSource("fast", 0.01)
+    text, winners = _collect(primary, backup, hedge_after=0.05)
+    assert text == "fast0 fast1 fast2 "
+    assert winners == ["backup"]
+    assert primary.closed
+
+
+def test_hedge_not_sent_when_primary_is_fast():
+    """Test the backup is never started when the primary beats the threshold."""
+    primary, backup = FakeSource("fast", 0.01), FakeSource("backup", 0.01)
+    text, winners = _collect(primary, backup, hedge_after=0.5)
+    assert text == "fast0 fast1 fast2 "
+    assert winners == ["primary"]
+    assert not backup.started
+
+
+def test_hedge_primary_still_wins_after_hedging():
+    """Test the primary keeps the race if it answers before the hedged request."""
+    primary, backup = FakeSource("primary", 0.1), FakeSource("backup", 1.0)
+    text, winners = _collect(primary, backup, hedge_after=0.02)
+    assert text.startswith("primary0")
+    assert winners == ["primary"]
+    assert backup.started and backup.closed
+
+
+def test_hedge_failed_primary_falls_back_immediately():
+    """Test an early primary failure starts the backup without waiting."""
+    primary, backup = FakeSource("broken", 0.0, fail=True), FakeSource("backup", 0.01)
+    text, winners = _collect(primary, backup, hedge_after=10)
+    assert text == "backup0 backup1 backup2 "
+    assert winners == ["backup"]
+
+
+def test_hedge_raises_when_both_fail():
+    """Test the first error is raised when neither stream produces anything."""
+    primary, backup = FakeSource("a", 0.0, fail=True), FakeSource("b", 0.0, fail=True)
+    with pytest.raises(RuntimeError, match="a failed"):
+        _collect(primary, backup, hedge_after=0.01)
+
+
+def test_hedge_closes_losing_upstream_promptly():
+    """Test the losing upstream of a hedged race is closed as soon as the winner answers."""
+    primary, backup = FakeUpstream(first_delay=None), FakeUpstream(first_delay=0.02, delay=0, chunks=3)
+
+    async def run():
+        chunks = hedged_stream(
+            lambda: stream_upstream(primary, poll_interval=0.01),
+            lambda: stream_upstream(backup, poll_interval=0.01),
+            hedge_after=0.02,
+        )
+        first = await anext(chunks)
+        won_at = time.monotonic()
+        rest = [chunk async for chunk in chunks]
+        return [first] + rest, won_at
+
+    text, won_at = asyncio.run(run())
+    assert text == ["tok0 ", "tok1 ", "tok2 "]
+    assert primary.closed and primary.closed_at <= won_at
+    assert primary.produced == 0
@@ -1,14 +1,32 @@
 """
 NiceGUI application for RAG chatbot interface.
 """
-from nicegui import ui
+from nicegui import app, ui
 import httpx
 import asyncio
+import contextlib
+import itertools
+import json
 from typing import Any
 
+import websockets
+
 
 # API endpoint
 API_BASE_URL = "http://localhost:8000"
+API_WS_URL = API_BASE_URL.replace("http", "ws", 1) + "/ws"
+
+# Chat stream flow control: chunks granted up front, then granted again per batch rendered
+STREAM_CREDITS = 64
+CREDIT_BATCH = 32
+STREAM_IDLE_TIMEOUT = 60.0  # seconds without a frame before a stream is abandoned
+
+# A dropped connection is re-established and the answer resumed, not re-asked
+RESUME_ATTEMPTS = 3
+RESUME_BACKOFF = 1.0  # seconds before the first reconnect, doubled per attempt
+
+# Partial questions are sent as prefetch hints once typing pauses for this long
+HINT_DEBOUNCE = 0.3
 
 
 class ChatApp:
@@ -19,6 +37,15 @@ class ChatApp:
         self.messages: list[dict[str, Any]] = []
         self.session_id: str | None = None
         self.chat_container: ui.column | None = None
+        # One WebSocket carries every chat stream; frames are routed by stream ID
+        self._socket = None
+        self._reader_task: asyncio.Task | None = None
+        self._socket_lock = asyncio.Lock()
+        self._streams: dict[str, asyncio.Queue] = {}
+        self._stream_ids = itertools.count(1)
+        self._loaded_label: str | None = None
+        self._hint_task: asyncio.Task | None = None
+        self._last_hint = ""
         
     def create_ui(self) -> None:
         """Create the main UI."""
@@ -50,6 +77,7 @@ class ChatApp:
             with ui.row().classes("w-full gap-2"):
                 self.input_field = ui.input(
                     placeholder="Type your message...",
+                    on_change=self.on_input_change,
                 ).classes("flex-1").on("keydown.enter", self.send_message)
                 ui.button("Send", on_click=self.send_message).classes("px-6")
                 ui.button("Clear Chat", on_click=self.clear_chat).classes("px-4 bg-gray-200")
@@ -66,7 +94,9 @@ class ChatApp:
             self.status_label.text = ""
             return
         
-        # Clear input
+        # Clear input (no hint is needed for the cleared field)
+        if self._hint_task is not None:
+            self._hint_task.cancel()
         self.input_field.value = ""
         
         # Add user message to chat
@@ -75,54 +105,60 @@ class ChatApp:
         # Update status with async steps
         self.update_status_async("Analyzing question...")
         
+        stream_id = f"q{next(self._stream_ids)}"
         try:
-            # Call streaming endpoint
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                async with client.stream(
-                    "POST",
-                    f"{API_BASE_URL}/stream",
-                    json={"message": message, "session_id": self.session_id},
-                ) as response:
-                    if response.status_code != 200:
-                        error_text = await response.aread()
-                        error_msg = error_text.decode()
-                        # User-friendly error messages
-                        if response.status_code == 400:
-                            friendly_msg = f"Invalid request: {error_msg}. Please check your message and try again."
-                        elif response.status_code == 500:
-                            friendly_msg = f"Server error occurred. Please try again in a moment."
-                        else:
-                            friendly_msg = f"Error ({response.status_code}): {error_msg}"
-                        self.add_message("error", friendly_msg)
+            # Ask over the shared chat connection
+            queue = await self.open_stream(stream_id, message)
+            
+            # Add assistant message container
+            assistant_label = self.add_streaming_message("assistant")
+            
+            # Update status
+            self.update_status_async("Generating response...")
+            
+            # Stream response, granting more credits as chunks are rendered
+            full_response = ""
+            received = 0
+            resume_id = None
+            while True:
+                frame = await asyncio.wait_for(queue.get(), timeout=STREAM_IDLE_TIMEOUT)
+                if frame["type"] == "start":
+                    resume_id = frame["resume_id"]
+                elif frame["type"] == "disconnected":
+                    if resume_id is None:
+                        raise ConnectionError("Connection closed")
+                    # Pick the answer up where it broke off
+                    self.update_status_async("Reconnecting...")
+                    queue = await self.resume_stream(stream_id, resume_id, len(full_response))
+                    received = 0
+                    self.update_status_async("Generating response...")
+                elif frame["type"] == "chunk":
+                    full_response += frame["text"]
+                    # Update the label directly (NiceGUI handles reactivity)
+                    assistant_label.text = full_response
+                    received += 1
+                    if received % CREDIT_BATCH == 0:
+                        await self.send_frame({"type": "credit", "stream_id": stream_id, "credits": CREDIT_BATCH})
+                elif frame["type"] == "error":
+                    self.add_message("error", f"Invalid request: {frame['error']}. Please check your message and try again.")
+                    self.status_label.text = "Error occurred"
+                    return
+                elif frame["type"] == "end":
+                    if frame["reason"] == "error":
+                        self.add_message("error", "Server error occurred. Please try again in a moment.")
                         self.status_label.text = "Error occurred"
                         return
-                    
-                    # Update status
-                    self.update_status_async("Searching document...")
-                    await asyncio.sleep(0.5)  # Brief delay to show status
-                    
-                    # Add assistant message container
-                    assistant_label = self.add_streaming_message("assistant")
-                    
-                    # Update status
-                    self.update_status_async("Generating response...")
-                    
-                    # Stream response
-                    full_response = ""
-                    async for chunk in response.aiter_text():
-                        if chunk:
-                            full_response += chunk
-                            # Update the label directly (NiceGUI handles reactivity)
-                            assistant_label.text = full_response
-                            await asyncio.sleep(0.01)  # Small delay for UI updates
-                    
-                    # Update status
-                    self.update_status_async("Response complete")
-                    
-        except httpx.TimeoutException:
+                    break
+            
+            # Update status
+            self.update_status_async("Response complete")
+            
+        except asyncio.TimeoutError:
+            with contextlib.suppress(Exception):
+                await self.send_frame({"type": "cancel", "stream_id": stream_id})
             self.add_message("error", "Request timed out. Please try again.")
             self.status_label.text = "Request timed out"
-        except httpx.RequestError as e:
+        except (OSError, websockets.exceptions.WebSocketException):
             self.add_message("error", f"Connection error: Unable to reach the server. Please check if the backend is running.")
             self.status_label.text = "Connection error"
         except Exception as e:
@@ -131,10 +167,144 @@ class ChatApp:
             self.add_message("error", friendly_msg)
             self.status_label.text = f"Error: {error_type}"
         finally:
+            self._streams.pop(stream_id, None)
             # Clear status after a delay
             await asyncio.sleep(2)
             self.status_label.text = ""
     
+    def on_input_change(self, e) -> None:
+        """Schedule a prefetch hint for the partial question once typing pauses."""
+        if self._hint_task is not None:
+            self._hint_task.cancel()
+        partial = (e.value or "").strip()
+        if partial and partial != self._last_hint:
+            self._hint_task = asyncio.create_task(self.send_hint(partial))
+    
+    async def send_hint(self, partial: str) -> None:
+        """Ask the backend to prepare context for a question that is still being typed."""
+        await asyncio.sleep(HINT_DEBOUNCE)
+        self._last_hint = partial
+        try:
+            async with httpx.AsyncClient(timeout=5.0) as client:
+                await client.post(
+                    f"{API_BASE_URL}/prefetch",
+                    json={"partial": partial, "session_id": self.session_id},
+                )
+        except httpx.HTTPError:
+            # Hints are best effort; the question itself still works without one
+            pass
+    
+    async def connect(self):
+        """Open the chat WebSocket if it is not open yet, and start routing its frames."""
+        async with self._socket_lock:
+            if self._socket is None:
+                url = API_WS_URL + (f"?session_id={self.session_id}" if self.session_id else "")
+                # A reader left over from a dropped connection must not route frames any more
+                if self._reader_task is not None:
+                    self._reader_task.cancel()
+                self._socket = await websockets.connect(url)
+                self._reader_task = asyncio.create_task(self.read_frames(self._socket))
+                self._reader_task.add_done_callback(self.on_reader_done)
+            return self._socket
+    
+    def on_reader_done(self, task: asyncio.Task) -> None:
+        """Report a frame reader that stopped with an error instead of losing it."""
+        if self._reader_task is task:
+            self._reader_task = None
+        if task.cancelled() or task.exception() is None:
+            return
+        error = task.exception()
+        self.status_label.text = "Chat connection failed"
+        self.add_message("error", f"Chat connection failed: {type(error).__name__}: {error}")
+    
+    async def close(self) -> None:
+        """Stop reading frames and close the chat connection."""
+        async with self._socket_lock:
+            if self._reader_task is not None:
+                self._reader_task.cancel()
+                await asyncio.gather(self._reader_task, return_exceptions=True)
+                self._reader_task = None
+            if self._socket is not None:
+                await self._socket.close()
+                self._socket = None
+    
+    async def send_frame(self, frame: dict) -> None:
+        """Send one frame on the chat connection."""
+        socket = await self.connect()
+        await socket.send(json.dumps(frame))
+    
+    async def open_stream(self, stream_id: str, message: str) -> asyncio.Queue:
+        """Ask a question on a new stream and return the queue its frames arrive on."""
+        queue: asyncio.Queue = asyncio.Queue()
+        self._streams[stream_id] = queue
+        await self.send_frame({
+            "type": "ask",
+            "stream_id": stream_id,
+            "message": message,
+            "credits": STREAM_CREDITS,
+        })
+        return queue
+    
+    async def resume_stream(self, stream_id: str, resume_id: str, offset: int) -> asyncio.Queue:
+        """
+        Reconnect and continue a stream from the characters already received.
+        
+        Raises:
+            OSError: If the server stays unreachable for every attempt
+        """
+        delay = RESUME_BACKOFF
+        for attempt in range(RESUME_ATTEMPTS):
+            await asyncio.sleep(delay)
+            delay *= 2
+            queue: asyncio.Queue = asyncio.Queue()
+            self._streams[stream_id] = queue
+            try:
+                await self.send_frame({
+                    "type": "resume",
+                    "stream_id": stream_id,
+                    "resume_id": resume_id,
+                    "offset": offset,
+                    "credits": STREAM_CREDITS,
+                })
+                return queue
+            except (OSError, websockets.exceptions.WebSocketException):
+                if attempt == RESUME_ATTEMPTS - 1:
+                    raise
+        raise ConnectionError("Could not resume the stream")
+    
+    async def read_frames(self, socket) -> None:
+        """Route incoming frames to their streams until the connection closes."""
+        try:
+            async for raw in socket:
+                frame = json.loads(raw)
+                if frame["type"] == "progress":
+                    self.show_progress(frame["progress"])
+                elif frame.get("stream_id") in self._streams:
+                    self._streams[frame["stream_id"]].put_nowait(frame)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            if self._socket is socket:
+                self._socket = None
+            # Streams still open get no more frames here; they may resume on a new connection
+            for queue in self._streams.values():
+                queue.put_nowait({"type": "disconnected"})
+    
+    def show_progress(self, progress: dict) -> None:
+        """Show server-pushed ingestion progress of the uploaded PDF."""
+        if self._loaded_label is None:
+            return
+        if progress["done"]:
+            self.upload_label.text = self._loaded_label
+            self._loaded_label = None
+            if progress["error"]:
+                self.add_message("error", f"Some pages could not be read: {progress['error']}")
+            return
+        self.upload_label.text = (
+            f"⏳ {progress['pages_processed']}/{progress['pages_total']} pages indexed "
+            "(you can ask questions already)"
+        )
+    
     def clear_chat(self) -> None:
         """Clear all chat messages."""
         self.messages.clear()
@@ -348,8 +518,10 @@ class ChatApp:
                 files = {"file": (file_name, file_content, "application/pdf")}
                 data = {"session_id": self.session_id} if self.session_id else {}
                 
+                # Chat can start as soon as the first page is indexed
                 response = await client.post(
                     f"{API_BASE_URL}/upload",
+                    params={"background": "true"},
                     files=files,
                     data=data,
                 )
@@ -374,6 +546,9 @@ class ChatApp:
                         self.add_message("system", f"PDF uploaded: {result['message']}")
                     
                     self.status_label.text = "PDF uploaded successfully!"
+                    # Ingestion progress is pushed over the chat connection
+                    self._loaded_label = self.upload_label.text
+                    await self.connect()
                 else:
                     error = response.json().get("detail", "Upload failed")
                     # User-friendly error messages
@@ -412,8 +587,9 @@ class ChatApp:
 
 def main() -> None:
     """Run the NiceGUI app."""
-    app = ChatApp()
-    app.create_ui()
+    chat = ChatApp()
+    chat.create_ui()
+    app.on_shutdown(chat.close)
     ui.run(port=8080, title="workingAgent Chatbot", show=False, reload=False)
 
 